@@ -0,0 +1,122 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+Checkpoint.py
+
+This Python class saves the progress of a windowed optimization run to a single binary file and
+restores it, so that a run that is interrupted (crash, preemption) can continue from the window
+after the last checkpoint instead of starting over.
+"""
+import os
+import pickle
+from pathlib import Path
+from storagevet.ErrorHandling import *
+
+
+class Checkpoint:
+    """ Periodic checkpoint of every value stream's solved windows and computed system
+    requirements.
+
+    """
+
+    def __init__(self, path, every=10):
+        """
+        Args:
+            path (Path): file the checkpoint is written to
+            every (int): number of optimization windows between checkpoints (0 to never save)
+        """
+        self.path = Path(path)
+        self.every = every
+
+    def due(self, window_count):
+        """
+        Args:
+            window_count (int): number of windows solved so far
+
+        Returns: True if a checkpoint should be saved after this many windows
+
+        """
+        return self.every > 0 and window_count > 0 and window_count % self.every == 0
+
+    def exists(self):
+        return self.path.is_file()
+
+    def save(self, value_streams, window_position):
+        """ Writes the checkpoint. The file is written next to the old one and then renamed over
+        it, so an interruption during the save leaves the previous checkpoint intact.
+
+        Args:
+            value_streams (dict): ValueStream instances, keyed by name
+            window_position (int): position of the last window whose results are included
+
+        """
+        state = {'window position': window_position,
+                 'value streams': {name: value_stream.checkpoint_state()
+                                   for name, value_stream in value_streams.items()}}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self.path.with_name(self.path.name + '.tmp')
+        with open(temporary, 'wb') as file:
+            pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+        TellUser.debug(f'checkpoint saved after window {window_position}: {self.path}')
+
+    def load(self):
+        """ Returns: the saved state (see save) """
+        with open(self.path, 'rb') as file:
+            return pickle.load(file)
+
+    def resume(self, value_streams):
+        """ Restores every value stream from the checkpoint. Restored value streams keep the system
+        requirements they had computed, so calculate_system_requirements does not compute them again.
+
+        Args:
+            value_streams (dict): ValueStream instances, keyed by name (the same value streams
+                the checkpoint was saved with)
+
+        Returns: the position of the next window to optimize
+
+        """
+        state = self.load()
+        saved = state['value streams']
+        missing = set(value_streams.keys()) ^ set(saved.keys())
+        if missing:
+            TellUser.error(f'the checkpoint {self.path} was saved with different value streams: {missing}')
+            raise ParameterError(f'The checkpoint does not match the value streams of this run: {missing}')
+        for name, value_stream in value_streams.items():
+            value_stream.restore_checkpoint(saved[name])
+        TellUser.info(f'resuming from checkpoint {self.path} after window {state["window position"]}')
+        return state['window position'] + 1
+
+    def remove(self):
+        """ Deletes the checkpoint (ex. once the run has finished). """
+        if self.exists():
+            self.path.unlink()
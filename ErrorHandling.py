@@ -33,85 +33,450 @@ files to give the user feedback on what went wrong.
 """
 
 import os
+import json
+import atexit
+import queue
 import logging
+import logging.handlers
+import multiprocessing
+from contextlib import contextmanager
 from pathlib import Path
+from datetime import datetime
 
 
-class SolverError(Exception):                     """solver 관련 오류에 대한 일반적인 예외 클래스"""
-    pass
+class SolverError(Exception):
+    """solver 관련 오류에 대한 일반적인 예외 클래스"""
 
 
-class SolverInfeasibleError(Exception):           """solver의 해결이 불가능한 상태 오류"""
-    pass
+class SolverInfeasibleError(Exception):
+    """solver의 해결이 불가능한 상태 오류"""
 
 
-class SolverUnboundedError(Exception):            """solver의 해결이 무한한 상태 오류"""
-    pass
+class SolverUnboundedError(Exception):
+    """solver의 해결이 무한한 상태 오류"""
 
 
-class SystemRequirementsError(Exception):         """시스템 요구사항과 관련된 오류"""
-    pass
+class SystemRequirementsError(Exception):
+    """시스템 요구사항과 관련된 오류"""
 
 
-class ModelParameterError(Exception):              """모델 매개변수와 관련된 오류"""
-    pass
+class ModelParameterError(Exception):
+    """모델 매개변수와 관련된 오류"""
 
 
-class TimeseriesDataError(Exception):             """시계열 데이터와 관련된 오류"""
-    pass
+class TimeseriesDataError(Exception):
+    """시계열 데이터와 관련된 오류"""
 
 
-class TimeseriesMissingError(Exception):          """시계열 데이터가 누락된 경우의 오류"""
-    pass
+class TimeseriesMissingError(Exception):
+    """시계열 데이터가 누락된 경우의 오류"""
 
 
-class MonthlyDataError(Exception):                 """월별 데이터와 관련된 오류"""
-    pass
+class MonthlyDataError(Exception):
+    """월별 데이터와 관련된 오류"""
 
 
-class TariffError(Exception):                      """타리프와 관련된 오류"""
-    pass
+class TariffError(Exception):
+    """타리프와 관련된 오류"""
 
 
-class ParameterError(ValueError):                   """기본 내장 ValueError 클래스를 상속받은 일반적인 매개변수 오류를 나타내는 사용자 정의 예외 클래스"""
-    pass
+class ParameterError(ValueError):
+    """기본 내장 ValueError 클래스를 상속받은 일반적인 매개변수 오류를 나타내는 사용자 정의 예외 클래스"""
 
 
-class FilenameError(ValueError):                  """기본 내장 ValueError 클래스를 상속받은 파일 이름과 관련된 오류를 나타내는 사용자 정의 예외 클래스"""
-    pass
+class FilenameError(ValueError):
+    """기본 내장 ValueError 클래스를 상속받은 파일 이름과 관련된 오류를 나타내는 사용자 정의 예외 클래스"""
  
+
+class ContextFilter(logging.Filter):
+    """ 각 로그 레코드에 TellUser.context에 저장된 시나리오 id와 Value Stream 이름을 붙여서
+    서로 다른 워커 프로세스에서 온 레코드를 구분할 수 있게 함
+    """
+
+    def filter(self, record):
+        record.scenario = TellUser.context.get('scenario', '-')
+        record.stream = TellUser.context.get('stream', '-')
+        return True
+
+
+class EventFilter(logging.Filter):
+    """ 구조화된 이벤트 레코드 (TellUser.event)와 일반 로그 레코드를 나눔.
+    이벤트와 로그는 같은 로거와 핸들러 경로 (비동기 큐, 수집기)를 지나고, 핸들러마다 이 필터로 자신이 쓸 레코드만 고름
+    """
+
+    def __init__(self, events):
+        """
+        Args:
+            events (bool): True이면 이벤트 레코드만, False이면 일반 로그 레코드만 통과시킴
+        """
+        super().__init__()
+        self.events = events
+
+    @staticmethod
+    def is_event(record):
+        return hasattr(record, 'event_type')
+
+    def filter(self, record):
+        return self.is_event(record) == self.events
+
+
+class JsonFormatter(logging.Formatter):
+    """ 레코드를 JSON 한 줄 (newline-delimited JSON)로 기록하여, 여러 실행의 이벤트 로그를
+    pd.read_json(..., lines=True)로 바로 DataFrame에 읽을 수 있게 함
+    """
+    # 모든 이벤트에 있는 키. 이벤트의 값(fields)은 이 이름을 쓸 수 없음
+    CORE_KEYS = ('timestamp', 'level', 'scenario', 'stream', 'window', 'event')
+
+    def format(self, record):
+        # 시나리오와 Value Stream 이름은 기록 시점의 값 (레코드에 붙은 값)을 사용함.
+        # 비동기 모드와 수집기에서는 기록 시점보다 늦게 형식이 지정되기 때문
+        event = {
+            'timestamp': datetime.fromtimestamp(record.created).isoformat(),
+            'level': record.levelname,
+            'scenario': getattr(record, 'scenario', None) or TellUser.context.get('scenario', '-'),
+            'stream': (getattr(record, 'stream_name', None) or getattr(record, 'stream', None)
+                       or TellUser.context.get('stream', '-')),
+            'window': getattr(record, 'window', None),
+            'event': getattr(record, 'event_type', record.getMessage()),
+        }
+        event.update(getattr(record, 'fields', {}))
+        # numpy 스칼라는 .item()으로 파이썬 숫자로 변환
+        return json.dumps(event, default=lambda o: o.item() if hasattr(o, 'item') else str(o))
+
+
 class TellUser:
+    listener = None
+    listener_handlers = []
+    context = {'scenario': '-', 'stream': '-'}
+    collector = None
+    collector_queue = None
+    batch_size = 100
+    events_enabled = False
+
     @classmethod
-    def create_log(cls, logs_path, verbose):                                       """logs_path (로그 디렉토리의 경로)와 verbose (메시지를 콘솔에 출력할지 여부를 나타내는 부울 값)를 매개변수로 사용"""
+    def create_log(cls, logs_path, verbose, asynchronous=False, batch_size=100):
+        """ logs_path (로그 디렉토리의 경로)와 verbose (메시지를 콘솔에 출력할지 여부를 나타내는 부울 값)를 매개변수로 사용
+        asynchronous가 True이면 로그 기록을 큐에 넣고 리스너 스레드에서 batch_size 개씩 모아서 파일에 씀
+        """
+        try:
             os.makedirs(logs_path)
         except OSError:
             print("Creation of the logs_path directory %s failed. Possibly already created." % logs_path) if verbose else None
         else:
             print("Successfully created the logs_path directory %s " % logs_path) if verbose else None
-        log_filename = logs_path / 'dervet_log.log'                                """dervet_log.log'라는 이름의 로그 파일을 지정된 로그 디렉토리 내에 만듬"""
-        handler = logging.FileHandler(log_filename, mode='w')                      """로그를 파일로 저장하는 핸들러를 쓰기모드로 열도록 지정"""
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s') """로그 메시지 형식 지정, (작성 시간/로그 레벨(DEBUG,ERROR 등)/실제 로그메시지"""
-        handler.setFormatter(formatter)                                            """핸들러에 포매터 설정하며 파일 핸들러가 사용자가 지정한 형식으로 로그메시지를 기록하게 함"""
-        cls.logger = logging.getLogger('Error')                                    """error의 로거를 반환하거나 새로 생성"""
-        cls.logger.setLevel(logging.DEBUG)                                         """로거의 로깅수준을 설정/ DEBUG부터 ERROR까지 모든 메시지 기록"""
-        cls.logger.addHandler(handler)                                             """로거에 핸들러 추가하여 이 로거로 전송된 로그 메시지가 파일에도 기록되도록 설정"""
+        # dervet_log.log'라는 이름의 로그 파일을 지정된 로그 디렉토리 내에 만듬
+        log_filename = logs_path / 'dervet_log.log'
+        # 로그를 파일로 저장하는 핸들러를 쓰기모드로 열도록 지정
+        handler = logging.FileHandler(log_filename, mode='w')
+        # 로그 메시지 형식 지정, (작성 시간/로그 레벨(DEBUG,ERROR 등)/실제 로그메시지
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+        # 핸들러에 포매터 설정하며 파일 핸들러가 사용자가 지정한 형식으로 로그메시지를 기록하게 함
+        handler.setFormatter(formatter)
+        # 구조화된 이벤트는 이벤트 로그 (create_event_log)에만 기록
+        handler.addFilter(EventFilter(False))
+        # error의 로거를 반환하거나 새로 생성
+        cls.logger = logging.getLogger('Error')
+        # 로거의 로깅수준을 설정/ DEBUG부터 ERROR까지 모든 메시지 기록
+        cls.logger.setLevel(logging.DEBUG)
+        handlers = [handler]
         if verbose:
             # create console handler and set level to debug
             ch = logging.StreamHandler()                                           
             ch.setLevel(logging.DEBUG)                                             
             # add formatter to ch
             ch.setFormatter(formatter)
+            ch.addFilter(EventFilter(False))
             # add ch to logger
-            cls.logger.addHandler(ch)
+            handlers.append(ch)
+        if asynchronous:
+            # 로그 기록은 큐에 넣기만 하고, 파일 쓰기는 리스너 스레드에서 batch_size 개씩 모아서 수행
+            cls.start_listener(handlers, batch_size)
+        else:
+            for h in handlers:
+                cls.logger.addHandler(h)
         cls.logger.info('Started logging...')
 
+    @classmethod
+    def start_listener(cls, handlers, batch_size=100):
+        """ 로거에는 QueueHandler만 붙이고, 주어진 핸들러는 QueueListener 스레드로 옮겨서
+        로그 호출이 디스크 I/O를 기다리지 않도록 함.
+        파일 핸들러는 MemoryHandler로 감싸서 BATCH_SIZE 개씩 모아서 씀 (ERROR 이상은 즉시 씀)
+
+        Args:
+            handlers (list): 원래 로거에 붙였을 핸들러 목록
+            batch_size (int): 파일에 쓰기 전에 모아두는 레코드 수
+
+        """
+        log_queue = queue.SimpleQueue()
+        cls.batch_size = batch_size
+        cls.listener_handlers = [cls.batched(h) for h in handlers]
+        cls.listener = logging.handlers.QueueListener(log_queue, *cls.listener_handlers,
+                                                      respect_handler_level=True)
+        cls.logger.addHandler(logging.handlers.QueueHandler(log_queue))
+        cls.listener.start()
+        # close_log를 호출하지 않고 종료해도 큐와 버퍼에 남은 레코드가 기록되도록 함
+        atexit.register(cls.close_log)
+
+    @classmethod
+    def batched(cls, handler):
+        """ 리스너 스레드에서 쓰는 파일 핸들러는 MemoryHandler로 감싸서 batch_size 개씩 모아서 씀 (ERROR 이상은 즉시 씀) """
+        if isinstance(handler, logging.FileHandler):
+            return logging.handlers.MemoryHandler(cls.batch_size, flushLevel=logging.ERROR, target=handler,
+                                                  flushOnClose=True)
+        return handler
+
+    @classmethod
+    def add_handler(cls, handler):
+        """ 로거에 핸들러를 추가함. 비동기 모드에서는 리스너를 멈추고 (큐에 남은 레코드를 모두 쓴 뒤)
+        핸들러를 리스너에 추가하고 다시 시작하므로, 이후의 레코드도 같은 큐를 거쳐 기록됨
+
+        Args:
+            handler (Handler): 추가할 핸들러
+
+        """
+        if cls.listener is None:
+            cls.logger.addHandler(handler)
+            return
+        cls.listener.stop()
+        cls.listener_handlers.append(cls.batched(handler))
+        cls.listener.handlers = tuple(cls.listener_handlers)
+        cls.listener.start()
+
     @classmethod
     def close_log(cls):
+        """ 모든 로그 핸들러를 비우고 닫음. 비동기 모드에서는 큐에 남은 레코드를 모두 쓴 뒤 리스너 스레드를 종료함.
+        atexit에 등록되어 있으므로 이 메서드를 호출하지 않고 프로그램이 끝나도 레코드가 기록됨
+        """
+        if cls.listener is not None:
+            atexit.unregister(cls.close_log)
+            # stop()는 큐에 남아있는 모든 레코드를 처리한 뒤 리스너 스레드를 종료함
+            cls.listener.stop()
+            cls.listener = None
+            for h in cls.listener_handlers:
+                target = getattr(h, 'target', None)
+                h.flush()
+                h.close()
+                if target is not None:
+                    target.flush()
+                    target.close()
+            cls.listener_handlers = []
+        cls.events_enabled = False
         for i in list(cls.logger.handlers):
-            print(i)
             cls.logger.removeHandler(i)
-            i.flush()                                     """내부 버퍼를 비워줌"""
-            i.close()                                     
+            # 내부 버퍼를 비워줌
+            i.flush()
+            i.close()
+
+    @classmethod
+    def set_context(cls, scenario=None, stream=None):
+        """ 각 레코드에 붙는 시나리오 id 및/또는 Value Stream 이름을 바꿈
+
+        Args:
+            scenario (str): 이 프로세스에서 실행 중인 시나리오의 id
+            stream (str): 지금 만들거나 보고 중인 Value Stream의 이름
+
+        """
+        if scenario is not None:
+            cls.context['scenario'] = str(scenario)
+        if stream is not None:
+            cls.context['stream'] = str(stream)
+
+    @classmethod
+    @contextmanager
+    def stream_context(cls, stream):
+        """ with 블록 안에서 기록되는 각 레코드에 STREAM을 붙이고, 블록이 끝나면 이전의 Value Stream 이름을
+        되돌림 (중첩된 블록은 호출한 쪽의 이름을 복원함)
+
+        Args:
+            stream (str): 만들고 있는 Value Stream의 이름
+
+        """
+        previous = cls.context.get('stream', '-')
+        cls.set_context(stream=stream)
+        try:
+            yield
+        finally:
+            cls.context['stream'] = previous
+
+    @classmethod
+    def start_log_collector(cls, logs_path, per_scenario=True):
+        """ 프로세스 풀의 워커들이 보낸 모든 레코드를 쓰는 수집기 프로세스를 하나 시작함.
+        로그 파일은 수집기만 쓰므로 워커끼리 파일 잠금을 다투거나 줄이 섞이지 않음
+
+        Args:
+            logs_path (Path): 로그 파일을 저장할 디렉토리
+            per_scenario (bool): True이면 시나리오마다 dervet_log_<scenario>.log 파일을 쓰고,
+                False이면 모든 레코드를 하나의 dervet_log.log에 씀
+
+        Returns: create_worker_log에 넘겨야 하는 multiprocessing Queue
+            (보통 Pool(initializer=TellUser.create_worker_log, initargs=(queue,)) 형태로 사용).
+            stop_log_collector를 호출하기 전에 풀을 (terminate가 아니라) close 및 join 해야
+            워커에 남아 있는 레코드가 사라지지 않음
+
+        """
+        os.makedirs(logs_path, exist_ok=True)
+        cls.collector_queue = multiprocessing.Queue()
+        cls.collector = multiprocessing.Process(target=cls.run_log_collector,
+                                                args=(cls.collector_queue, logs_path, per_scenario),
+                                                name='dervet-log-collector', daemon=True)
+        cls.collector.start()
+        # 수집기는 데몬 프로세스이므로 종료 시 기록되지 않은 레코드와 함께 종료되지 않도록 등록
+        atexit.register(cls.stop_log_collector)
+        return cls.collector_queue
+
+    @staticmethod
+    def run_log_collector(log_queue, logs_path, per_scenario):
+        """ 수집기 프로세스의 메인 루프. None 센티넬을 받을 때까지 실행됨.
+        시나리오별 파일은 그 시나리오의 종료 레코드(end_scenario)를 쓰면 닫히므로, 열려 있는 파일은 실행 중인
+        시나리오의 수만큼만 있음. 닫힌 뒤 같은 시나리오의 레코드가 다시 오면 파일을 이어 쓰기 모드로 다시 엶
+
+        Args:
+            log_queue (multiprocessing.Queue): 워커의 레코드가 전달되는 큐
+            logs_path (Path): 로그 파일을 저장할 디렉토리
+            per_scenario (bool): 하나의 합쳐진 파일 대신 시나리오마다 파일을 씀
+
+        """
+        formatter = logging.Formatter('%(asctime)s - %(levelname)s - '
+                                      '[%(scenario)s | pid %(process)d | %(stream)s] - %(message)s')
+        handlers = {}
+        opened = set()
+        events = None
+        while True:
+            record = log_queue.get()
+            if record is None:
+                break
+            if EventFilter.is_event(record):
+                # 모든 워커의 구조화된 이벤트는 하나의 이벤트 로그에 씀 (각 이벤트에 시나리오가 기록됨)
+                if events is None:
+                    events = logging.FileHandler(Path(logs_path) / 'dervet_events.jsonl', mode='w')
+                    events.setFormatter(JsonFormatter())
+                events.handle(record)
+                continue
+            key = record.scenario if per_scenario else None
+            if key not in handlers:
+                filename = f'dervet_log_{key}.log' if per_scenario else 'dervet_log.log'
+                handlers[key] = logging.FileHandler(Path(logs_path) / filename, mode='a' if key in opened else 'w')
+                handlers[key].setFormatter(formatter)
+                opened.add(key)
+            handlers[key].handle(record)
+            if per_scenario and getattr(record, 'scenario_end', False):
+                handlers.pop(key).close()
+        for h in list(handlers.values()) + ([events] if events is not None else []):
+            h.flush()
+            h.close()
+
+    @classmethod
+    def create_worker_log(cls, log_queue, scenario=None, events=False):
+        """ 워커 프로세스의 로거가 수집기의 큐로 레코드를 보내도록 설정함. 여러 시나리오를 실행하는 풀 워커는
+        각 작업의 시작에서 set_context(scenario=...)를, 끝에서 end_scenario()를 호출해야 함
+
+        Args:
+            log_queue (multiprocessing.Queue): start_log_collector가 반환한 큐
+            scenario (str): 이 워커가 실행하는 시나리오의 id
+            events (bool): True이면 구조화된 이벤트도 보냄 (수집기가 dervet_events.jsonl에 씀)
+
+        """
+        cls.logger = logging.getLogger('Error')
+        cls.logger.setLevel(logging.DEBUG)
+        # 부모 프로세스에서 복사된 핸들러는 제거 (같은 파일에 동시에 쓰지 않도록)
+        for h in list(cls.logger.handlers):
+            cls.logger.removeHandler(h)
+        handler = logging.handlers.QueueHandler(log_queue)
+        handler.addFilter(ContextFilter())
+        cls.logger.addHandler(handler)
+        cls.set_context(scenario=scenario)
+        cls.events_enabled = events
+
+    @classmethod
+    def end_scenario(cls):
+        """ 현재 시나리오가 끝났음을 기록함. 수집기는 이 레코드를 쓴 뒤 그 시나리오의 로그 파일을 닫음 """
+        cls.logger.info(f"Finished scenario {cls.context.get('scenario', '-')}", extra={'scenario_end': True})
+
+    @classmethod
+    def stop_log_collector(cls):
+        """ 수집기 프로세스에 센티넬을 보내고 기록이 끝날 때까지 기다림 """
+        if cls.collector is None:
+            return
+        atexit.unregister(cls.stop_log_collector)
+        cls.collector_queue.put(None)
+        cls.collector.join()
+        cls.collector = None
+        cls.collector_queue = None
+
+    @classmethod
+    def create_event_log(cls, logs_path, filename='dervet_events.jsonl'):
+        """ 이벤트마다 JSON 객체 한 줄을 기록하는 구조화된 이벤트 로그를 엶. 이벤트는 이 메서드를 호출한 뒤에만
+        기록되므로, 호출하지 않으면 아래의 도우미 메서드는 비용이 없음.
+        이벤트는 일반 로그와 같은 로거로 기록되고, 이벤트 로그 핸들러는 EventFilter로 이벤트 레코드만 씀.
+        비동기 모드 (create_log(asynchronous=True))에서는 핸들러가 리스너 스레드에 추가됨
+
+        Args:
+            logs_path (Path): 로그 파일을 저장할 디렉토리
+            filename (str): 이벤트 로그 파일의 이름
+
+        """
+        os.makedirs(logs_path, exist_ok=True)
+        handler = logging.FileHandler(Path(logs_path) / filename, mode='w')
+        handler.setFormatter(JsonFormatter())
+        handler.addFilter(EventFilter(True))
+        if getattr(cls, 'logger', None) is None:
+            cls.logger = logging.getLogger('Error')
+        cls.logger.setLevel(logging.DEBUG)
+        cls.add_handler(handler)
+        cls.events_enabled = True
+
+    @classmethod
+    def event(cls, event_type, stream=None, window=None, level=logging.INFO, **fields):
+        """ 구조화된 이벤트를 하나 기록함
+
+        Args:
+            event_type (str): 기록하는 내용 (ex. 'solve time')
+            stream (str): 이벤트가 속한 Value Stream의 이름
+            window (int, str): 최적화 창의 번호/레이블
+            level (int): 이벤트의 로깅 레벨
+            fields: 기록할 숫자 (또는 JSON으로 바꿀 수 있는) 값. JsonFormatter.CORE_KEYS의 이름은 쓸 수 없음
+
+        """
+        if not cls.events_enabled:
+            return
+        clashes = [key for key in JsonFormatter.CORE_KEYS if key in fields]
+        if clashes:
+            raise ParameterError(f'event fields {clashes} would overwrite the core keys of the "{event_type}" event')
+        # 시나리오와 Value Stream 이름은 기록 시점에 레코드에 붙임 (형식 지정은 리스너/수집기에서 나중에 될 수 있음)
+        cls.logger.log(level, event_type, extra={'event_type': event_type, 'stream_name': stream, 'window': window,
+                                                 'fields': fields, 'scenario': cls.context.get('scenario', '-'),
+                                                 'stream': cls.context.get('stream', '-')})
+
+    @classmethod
+    def problem_size(cls, window, num_variables, num_constraints, stream=None):
+        cls.event('problem size', stream, window, variables=int(num_variables), constraints=int(num_constraints))
+
+    @classmethod
+    def build_time(cls, window, seconds, stream=None):
+        cls.event('build time', stream, window, seconds=float(seconds))
+
+    @classmethod
+    def solve_time(cls, window, seconds, solver=None):
+        cls.event('solve time', None, window, seconds=float(seconds), solver=solver)
+
+    @classmethod
+    def solver_status(cls, window, status, solver=None):
+        level = logging.INFO if status in ('optimal', 'optimal_inaccurate') else logging.WARNING
+        cls.event('solver status', None, window, level, status=status, solver=solver)
+
+    @classmethod
+    def objective_contribution(cls, window, objective_expressions):
+        """ 해결 후 목적 함수의 각 부분의 값을 기록함
+
+        Args:
+            window (int, str): 최적화 창의 번호/레이블
+            objective_expressions (dict): Value Stream 이름을 키로 가지는 목적 함수의 부분
+                (ValueStream.objective_function이 반환하는 형태)
+
+        """
+        for stream, expression in objective_expressions.items():
+            value = getattr(expression, 'value', expression)
+            cls.event('objective contribution', stream, window, value=None if value is None else float(value))
 
     @classmethod
     def debug(cls, msg):
@@ -0,0 +1,115 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+EventIndex.py
+
+This Python class maps optimization windows to the few timesteps of a sparse time series (ex. the
+RA event intervals) that fall inside them, with a binary search over sorted integer positions
+instead of intersecting timestamp indexes for every window.
+"""
+import numpy as np
+
+
+class EventIndex:
+    """ The sorted integer positions of a set of event timestamps within the horizon index.
+    The events in a window of contiguous timesteps [start, stop) are the slice
+    positions[searchsorted(start):searchsorted(stop)], found in O(log n).
+
+    """
+
+    def __init__(self, index, events):
+        """
+        Args:
+            index (DatetimeIndex): the time series index the windows' masks are on
+            events (DatetimeIndex): the timestamps of the events (ex. RA event intervals); events that
+                are not in INDEX are left out
+        """
+        positions = index.get_indexer(events)
+        in_index = np.flatnonzero(positions >= 0)
+        self.order = in_index[np.argsort(positions[in_index], kind='stable')]
+        self.positions = positions[self.order]
+
+    def __len__(self):
+        return len(self.positions)
+
+    def window_slice(self, start, stop):
+        """
+        Args:
+            start (int): position of the first timestep of the window
+            stop (int): position one past the last timestep of the window
+
+        Returns: the slice of the sorted event positions that are in the window
+
+        """
+        lo, hi = np.searchsorted(self.positions, [start, stop])
+        return slice(int(lo), int(hi))
+
+    def window_events(self, start, stop):
+        """
+        Args:
+            start (int): position of the first timestep of the window
+            stop (int): position one past the last timestep of the window
+
+        Returns: the rows of the event series (in the order the events were given) that are in the
+            window, sorted by time
+
+        """
+        return self.order[self.window_slice(start, stop)]
+
+    def events_at(self, positions):
+        """
+        Args:
+            positions (ndarray): positions of the timesteps of a window that need not be contiguous
+
+        Returns: the rows of the event series that are at POSITIONS, sorted by time
+
+        """
+        return self.order[np.isin(self.positions, positions)]
+
+    @staticmethod
+    def locate(index, timestamps):
+        """ Binary search for TIMESTAMPS in the sorted INDEX, keeping only the exact hits.
+
+        Args:
+            index (DatetimeIndex): a sorted time series index
+            timestamps (DatetimeIndex): the timestamps to find
+
+        Returns: the positions of the found timestamps in INDEX, and a boolean array that is true for
+            the timestamps that were found
+
+        """
+        positions = index.searchsorted(timestamps)
+        found = positions < len(index)
+        found[found] = index[positions[found]] == timestamps[found]
+        return positions[found], found
+
+    def has_events(self, start, stop):
+        window = self.window_slice(start, stop)
+        return window.stop > window.start
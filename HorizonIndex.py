@@ -0,0 +1,141 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+HorizonIndex.py
+
+This Python class holds the one time index that covers the whole analysis horizon. It is
+created once and shared by identity by every value stream, so that series and reports built
+on it line up without any reindexing.
+"""
+import numpy as np
+from functools import cached_property
+from storagevet.ErrorHandling import *
+
+
+class HorizonIndex:
+    """ The canonical DatetimeIndex of a scenario, with its year masks computed once and cached.
+
+    """
+
+    def __init__(self, index):
+        """
+        Args:
+            index (DatetimeIndex): the time series index of the whole analysis horizon
+        """
+        self.index = index
+        self.year_masks = {}
+        # (mask, start, stop, size) of the last optimization window asked for
+        self.last_window = None
+
+    def __len__(self):
+        return len(self.index)
+
+    @cached_property
+    def years(self):
+        return np.asarray(self.index.year)
+
+    def year_mask(self, year):
+        """ Boolean array that is true for the timesteps in YEAR (cached)
+
+        Args:
+            year (int): the year
+
+        """
+        if year not in self.year_masks:
+            self.year_masks[year] = self.years == year
+        return self.year_masks[year]
+
+    @staticmethod
+    def span(mask):
+        """ Integer positions of the first and (one past the) last timestep of an optimization
+        window, and the number of timesteps in it.
+
+        Args:
+            mask (DataFrame, Series, array): boolean array that is true for the timesteps in
+                the window
+
+        Returns: tuple (start, stop, size), such that index[start:stop] spans the window (the
+            window is contiguous if stop - start == size)
+
+        """
+        positions = np.flatnonzero(np.asarray(mask))
+        if not len(positions):
+            return 0, 0, 0
+        return positions[0], positions[-1] + 1, len(positions)
+
+    def window_span(self, mask):
+        """ The span (see span) of an optimization window on this horizon. Every value stream asks
+        for the span of the same mask while the window's problem is built, so the span of the last
+        mask is kept and found again by identity (masks are not changed in place).
+
+        Args:
+            mask (Series): boolean array on this horizon's index
+
+        Returns: tuple (start, stop, size)
+
+        """
+        if self.last_window is None or self.last_window[0] is not mask:
+            self.last_window = (mask,) + self.span(mask)
+        return self.last_window[1:]
+
+    def window_offsets(self, mask):
+        """
+        Args:
+            mask (Series): boolean array that is true for the timesteps in the window
+
+        Returns: tuple (start, stop), such that horizon.index[start:stop] spans the window
+
+        """
+        start, stop, _ = self.window_span(mask)
+        return start, stop
+
+    def align(self, data):
+        """ Puts DATA on the canonical index. DATA must already have the same timestamps; its
+        index is simply swapped for the shared one (no data is copied). Data on any other index is
+        rejected rather than reindexed, because reindexing would fill the missing timesteps with NaN.
+
+        Args:
+            data (Series, DataFrame): time series data
+
+        Returns: DATA, whose index is this horizon's index object
+
+        """
+        if not hasattr(data, 'index') or data.index is self.index:
+            return data
+        if not data.index.equals(self.index):
+            missing = self.index.difference(data.index)
+            extra = data.index.difference(self.index)
+            name = getattr(data, 'name', None) or 'time series data'
+            raise TimeseriesDataError(f'{name} does not match the analysis horizon: {len(missing)} timesteps '
+                                 f'are missing (first: {missing[0] if len(missing) else None}), {len(extra)} '
+                                 f'are outside it (first: {extra[0] if len(extra) else None})')
+        data = data.copy(deep=False)
+        data.index = self.index
+        return data
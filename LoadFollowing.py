@@ -34,9 +34,9 @@ This Python class contains methods and attributes specific for service analysis
 within StorageVet.
 """
 from storagevet.ValueStreams.MarketServiceUpAndDown import MarketServiceUpAndDown
+from storagevet.ValueStreams.ValueStream import stream_context
 import cvxpy as cvx
 import numpy as np
-import storagevet.Library as Lib
 from storagevet.ErrorHandling import *
 
 
@@ -51,9 +51,9 @@ class LoadFollowing(MarketServiceUpAndDown):
         Args:
             params (Dict): input parameters
         """
-        MarketServiceUpAndDown.__init__(self, 'LF', 'Load Following', params)    """MarketServiceUpAndDown 클래스의 생성자를 호출하여 해당 클래스의 초기화를 먼저 수행/params라는 딕셔너리 형태의 입력 매개변수를 받음"""
-        self.u_ts_constraints = params.get('u_ts_constraints', False)            """u_ts_constraints 속성 설정"""
-        self.d_ts_constraints = params.get('d_ts_constraints', False)            """d_ts_constraints 속성 설정"""
+        MarketServiceUpAndDown.__init__(self, 'LF', 'Load Following', params)  # MarketServiceUpAndDown 클래스의 생성자를 호출하여 해당 클래스의 초기화를 먼저 수행/params라는 딕셔너리 형태의 입력 매개변수를 받음
+        self.u_ts_constraints = params.get('u_ts_constraints', False)  # u_ts_constraints 속성 설정
+        self.d_ts_constraints = params.get('d_ts_constraints', False)  # d_ts_constraints 속성 설정
         if self.u_ts_constraints:
             self.regu_max = params['lf_u_max']
             self.regu_min = params['lf_u_min']
@@ -61,7 +61,7 @@ class LoadFollowing(MarketServiceUpAndDown):
             self.regd_max = params['lf_d_max']
             self.regd_min = params['lf_d_min']
 
-        if self.dt > 0.25:                                                    """dt가 0.25보다 클 경우 경고메시지 출력"""
+        if self.dt > 0.25:  # dt가 0.25보다 클 경우 경고메시지 출력
             TellUser.warning("WARNING: using Load Following Service and " +
                              "time series timestep is greater than 15 min.")
 
@@ -78,30 +78,30 @@ class LoadFollowing(MarketServiceUpAndDown):
                 loads in this simulation
 
         """
-        super().grow_drop_data(years, frequency, load_growth)                     """부모 클래스인 MarketServiceUpAndDown의 grow_drop_data 메서드를 호출하여 해당 메서드 먼저 실행"""
-        self.eou_avg = Lib.fill_extra_data(self.eou_avg, years, 0, frequency)     """eou_avg변수에 대해 Lib.fill_extra_data 함수를 사용하여 추가된 데이터를 0으로 채움"""
-        self.eou_avg = Lib.drop_extra_data(self.eou_avg, years)                   """eou_avg 변수에 대해 Lib.drop_extra_data 함수를 사용하여 추가된 데이터 중 불필요한 데이터를 삭제"""
+        super().grow_drop_data(years, frequency, load_growth)  # 부모 클래스인 MarketServiceUpAndDown의 grow_drop_data 메서드를 호출하여 해당 메서드 먼저 실행
+        self.eou_avg = self.grow_drop_input(self.eou_avg, years, 0, frequency)
 
-        self.eod_avg = Lib.fill_extra_data(self.eod_avg, years, 0, frequency)
-        self.eod_avg = Lib.drop_extra_data(self.eod_avg, years)
+        self.eod_avg = self.grow_drop_input(self.eod_avg, years, 0, frequency)
 
         if self.u_ts_constraints:
-            self.regu_max = Lib.fill_extra_data(self.regu_max, years,
-                                                0, frequency)
-            self.regu_max = Lib.drop_extra_data(self.regu_max, years)
+            self.regu_max = self.grow_drop_input(self.regu_max, years, 0, frequency)
 
-            self.regu_min = Lib.fill_extra_data(self.regu_min, years,
-                                                0, frequency)
-            self.regu_min = Lib.drop_extra_data(self.regu_min, years)
+            self.regu_min = self.grow_drop_input(self.regu_min, years, 0, frequency)
 
         if self.d_ts_constraints:
-            self.regd_max = Lib.fill_extra_data(self.regd_max, years,
-                                                0, frequency)
-            self.regd_max = Lib.drop_extra_data(self.regd_max, years)
+            self.regd_max = self.grow_drop_input(self.regd_max, years, 0, frequency)
 
-            self.regd_min = Lib.fill_extra_data(self.regd_min, years,
-                                                0, frequency)
-            self.regd_min = Lib.drop_extra_data(self.regd_min, years)             """그 과정 반복"""
+            self.regd_min = self.grow_drop_input(self.regd_min, years, 0, frequency)
+
+        # 공유 인덱스 위에 놓아, 다른 서비스의 시계열과 재정렬 없이 연산되도록 함
+        self.eou_avg = self.prepare_input(self.eou_avg)
+        self.eod_avg = self.prepare_input(self.eod_avg)
+        if self.u_ts_constraints:
+            self.regu_max = self.prepare_input(self.regu_max)
+            self.regu_min = self.prepare_input(self.regu_min)
+        if self.d_ts_constraints:
+            self.regd_max = self.prepare_input(self.regd_max)
+            self.regd_min = self.prepare_input(self.regd_min)
 
     def get_energy_option_up(self, mask):                      
         """ transform the energy option up into a n x 1 vector
@@ -112,8 +112,7 @@ class LoadFollowing(MarketServiceUpAndDown):
         Returns: a CVXPY vector
 
         """
-        return cvx.Parameter(sum(mask), value=self.eou_avg.loc[mask].values,
-                             name='LF_EOU')                                     """'mask'에 해당하는 시점들의 'eou_avg'데이터를 사용하여 CVXPY의 파라미터 생성 (상향 에너지 옵션)"""
+        return self.parameter('EOU', lambda m: self.window_values(self.eou_avg, m), mask)  # 'mask'에 해당하는 시점들의 'eou_avg'데이터를 사용하여 CVXPY의 파라미터 생성 (상향 에너지 옵션)
 
     def get_energy_option_down(self, mask):
         """ transform the energy option down into a n x 1 vector
@@ -124,9 +123,9 @@ class LoadFollowing(MarketServiceUpAndDown):
         Returns: a CVXPY vector
 
         """
-        return cvx.Parameter(sum(mask), value=self.eod_avg.loc[mask].values,
-                             name='LF_EOD')                                   """'mask'에 해당하는 시점들의 'eod_avg'데이터를 사용하여 CVXPY의 파라미터 생성 (하향 에너지 옵션)"""
+        return self.parameter('EOD', lambda m: self.window_values(self.eod_avg, m), mask)  # 'mask'에 해당하는 시점들의 'eod_avg'데이터를 사용하여 CVXPY의 파라미터 생성 (하향 에너지 옵션)
 
+    @stream_context
     def constraints(self, mask, load_sum, tot_variable_gen, generator_out_sum,
                     net_ess_power, combined_rating):
         """build constraint list method for the optimization engine
@@ -150,30 +149,77 @@ class LoadFollowing(MarketServiceUpAndDown):
         """
         constraint_list = super().constraints(mask, load_sum, tot_variable_gen,
                                               generator_out_sum,
-                                              net_ess_power, combined_rating)        """상위 클래스인 MarketServiceUpAndDown의 constraints 메서드를 호출하여 초기 제약 조건 목록을 가져옴"""
+                                              net_ess_power, combined_rating)  # 상위 클래스인 MarketServiceUpAndDown의 constraints 메서드를 호출하여 초기 제약 조건 목록을 가져옴
 
         # add time series service participation constraints, if called for
         #   Reg Up Max and Reg Up Min will constrain the sum of up_ch + up_dis
         if self.u_ts_constraints:
             constraint_list += [
-                cvx.NonPos(self.variables['up_ch'] + self.variables['up_dis']
-                           - self.regu_max.loc[mask])
-            ]                                                                       """상향 참여의 제약 조건으로, up_ch와 up_dis의 합이 regu_max를 초과하지 않아야 함"""
+                self.relaxed_non_pos('Reg Up Max', self.variables['up_ch'] + self.variables['up_dis']
+                                     - self.broadcast(self.on_participating('up_ch', self.window_values(self.regu_max, mask))),
+                                     self.variable_shape('up_ch', sum(mask)), 'up_ch')
+            ]  # 상향 참여의 제약 조건으로, up_ch와 up_dis의 합이 regu_max를 초과하지 않아야 함
             constraint_list += [
-                cvx.NonPos((-1) * self.variables['up_ch'] + (-1) * self.variables[
-                    'up_dis'] + self.regu_min.loc[mask])
-            ]                                                                       """상향 참여의 제약 조건으로, up_ch와 up_dis의 합이 regu_min 미만이어야 함"""
+                self.relaxed_non_pos('Reg Up Min', (-1) * self.variables['up_ch'] + (-1) * self.variables[
+                    'up_dis'] + self.broadcast(self.on_participating('up_ch', self.window_values(self.regu_min, mask))),
+                                     self.variable_shape('up_ch', sum(mask)), 'up_ch')
+            ]  # 상향 참여의 제약 조건으로, up_ch와 up_dis의 합이 regu_min 미만이어야 함
         #   Reg Down Max and Reg Down Min will constrain the sum down_ch+down_dis
         if self.d_ts_constraints:
             constraint_list += [
-                cvx.NonPos(self.variables['down_ch'] + self.variables['down_dis']
-                           - self.regd_max.loc[mask])
-            ]                                                                       """하향 참여의 제약 조건으로, down_ch와 down_dis의 합이 regd_max를 초과하지 않아야 함"""
+                self.relaxed_non_pos('Reg Down Max', self.variables['down_ch'] + self.variables['down_dis']
+                                     - self.broadcast(self.on_participating('down_ch', self.window_values(self.regd_max, mask))),
+                                     self.variable_shape('down_ch', sum(mask)), 'down_ch')
+            ]  # 하향 참여의 제약 조건으로, down_ch와 down_dis의 합이 regd_max를 초과하지 않아야 함
             constraint_list += [
-                cvx.NonPos(-self.variables['down_ch'] - self.variables['down_dis']
-                           + self.regd_min.loc[mask])
-            ]                                                                        """하향 참여의 제약 조건으로, down_ch와 down_dis의 합이 regd_min를 미만이어야 함"""
-        return constraint_list  """최적화 엔진에 추가할 모든 제약 조건을 구축하고 반환"""
+                self.relaxed_non_pos('Reg Down Min', -self.variables['down_ch'] - self.variables['down_dis']
+                                     + self.broadcast(self.on_participating('down_ch', self.window_values(self.regd_min, mask))),
+                                     self.variable_shape('down_ch', sum(mask)), 'down_ch')
+            ]  # 하향 참여의 제약 조건으로, down_ch와 down_dis의 합이 regd_min를 미만이어야 함
+        return constraint_list  # 최적화 엔진에 추가할 모든 제약 조건을 구축하고 반환
+
+    def participation(self, mask):
+        """ Presolve: where the time series Reg Up (Down) Max is 0 (and the Min is not positive),
+        the up (down) variables are forced to 0 and are left out of the problem. In a combined
+        market up and down are equal, so both are left out where either is forced to 0.
+
+        Args:
+            mask (DataFrame): A boolean array that is true for indices
+                corresponding to time_series data included in the subs data set
+
+        Returns: dictionary of variable name to a boolean array over the window
+
+        """
+        window = int(sum(mask))
+        up = np.ones(window, dtype=bool)
+        down = np.ones(window, dtype=bool)
+        if self.u_ts_constraints:
+            up = (self.window_values(self.regu_max, mask) > 0) | (self.window_values(self.regu_min, mask) > 0)
+        if self.d_ts_constraints:
+            down = (self.window_values(self.regd_max, mask) > 0) | (self.window_values(self.regd_min, mask) > 0)
+        if self.combined_market:
+            up = down = up & down
+        return {'up_ch': up, 'up_dis': up, 'down_ch': down, 'down_dis': down}
+
+    def input_columns(self):
+        """ The time series input columns this service reads in update_price_signals
+
+        Returns: dictionary of column name to dtype
+
+        """
+        if self.combined_market:
+            columns = {'LF Price ($/kW)': 'float64', 'DA Price ($/kWh)': 'float64'}
+        else:
+            columns = {'LF Up Price ($/kW)': 'float64', 'LF Down Price ($/kW)': 'float64',
+                       'DA Price ($/kWh)': 'float64'}
+        # 열 이름은 입력 규칙에서 정해지므로, 데이터를 읽기 전에도 (ts_constraints 설정만으로) 목록을 만들 수 있음
+        if self.u_ts_constraints:
+            columns['LF Up Max (kW)'] = 'float64'
+            columns['LF Up Min (kW)'] = 'float64'
+        if self.d_ts_constraints:
+            columns['LF Down Max (kW)'] = 'float64'
+            columns['LF Down Min (kW)'] = 'float64'
+        return columns
 
     def update_price_signals(self, monthly_data, time_series_data):
         """ Updates attributes related to price signals with new price signals
@@ -188,30 +234,30 @@ class LoadFollowing(MarketServiceUpAndDown):
         """
         if self.combined_market:                                      
             try:
-                fr_price = time_series_data.loc[:, 'LF Price ($/kW)']         """LF Price ($/kW) 열을 시계열 데이터로부터 가져와 fr_price변수에 할당"""
+                fr_price = time_series_data.loc[:, 'LF Price ($/kW)']  # LF Price ($/kW) 열을 시계열 데이터로부터 가져와 fr_price변수에 할당
             except KeyError:
                 pass
             else: 
-                self.p_regu = np.divide(fr_price, 2)                         """LF Price($/kW)값을 2로나눈 값을 self.p_regu에 할당"""
-                self.p_regd = np.divide(fr_price, 2)                         """LF Price($/kW)값을 2로나눈 값을 self.p_regd에 할당"""
+                self.price_up = np.divide(fr_price, 2)  # LF Price($/kW)값을 2로나눈 값을 self.price_up에 할당
+                self.price_down = np.divide(fr_price, 2)  # LF Price($/kW)값을 2로나눈 값을 self.price_down에 할당
 
             try:
-                self.price = time_series_data.loc[:, 'DA Price ($/kWh)']     """DA Price ($/kWh)열을 시계열 데이터로부터 가져와 self.price에 할"""
+                self.price_energy = time_series_data.loc[:, 'DA Price ($/kWh)']  # DA Price ($/kWh)열을 시계열 데이터로부터 가져와 self.price_energy에 할
             except KeyError:
                 pass
         else:
             try:
-                self.p_regd = time_series_data.loc[:, 'LF Down Price ($/kW)']  """LF Down Price ($/kW)열을 시계열 데이터로부터 가져와 self.p_regd에 할당"""
+                self.price_down = time_series_data.loc[:, 'LF Down Price ($/kW)']  # LF Down Price ($/kW)열을 시계열 데이터로부터 가져와 self.price_down에 할당
             except KeyError:                                            
                 pass
 
             try:
-                self.p_regu = time_series_data.loc[:, 'LF Up Price ($/kW)']    """LF Up Price ($/kW) 열을 시계열 데이터로부터 가져와 self.p_regu에 할당"""
+                self.price_up = time_series_data.loc[:, 'LF Up Price ($/kW)']  # LF Up Price ($/kW) 열을 시계열 데이터로부터 가져와 self.price_up에 할당
             except KeyError:
                 pass
 
             try:
-                self.price = time_series_data.loc[:, 'DA Price ($/kWh)']      """DA Price ($/kWh)' 열을 시계열 데이터로부터 가져와 self.price에 할당"""
+                self.price_energy = time_series_data.loc[:, 'DA Price ($/kWh)']  # DA Price ($/kWh)' 열을 시계열 데이터로부터 가져와 self.price_energy에 할당
             except KeyError:
                 pass
 
@@ -32,11 +32,11 @@ MarketServiceUp.py
 
 This Python class contains methods and attributes specific for service analysis within StorageVet.
 """
-from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.ValueStream import ValueStream, stream_context
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
 import numpy as np
 import cvxpy as cvx
 import pandas as pd
-import storagevet.Library as Lib
 
 # 에너지 저장 시스템이 참여하는 시장 서비스를 나타내며, 최적화 문제의 목적 함수 및 제약 조건을 생성하고 관리하는 데 사용됩니다.
 
@@ -58,8 +58,13 @@ class MarketServiceUp(ValueStream):
         self.growth = params['growth']/100  # growth rate of spinning reserve price (%/yr)
         self.duration = params['duration']  
         self.full_name = full_name
+        # optional timeseries limits on the sum of ch_less and dis_more (SR and NSR)
+        self.ts_constraints = params.get('ts_constraints', False)
+        if self.ts_constraints:
+            self.max = params['max']
+            self.min = params['min']
         self.variable_names = {'ch_less', 'dis_more'}
-        self.variables_df = pd.DataFrame(columns=self.variable_names)
+        self.variables_df = pd.DataFrame(columns=sorted(self.variable_names))
 
     def grow_drop_data(self, years, frequency, load_growth):
      # 주어진 데이터를 성장시키거나 추가된 데이터를 제거
@@ -74,8 +79,11 @@ class MarketServiceUp(ValueStream):
                 simulation
 
         """
-        self.price = Lib.fill_extra_data(self.price, years, self.growth, frequency)  # 시장 서비스의 price 속성에 대해 주어진 연도와 성장률을 사용하여 추가 데이터를 성장
-        self.price = Lib.drop_extra_data(self.price, years)                          # 시장 서비스의 price 속성에서 주어진 연도에 해당하는 데이터를 제거
+        self.price = self.grow_drop_input(self.price, years, self.growth, frequency)  # 주어진 연도와 성장률로 데이터를 성장시키고 분석 연도 밖의 데이터를 제거
+        self.price = self.prepare_input(self.price)
+        if self.ts_constraints:
+            self.max = self.prepare_input(self.grow_drop_input(self.max, years, self.growth, frequency))
+            self.min = self.prepare_input(self.grow_drop_input(self.min, years, self.growth, frequency))
 
     def initialize_variables(self, size):
      # 최적화에 필요한 변수들을 초기화하고 딕셔너리에 추가
@@ -93,10 +101,11 @@ class MarketServiceUp(ValueStream):
         Returns:
             Dictionary of optimization variables
         """
-        self.variables = {'ch_less': cvx.Variable(shape=size, name=f'{self.name}_ch_less'),    
-                          'dis_more': cvx.Variable(shape=size, name=f'{self.name}_dis_more')}
+        self.variables = {'ch_less': self.new_variable('ch_less', size),
+                          'dis_more': self.new_variable('dis_more', size)}
      # CVXPY라이브러리를 사용하여 최적화 변수(ch_less,dis_more)를 self.variables에 저장
 
+    @stream_context
     def objective_function(self, mask, load_sum, tot_variable_gen, generator_out_sum,
                            net_ess_power, annuity_scalar=1):
         """ Generates the full objective function, including the optimization variables.
@@ -119,14 +128,15 @@ class MarketServiceUp(ValueStream):
             cvxpy solver.
 
         """
-        payment = cvx.Parameter(sum(mask), value=self.price.loc[mask].values,
-                                name=f'{self.name}_price')
+        payment = self.parameter('price', lambda m: self.on_participating('ch_less', self.window_values(self.price, m)),
+                                 mask)
 # CVXPY 라이브러리를 사용하여 payment를 생성/ payment는 시간에 따른 가격을 나타냄
+        # payment @ (T or T x N) keeps the objective a single vectorized product in portfolio mode
         return {
             self.name: cvx.sum(
-                cvx.multiply(-payment, self.variables['ch_less']) +
-                cvx.multiply(-payment, self.variables['dis_more'])) * self.dt * annuity_scalar}
+                -payment @ (self.variables['ch_less'] + self.variables['dis_more'])) * self.dt * annuity_scalar}
 # CVXPY 라이브러리를 사용하여 최적화 변수와 가격을 사용하여 최종 목적 함수를 정의
+    @stream_context
     def constraints(self, mask, load_sum, tot_variable_gen, generator_out_sum, net_ess_power,
                     combined_rating):
         """Default build constraint list method. Used by services that do not have constraints.
@@ -149,8 +159,51 @@ class MarketServiceUp(ValueStream):
         constraint_list = []
         constraint_list += [cvx.NonPos(-self.variables['ch_less'])]        # self.variables['ch_less'] 변수가 음수가 되도록 하는 제약 조건을 생성/이는 충전 용량을 음수로 제한하려는 의도
         constraint_list += [cvx.NonPos(-self.variables['dis_more'])]       # self.variables['dis_more'] 변수가 음수가 되도록 하는 제약 조건을 생성/이는 방 용량을 음수로 제한하려는 의도
+        if self.ts_constraints:
+            # the timeseries Max and Min limit the sum of ch_less and dis_more
+            size = self.variable_shape('ch_less', sum(mask))
+            reserved = self.variables['ch_less'] + self.variables['dis_more']
+            constraint_list += [self.relaxed_non_pos('Max', reserved - self.limit_on_window(self.max, mask),
+                                                     size, 'ch_less')]
+            constraint_list += [self.relaxed_non_pos('Min', self.limit_on_window(self.min, mask) - reserved,
+                                                     size, 'ch_less')]
         return constraint_list
 
+    def limit_on_window(self, limit, mask):
+        """ Returns: the timeseries LIMIT over the participating timesteps of the window, broadcast
+            to every site in portfolio mode
+        """
+        return self.broadcast(self.on_participating('ch_less', self.window_values(limit, mask)))
+
+    def participation(self, mask):
+        """ Presolve: ch_less and dis_more are only kept in the intervals where the price is
+        positive. Elsewhere the service earns nothing, so reserving capacity for it is never
+        better than reserving none.
+
+        Args:
+            mask (DataFrame): A boolean array that is true for indices corresponding to time_series
+                data included in the subs data set
+
+        Returns: dictionary of variable name to a boolean array over the window
+
+        """
+        participating = self.participating_intervals(mask)
+        return {'ch_less': participating, 'dis_more': participating}
+
+    def participating_intervals(self, mask):
+        """ The service participates where the price is positive and the timeseries max (if any)
+        is positive, and wherever the timeseries min is positive (the min forces a reservation).
+
+        Returns: a boolean array over the window that is False where the variables are zero at
+            the optimum
+
+        """
+        participating = self.window_values(self.price, mask) > 0
+        if self.ts_constraints:
+            participating = (participating & (self.window_values(self.max, mask) > 0)) | \
+                            (self.window_values(self.min, mask) > 0)
+        return participating
+
     def p_reservation_charge_up(self, mask):
         """ the amount of charging power in the up direction (supplying power up into the grid)
         that needs to be reserved for this value stream
@@ -162,7 +215,7 @@ class MarketServiceUp(ValueStream):
         Returns: CVXPY parameter/variable
 
         """
-        return self.variables['ch_less']
+        return self.variable('ch_less')
 # 최적화 문제에서 충전으로 전력을 제어할 때 사용
     def p_reservation_discharge_up(self, mask):
         """ the amount of discharge power in the up direction (supplying power up into the grid)
@@ -175,7 +228,7 @@ class MarketServiceUp(ValueStream):
         Returns: CVXPY parameter/variable
 
         """
-        return self.variables['dis_more']
+        return self.variable('dis_more')
 # 최적화 문제에서 방전으로 전력을 제어할 때 사용
     def worst_case_uenergy_provided(self, mask):
         """ the amount of energy, from the current SOE that needs to be reserved for this value
@@ -194,7 +247,7 @@ class MarketServiceUp(ValueStream):
             less energy than expected
 
         """
-        provided = self.variables['ch_less']*self.duration + self.variables['dis_more']*self.duration # 현재 시간 텀 내에서 충전 및 방전에 의해 제공되는 에너지를 나타냄/ 음수일 때 많은 에너지 공급. 양수일 때 적은 에너지 공
+        provided = self.variable('ch_less')*self.duration + self.variable('dis_more')*self.duration # 현재 시간 텀 내에서 충전 및 방전에 의해 제공되는 에너지를 나타냄/ 음수일 때 많은 에너지 공급. 양수일 때 적은 에너지 공
         return provided
 
     def timeseries_report(self):
@@ -204,12 +257,34 @@ class MarketServiceUp(ValueStream):
             results pertaining to this instance
 
         """
-        report = pd.DataFrame(index=self.price.index)
-        report.loc[:, f"{self.name} Price ($/kW)"] = self.price        # self.price를 report 데이터 프레임에 추가 ValueStream의 가격정보를 나타냄
-        report.loc[:, f"{self.full_name} Up (Charging) (kW)"] = self.variables_df['ch_less'] # self.price를 report 데이터 프레임에 추가 ValueStream의 충전 전력량을 나타냄
-        report.loc[:, f"{self.full_name} Up (Discharging) (kW)"] = self.variables_df['dis_more'] # self.price를 report 데이터 프레임에 추가 ValueStream의 방전 전력량를 나타냄
+        return ReportBuilder.build([self], self.report_index(self.price.index))
 
-        return report
+    def report_columns(self):
+        """ The columns of this Value Stream's timeseries report, in order
+
+        Returns: list of (column name, 'float' or 'bool')
+
+        """
+        columns = [(f"{self.name} Price ($/kW)", 'float'),
+                   (f"{self.full_name} Up (Charging) (kW)", 'float'),
+                   (f"{self.full_name} Up (Discharging) (kW)", 'float')]
+        if self.ts_constraints:
+            columns += [(self.max.name, 'float'), (self.min.name, 'float')]
+        return columns
+
+    def fill_report(self, builder):
+        """ Fills the columns declared in report_columns
+
+        Args:
+            builder (ReportBuilder): the report builder of the scenario
+
+        """
+        builder[f"{self.name} Price ($/kW)"] = self.price        # ValueStream의 가격정보
+        builder[f"{self.full_name} Up (Charging) (kW)"] = self.variables_df['ch_less']      # ValueStream의 충전 전력량
+        builder[f"{self.full_name} Up (Discharging) (kW)"] = self.variables_df['dis_more']  # ValueStream의 방전 전력량
+        if self.ts_constraints:
+            builder[self.max.name] = self.max
+            builder[self.min.name] = self.min
 
     def proforma_report(self, opt_years, apply_inflation_rate_func, fill_forward_func, results):
         """ Calculates the proforma that corresponds to participation in this value stream
@@ -228,16 +303,39 @@ class MarketServiceUp(ValueStream):
         bid = \
             results.loc[:, f'{self.full_name} Up (Charging) (kW)'] + \
             results.loc[:, f'{self.full_name} Up (Discharging) (kW)']
-        spinning_prof = np.multiply(bid, self.price) * self.dt
+        # compact 저장 모드에서도 float64로 누적
+        spinning_prof = np.multiply(bid.astype(np.float64), self.price) * self.dt
 # bid는 충전 및 방전 전력량을 합산한 결과를 나타내는 변수/ bid와 가격 정보를 기반으로 일정 시간동안의 비용 또는 수익 계산(전력요금)
         for year in opt_years:
-            year_subset = spinning_prof[spinning_prof.index.year == year]
+            year_subset = spinning_prof[self.year_mask(spinning_prof.index, year)]
             proforma.loc[pd.Period(year=year, freq='y'), self.full_name] = year_subset.sum()
         # forward fill growth columns with inflation at growth rate
         proforma = fill_forward_func(proforma, self.growth)
 # 각 연도에 대해 proforma를 계산하고, 해당 연도에 대한 결과를 proforma 데이터 프레임에 추
         return proforma
 
+    def min_regulation_down(self):
+        """ Returns: the timeseries min if there is one, otherwise the default of ValueStream """
+        if self.ts_constraints:
+            return self.min
+        return super().min_regulation_down()
+
+    def max_participation_is_defined(self):
+        return hasattr(self, 'max')
+
+    def input_columns(self):
+        """ The time series input columns this service reads in update_price_signals
+
+        Returns: dictionary of column name to dtype
+
+        """
+        columns = {f'{self.name} Price ($/kW)': 'float64'}
+        # 열 이름은 입력 규칙에서 정해지므로, 데이터를 읽기 전에도 (ts_constraints 설정만으로) 목록을 만들 수 있음
+        if self.ts_constraints:
+            columns[f'{self.name} Max (kW)'] = 'float64'
+            columns[f'{self.name} Min (kW)'] = 'float64'
+        return columns
+
     def update_price_signals(self, monthly_data, time_series_data):
         """ Updates attributes related to price signals with new price signals that are saved in
         the arguments of the method. Only updates the price signals that exist, and does not
@@ -34,7 +34,8 @@ This Python class contains methods and attributes that help model market
 services that provide service through discharging more OR charging less
 relative to the power set points.
 """
-from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.ValueStream import ValueStream, stream_context
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
 import cvxpy as cvx
 import pandas as pd
 import numpy as np
@@ -61,7 +62,27 @@ class MarketServiceUpAndDown(ValueStream):
         self.price_down = params['regd_price']
         self.price_up = params['regu_price']
         self.price_energy = params['energy_price']
+        self.variable_names = {'up_ch', 'down_ch', 'up_dis', 'down_dis'}
+        self.variables_df = pd.DataFrame(columns=sorted(self.variable_names))
+        # 지연 계산되는 파생 열의 캐시 (variables_df가 바뀌면 비워짐)
+        self.derived_cache = {}
+        # proforma_report가 계산한 ESS별, 연도별 에너지 정산 비용
+        self.ess_energy_cost = pd.DataFrame()
         
+    def initialize_variables(self, size):
+        """ 최적화 변수를 딕셔너리에 추가 (presolve로 제외된 타임스텝은 변수에 포함되지 않음)
+
+        Args:
+            size (Int): 생성할 최적화 변수의 길이 (창 길이)
+
+        """
+        self.variables = {
+            'up_ch': self.new_variable('up_ch', size, 'up_c'),
+            'down_ch': self.new_variable('down_ch', size, 'regd_c'),
+            'up_dis': self.new_variable('up_dis', size),
+            'down_dis': self.new_variable('down_dis', size, 'regd_d')
+        }
+
     def get_energy_option_up(self, mask):
         """ 상향 에너지 옵션을 n x 1 벡터로 변환
 
@@ -80,6 +101,43 @@ class MarketServiceUpAndDown(ValueStream):
         """
         return cvx.promote(self.eod_avg, mask.loc[mask].shape)
 
+    @stream_context
+    def objective_function(self, mask, load_sum, tot_variable_gen, generator_out_sum,
+                           net_ess_power, annuity_scalar=1):
+        """ 최적화 변수를 포함한 목적 함수 생성. 상향/하향 용량 지불금은 수익, 에너지 스루풋은 에너지 정산 가격으로 비용 처리
+        (proforma_report와 같은 정의). 가격은 Parameter이므로 update_parameters로 바꿀 수 있음
+
+        Args:
+            mask (DataFrame): 데이터 세트에 포함된 시계열 데이터에 대응하는 인덱스에 대한 불리언 배열
+            tot_variable_gen (Expression): 가변 발전원의 총 합
+            load_sum (list, Expression): 시스템 내의 부하의 합
+            generator_out_sum (list, Expression): 시스템 내의 발전의 합
+            net_ess_power (list, Expression): 시스템 내 모든 ESS의 순 전력의 합
+            annuity_scalar (float): 프로젝트 수명 동안의 비용/편익을 반영하는 연간 값에 곱할 스칼라 (사이징할 때만 설정)
+
+        Returns: 목적 함수에서 이 서비스가 차지하는 부분을 이름으로 가지는 딕셔너리
+        """
+        p_regu = self.parameter(
+            'p_regu', lambda m: self.on_participating('up_ch', self.window_values(self.price_up, m)), mask)
+        p_regd = self.parameter(
+            'p_regd', lambda m: self.on_participating('down_ch', self.window_values(self.price_down, m)), mask)
+        # 에너지 정산 가격 * 에너지 옵션을 하나의 Parameter로 만들어 DPP 형태를 유지 (Parameter끼리 곱하지 않음)
+        p_ene_down = self.parameter(
+            'price EOD', lambda m: self.window_values(self.price_energy, m) * self.window_values(self.eod_avg, m), mask)
+        p_ene_up = self.parameter(
+            'price EOU', lambda m: self.window_values(self.price_energy, m) * self.window_values(self.eou_avg, m), mask)
+
+        # 포트폴리오 모드에서는 (T x N) 행렬에 대한 하나의 벡터화된 곱 (사이트별 합을 다시 합산)
+        regulation_up_payment = cvx.sum(p_regu @ (self.variables['up_ch'] + self.variables['up_dis']))
+        regulation_down_payment = cvx.sum(p_regd @ (self.variables['down_ch'] + self.variables['down_dis']))
+        # 에너지 스루풋 (Down은 저장, Up은 제공) * 에너지 정산 가격
+        energy_throughput_cost = cvx.sum(p_ene_down @ (self.variable('down_ch') + self.variable('down_dis'))
+                                         - p_ene_up @ (self.variable('up_ch') + self.variable('up_dis'))) * self.dt
+        return {f'{self.name} Up': -regulation_up_payment * annuity_scalar,
+                f'{self.name} Down': -regulation_down_payment * annuity_scalar,
+                f'{self.name} Energy Throughput': energy_throughput_cost * annuity_scalar}
+
+    @stream_context
     def constraints(self, mask, load_sum, tot_variable_gen, generator_out_sum,
                     net_ess_power, combined_rating):
         """최적화 엔진에 대한 제약 조건 리스트
@@ -112,15 +170,48 @@ class MarketServiceUpAndDown(ValueStream):
 
         Returns: CVXPY parameter/variable
         """
-        return self.variables['up_ch']
+        return self.variable('up_ch')
 # up_ch 최적화 변수 반환/ 전력을 공급하는 경우의 충전전력을 나타냄
     def p_reservation_charge_down(self, mask):
         """ "down" 방향으로 전력을 가져오는 경우에 대한 충전 전력을 이 값이 예약되어야 하는지 여부를 나타내는 CVXPY(ConVex Programming in Python) 매개변수 또는 변수를화
         Args:
             mask (DataFrame): A boolean array that is true for indices
                 corresponding to time_series data included in the subs data set
-        Returns:
+        Returns: CVXPY parameter/variable
+
+        """
+        return self.variable('down_ch')
+
+    def p_reservation_discharge_up(self, mask):
+        """ "up" 방향으로 전력을 공급하는 경우에 대해 예약되어야 하는 방전 전력
+
+        Args:
+            mask (DataFrame): A boolean array that is true for indices
+                corresponding to time_series data included in the subs data set
+        Returns: CVXPY parameter/variable
+
+        """
+        return self.variable('up_dis')
+
+    def p_reservation_discharge_down(self, mask):
+        """ "down" 방향으로 전력을 가져오는 경우에 대해 예약되어야 하는 방전 전력
+
+        Args:
+            mask (DataFrame): A boolean array that is true for indices
+                corresponding to time_series data included in the subs data set
+        Returns: CVXPY parameter/variable
+
+        """
+        return self.variable('down_dis')
+
+    def uenergy_option_stored(self, mask):
+        """ 충전 변경으로 인한 에너지 변화
 
+        Args:
+            mask (DataFrame): A boolean array that is true for indices
+                corresponding to time_series data included in the subs data set
+
+        Returns:
         """
     # get_energy_option_up 및 get_energy_option_down은 다른 곳에서 정의된 메서드로,
     # 각각 "up" 및 "down" 방향의 에너지 옵션을 가져오는 데 사용됩니다.
@@ -128,8 +219,8 @@ class MarketServiceUpAndDown(ValueStream):
         eod = self.get_energy_option_down(mask)
     # up_ch 및 down_ch는 충전 및 방전에 사용되는 변수입니다.
     # cvx.multiply 메서드를 사용하여 각각의 변수에 에너지 옵션을 곱하고 시간 간격(dt)을 곱합니다.
-        e_ch_less = cvx.multiply(self.variables['up_ch'], eou) * self.dt
-        e_ch_more = cvx.multiply(self.variables['down_ch'], eod) * self.dt
+        e_ch_less = cvx.multiply(self.variable('up_ch'), self.broadcast(eou)) * self.dt
+        e_ch_more = cvx.multiply(self.variable('down_ch'), self.broadcast(eod)) * self.dt
     # 충전으로 인한 에너지 변화에서 방전으로 인한 에너지 변화를 뺀 값을 반환합니다.
         return e_ch_less - e_ch_more
 
@@ -145,8 +236,8 @@ class MarketServiceUpAndDown(ValueStream):
 
         eou = self.get_energy_option_up(mask)
         eod = self.get_energy_option_down(mask)
-        e_dis_less = cvx.multiply(self.variables['down_dis'], eod) * self.dt
-        e_dis_more = cvx.multiply(self.variables['up_dis'], eou) * self.dt
+        e_dis_less = cvx.multiply(self.variable('down_dis'), self.broadcast(eod)) * self.dt
+        e_dis_more = cvx.multiply(self.variable('up_dis'), self.broadcast(eou)) * self.dt
      # 방전으로 인한 에너지 변화에서 충전으로 인한 에너지 변화를 뺀 값을 반환합니다.
         return e_dis_more - e_dis_less
 
@@ -168,8 +259,8 @@ class MarketServiceUpAndDown(ValueStream):
 
         """
         stored \
-            = self.variables['down_ch'] * self.duration \
-            + self.variables['down_dis'] * self.duration
+            = self.variable('down_ch') * self.duration \
+            + self.variable('down_dis') * self.duration
     # down_ch: charging power capacity for frequency regulation
     # down_dis: discharging power capacity for frequency regulation
         return stored
@@ -185,10 +276,61 @@ class MarketServiceUpAndDown(ValueStream):
             두 번째 값은 시스템이 예상보다 더 적은 에너지를 가지게 될 경우임
         """
         provided \
-            = self.variables['up_ch'] * -self.duration \
-            + self.variables['up_dis'] * -self.duration
+            = self.variable('up_ch') * -self.duration \
+            + self.variable('up_dis') * -self.duration
         return provided
 
+    def variables_changed(self):
+        """ variables_df가 바뀌었으므로 파생 열 캐시를 비움 """
+        self.derived_cache = {}
+
+    @staticmethod
+    def values_on(data, index):
+        """ DATA(스칼라 또는 Series)를 INDEX 위의 numpy 배열로 반환 (스칼라는 그대로 반환)"""
+        if not isinstance(data, pd.Series):
+            return data
+        if data.index is not index and not data.index.equals(index):
+            data = data.reindex(index)
+        return data.values
+
+    def derived_columns(self):
+        """ variables_df와 에너지 옵션에 대한 표현식으로 정의된 파생 열 (에너지 스루풋).
+        열은 derived()로 접근하거나 보고서로 내보낼 때만 계산됩니다.
+
+        Returns: 열 이름을 키로, 그 값을 (variables_df의 인덱스 위의 numpy 배열로) 계산하는 함수를 값으로 가지는 딕셔너리
+
+        """
+        index = self.variables_df.index
+        column_start = f"{self.name} Energy Throughput"
+        return {
+            f"{column_start} Down (Discharging) (kWh)":
+                lambda: self.values_on(self.eod_avg, index) * self.variables_df['down_dis'].values * self.dt,
+            f"{column_start} Down (Charging) (kWh)":
+                lambda: self.values_on(self.eod_avg, index) * self.variables_df['down_ch'].values * self.dt,
+            f"{column_start} Up (Discharging) (kWh)":
+                lambda: -self.values_on(self.eou_avg, index) * self.variables_df['up_dis'].values * self.dt,
+            f"{column_start} Up (Charging) (kWh)":
+                lambda: -self.values_on(self.eou_avg, index) * self.variables_df['up_ch'].values * self.dt,
+            f"{column_start} (kWh)":
+                lambda: self.derived(f"{column_start} Down (Discharging) (kWh)")
+                + self.derived(f"{column_start} Down (Charging) (kWh)")
+                + self.derived(f"{column_start} Up (Discharging) (kWh)")
+                + self.derived(f"{column_start} Up (Charging) (kWh)"),
+        }
+
+    def derived(self, name):
+        """ 파생 열 NAME의 값을 처음 접근할 때 계산하여 캐시하고 반환
+
+        Args:
+            name (str): derived_columns의 열 이름
+
+        Returns: variables_df의 인덱스 위의 numpy 배열
+
+        """
+        if name not in self.derived_cache:
+            self.derived_cache[name] = self.derived_columns()[name]()
+        return self.derived_cache[name]
+
     def timeseries_report(self):
         """ 이 Value Stream에 대한 최적화 결과를 요약
 
@@ -196,48 +338,64 @@ class MarketServiceUpAndDown(ValueStream):
             summarize the results pertaining to this instance
 
         """
- # 결과를 저장할 빈 데이터프레임 생성
-        report = pd.DataFrame(index=self.price_energy.index)
+        return ReportBuilder.build([self], self.report_index(self.price_energy.index))
+
+    def report_columns(self):
+        """ 이 Value Stream의 시계열 보고서 열 (순서대로)
+
+        Returns: list of (column name, 'float' or 'bool')
+
+        """
+        column_start = f"{self.name} Energy Throughput"
+        columns = [f"{self.name} Up Price ($/kW)",
+                   f"{self.name} Down Price ($/kW)",
+                   f"{self.name} Energy Settlement Price ($/kWh)",
+                   f'{self.full_name} Down (Charging) (kW)',
+                   f'{self.full_name} Down (Discharging) (kW)',
+                   f'{self.full_name} Up (Charging) (kW)',
+                   f'{self.full_name} Up (Discharging) (kW)',
+                   f"{column_start} (kWh)",
+                   f"{column_start} Up (Charging) (kWh)",
+                   f"{column_start} Up (Discharging) (kWh)",
+                   f"{column_start} Down (Charging) (kWh)",
+                   f"{column_start} Down (Discharging) (kWh)"]
+        return [(name, 'float') for name in columns]
+
+    def fill_report(self, builder):
+        """ report_columns에서 선언한 열을 미리 할당된 블록에 채움
+
+        Args:
+            builder (ReportBuilder): 시나리오 전체의 보고서 빌더
+
+        """
         # GIVEN
-        report.loc[:, f"{self.name} Up Price ($/kW)"] \
+        builder[f"{self.name} Up Price ($/kW)"] \
             = self.price_up
-        report.loc[:, f"{self.name} Down Price ($/kW)"] \
+        builder[f"{self.name} Down Price ($/kW)"] \
             = self.price_down
-        report.loc[:, f"{self.name} Energy Settlement Price ($/kWh)"] = \
+        builder[f"{self.name} Energy Settlement Price ($/kWh)"] = \
             self.price_energy
 
         # OPTIMIZATION VARIABLES
-        report.loc[:, f'{self.full_name} Down (Charging) (kW)'] \
+        builder[f'{self.full_name} Down (Charging) (kW)'] \
             = self.variables_df['down_ch']
-        report.loc[:, f'{self.full_name} Down (Discharging) (kW)'] \
+        builder[f'{self.full_name} Down (Discharging) (kW)'] \
             = self.variables_df['down_dis']
-        report.loc[:, f'{self.full_name} Up (Charging) (kW)'] \
+        builder[f'{self.full_name} Up (Charging) (kW)'] \
             = self.variables_df['up_ch']
-        report.loc[:, f'{self.full_name} Up (Discharging) (kW)'] \
+        builder[f'{self.full_name} Up (Discharging) (kW)'] \
             = self.variables_df['up_dis']
 
         # CALCULATED EXPRESSIONS (ENERGY THROUGH-PUTS)
-        e_thru_down_dis = np.multiply(self.eod_avg,
-                                      self.variables_df['down_dis']) * self.dt
-        e_thru_down_ch = np.multiply(self.eod_avg,
-                                     self.variables_df['down_ch']) * self.dt
-        e_thru_up_dis = -np.multiply(self.eou_avg,
-                                     self.variables_df['up_dis']) * self.dt
-        e_thru_up_ch = -np.multiply(self.eou_avg,
-                                    self.variables_df['up_ch']) * self.dt
-        uenergy_down = e_thru_down_dis + e_thru_down_ch
-        uenergy_up = e_thru_up_dis + e_thru_up_ch
-
+        # 에너지 스루풋 및 상세 정보 추가 (이때 처음 계산되어 캐시됨)
+        index = self.variables_df.index
         column_start = f"{self.name} Energy Throughput"
-     # 에너지 스루풋 및 상세 정보 추가
-        report.loc[:, f"{column_start} (kWh)"] = uenergy_down + uenergy_up
-        report.loc[:, f"{column_start} Up (Charging) (kWh)"] = e_thru_up_ch
-        report.loc[:, f"{column_start} Up (Discharging) (kWh)"] = e_thru_up_dis
-        report.loc[:, f"{column_start} Down (Charging) (kWh)"] = e_thru_down_ch
-        report.loc[:, f"{column_start} Down (Discharging) (kWh)"] \
-            = e_thru_down_dis
-
-        return report
+        for name in [f"{column_start} (kWh)",
+                     f"{column_start} Up (Charging) (kWh)",
+                     f"{column_start} Up (Discharging) (kWh)",
+                     f"{column_start} Down (Charging) (kWh)",
+                     f"{column_start} Down (Discharging) (kWh)"]:
+            builder[name] = pd.Series(self.derived(name), index=index)
 
     def proforma_report(self, opt_years, apply_inflation_rate_func, fill_forward_func, results):
         """ 이 value stream에 참여하는 proforma 계산
@@ -254,39 +412,46 @@ class MarketServiceUpAndDown(ValueStream):
                                            fill_forward_func, results)
       # 각각의 가치 스트림에 대한 수익 계산
         pref = self.full_name
-        reg_up = \
-            results.loc[:, f'{pref} Up (Charging) (kW)'] \
-            + results.loc[:, f'{pref} Up (Discharging) (kW)']
-        regulation_up_prof = np.multiply(reg_up, self.price_up)
-
-        reg_down = \
-            results.loc[:, f'{pref} Down (Charging) (kW)'] \
-            + results.loc[:, f'{pref} Down (Discharging) (kW)']
-        regulation_down_prof = np.multiply(reg_down, self.price_down)
+        if self.variables_df.empty:
+            # 저장된 결과만 있는 경우 (ex. 결과 파일에서 다시 계산) 열 이름으로 결과를 찾음
+            index = results.index
+            reg_up = (results.loc[:, f'{pref} Up (Charging) (kW)']
+                      + results.loc[:, f'{pref} Up (Discharging) (kW)']).values
+            reg_down = (results.loc[:, f'{pref} Down (Charging) (kW)']
+                        + results.loc[:, f'{pref} Down (Discharging) (kW)']).values
+            throughput = {name: results.loc[:, name].values.astype(np.float64) for name in self.derived_columns()}
+        else:
+            # 캐시된 numpy 배열을 바로 사용 (레이블 열 조회 없음)
+            index = self.variables_df.index
+            reg_up = self.variables_df['up_ch'].values + self.variables_df['up_dis'].values
+            reg_down = self.variables_df['down_ch'].values + self.variables_df['down_dis'].values
+            throughput = {name: self.derived(name).astype(np.float64) for name in self.derived_columns()}
+        # compact 저장 모드에서도 proforma는 float64로 누적
+        reg_up = reg_up.astype(np.float64)
+        reg_down = reg_down.astype(np.float64)
+        regulation_up_prof = reg_up * self.values_on(self.price_up, index)
+        regulation_down_prof = reg_down * self.values_on(self.price_down, index)
      # 에너지 스루풋 계산
-
-        # NOTE: TODO: here we use rte_list[0] wqhich grabs the first available rte from an active ess
-        #   we will want to change this to actually use all available rte values from the list
-        energy_throughput = \
-            results.loc[:, f"{self.name} Energy Throughput Down (Charging) (kWh)"] / self.rte_list[0] \
-            + results.loc[:, f"{self.name} Energy Throughput Down (Discharging) (kWh)"] \
-            + results.loc[:, f"{self.name} Energy Throughput Up (Charging) (kWh)"] / self.rte_list[0] \
-            + results.loc[:, f"{self.name} Energy Throughput Up (Discharging) (kWh)"]
-        energy_through_prof = np.multiply(energy_throughput, self.price_energy)
+        # 모든 ESS의 rte와 스루풋 분담률로 ESS별, 연도별 에너지 정산 비용을 한 번에 계산
+        charging = throughput[f"{self.name} Energy Throughput Down (Charging) (kWh)"] \
+            + throughput[f"{self.name} Energy Throughput Up (Charging) (kWh)"]
+        discharging = throughput[f"{self.name} Energy Throughput Down (Discharging) (kWh)"] \
+            + throughput[f"{self.name} Energy Throughput Up (Discharging) (kWh)"]
+        self.ess_energy_cost = self.fleet_energy_cost(index, charging, discharging,
+                                                      self.values_on(self.price_energy, index), opt_years)
 
         # 모든 value stream을 하나의 데이터프레임으로 결합
         #   splicing into years
-        fr_results = pd.DataFrame({'E': energy_through_prof,
-                                   'RU': regulation_up_prof,
+        fr_results = pd.DataFrame({'RU': regulation_up_prof,
                                    'RD': regulation_down_prof},
-                                  index=results.index)
+                                  index=index)
         market_results_only = proforma.copy(deep=True)
      # 연도별로 계산된 수익을 프로포마에 추가
         for year in opt_years:
-            year_subset = fr_results[fr_results.index.year == year]
+            year_subset = fr_results[self.year_mask(fr_results.index, year)]
             yr_pd = pd.Period(year=year, freq='y')
             proforma.loc[yr_pd, f'{self.name} Energy Throughput'] \
-                = -year_subset['E'].sum()
+                = -self.ess_energy_cost.loc[year].sum()
             market_results_only.loc[yr_pd, f'{pref} Up'] \
                 = year_subset['RU'].sum()
             market_results_only.loc[yr_pd, f'{pref} Down'] \
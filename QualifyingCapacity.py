@@ -0,0 +1,111 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+QualifyingCapacity.py
+
+This Python class remembers the qualifying capacity of each DER per event length, so that
+ResourceAdequacy (and DemandResponse, which sums the same capacities) do not recompute it
+every time the system requirements are built during sizing iterations or parameter sweeps.
+"""
+import weakref
+import numpy as np
+import cvxpy as cvx
+
+
+class QualifyingCapacity:
+    """ Cache of DER.qualifying_capacity(length), keyed by the DER object and the event length.
+    The DERs are held by weak reference, so an entry goes away with its DER and is never handed
+    to a new DER that happens to reuse the same memory.
+
+    Entries are not checked against the DER on every lookup. Whoever changes a DER in place in a
+    way that changes its qualifying capacity (resizing it, degrading its energy capacity) has to
+    call invalidate(der) (or clear()) before the system requirements are built again.
+
+    """
+
+    def __init__(self):
+        # DER -> {length: qualifying capacity}
+        self.entries = weakref.WeakKeyDictionary()
+
+    def capacities_of(self, der):
+        """ Returns the cached capacities of DER (a dictionary of length to qualifying capacity)."""
+        capacities = self.entries.get(der)
+        if capacities is None:
+            capacities = {}
+            self.entries[der] = capacities
+        return capacities
+
+    def qualifying_capacity(self, der, length):
+        capacities = self.capacities_of(der)
+        if length not in capacities:
+            capacities[length] = der.qualifying_capacity(length)
+        return capacities[length]
+
+    def qualifying_commitment(self, der_lst, length):
+        """ Sum of the qualifying capacities of the DERs for an event of LENGTH hours.
+
+        Args:
+            der_lst (list): list of the initialized DERs in the scenario
+            length (float): length of the event in hours
+
+        """
+        return sum(self.qualifying_capacity(der, length) for der in der_lst)
+
+    def qualifying_commitments(self, der_lst, lengths):
+        """ Batch form of qualifying_commitment: the qualifying commitment for every length in
+        LENGTHS. DER.qualifying_capacity takes one length, so each (DER, length) pair missing from
+        the cache is still one call; the commitments are the column sums of the DER by length matrix.
+
+        Args:
+            der_lst (list): list of the initialized DERs in the scenario
+            lengths (array): lengths of the events in hours
+
+        Returns: numpy array of the qualifying commitment of each length (a list if any DER's
+            capacity is a cvxpy Expression, i.e. while the DER is being sized)
+
+        """
+        lengths = np.atleast_1d(np.asarray(lengths, dtype=np.float64)).tolist()
+        if not len(der_lst):
+            return np.zeros(len(lengths))
+        matrix = [[self.qualifying_capacity(der, length) for length in lengths] for der in der_lst]
+        if any(isinstance(capacity, cvx.Expression) for row in matrix for capacity in row):
+            return [sum(column) for column in zip(*matrix)]
+        return np.array(matrix, dtype=np.float64).sum(axis=0)
+
+    def invalidate(self, der):
+        """ Drops the cached capacities of DER, after DER was changed in place."""
+        self.entries.pop(der, None)
+
+    def clear(self):
+        self.entries = weakref.WeakKeyDictionary()
+
+
+# shared by the value streams that use qualifying capacity (RA and DR)
+CACHE = QualifyingCapacity()
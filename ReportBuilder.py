@@ -0,0 +1,170 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ReportBuilder.py
+
+This Python class assembles the timeseries reports of all value streams of a scenario in one
+pass: every stream declares its output columns, the builder preallocates one 2-D float block and
+one bool block for the whole scenario (plus an object block for any non numeric columns), the
+streams fill their columns in place, and the final DataFrame is built once.
+"""
+from contextlib import nullcontext
+import numpy as np
+import pandas as pd
+
+
+class ReportBuilder:
+    """ Preallocated, one pass builder of timeseries reports.
+
+    """
+
+    def __init__(self, index, float_dtype=np.float64):
+        """
+        Args:
+            index (Index): the index of the report (the full analysis horizon)
+            float_dtype (dtype): dtype of the float block (float32 in compact storage mode)
+        """
+        self.index = index
+        self.float_dtype = float_dtype
+        self.kinds = {}  # column name -> 'float', 'bool' or 'object', in the order the columns were declared
+        self.positions = {}
+        self.float_block = None
+        self.bool_block = None
+        self.object_block = None
+
+    def declare(self, name, kind='float'):
+        """ Reserves a column. Declaring a column that already exists is ignored.
+
+        Args:
+            name (str): column header
+            kind (str): 'float', 'bool' or 'object' (ex. string labels)
+
+        """
+        if name in self.kinds:
+            return
+        self.positions[name] = sum(k == kind for k in self.kinds.values())
+        self.kinds[name] = kind
+
+    def allocate(self):
+        """ Allocates the float (filled with NaN), bool (filled with False) and object (filled with
+        None) blocks. Columns are stored contiguously (Fortran order), so filling a column is a
+        single memory copy.
+        """
+        counts = {kind: sum(k == kind for k in self.kinds.values()) for kind in ('float', 'bool', 'object')}
+        self.float_block = np.full((len(self.index), counts['float']), np.nan, dtype=self.float_dtype, order='F')
+        self.bool_block = np.zeros((len(self.index), counts['bool']), dtype=bool, order='F')
+        self.object_block = np.full((len(self.index), counts['object']), None, dtype=object, order='F')
+
+    def column(self, name):
+        """ Returns: the writable view of the preallocated column NAME """
+        block = {'float': self.float_block, 'bool': self.bool_block, 'object': self.object_block}[self.kinds[name]]
+        return block[:, self.positions[name]]
+
+    @staticmethod
+    def kind_of(values):
+        """ Returns: the block ('float', 'bool' or 'object') a column with the dtype of VALUES goes in """
+        if values.dtype == bool:
+            return 'bool'
+        if np.issubdtype(values.dtype, np.number):
+            return 'float'
+        return 'object'
+
+    def __setitem__(self, name, values):
+        """ Fills column NAME. Series that are not on the report's index are aligned first; the rows
+        they do not have are False in a bool column and NaN otherwise (NaN would be True in a bool block).
+
+        Args:
+            name (str): a declared column header
+            values (Series, array, scalar): the values of the column
+
+        """
+        if isinstance(values, pd.Series) and values.index is not self.index \
+                and not values.index.equals(self.index):
+            values = values.reindex(self.index, fill_value=False if self.kinds[name] == 'bool' else np.nan)
+        self.column(name)[:] = np.asarray(values)
+
+    def to_frame(self):
+        """ Wraps the float block as the report DataFrame without copying it, then inserts the bool
+        and object columns (if any) at their declared positions.
+
+        Returns: the report DataFrame, with the columns in the order they were declared
+
+        """
+        names = list(self.kinds)
+        float_names = [name for name in names if self.kinds[name] == 'float']
+        frame = pd.DataFrame(self.float_block, index=self.index, columns=float_names, copy=False)
+        for position, name in enumerate(names):
+            if self.kinds[name] != 'float':
+                frame.insert(position, name, self.column(name))
+        return frame
+
+    @classmethod
+    def build(cls, value_streams, index):
+        """ Builds the timeseries report of one or more value streams in a single pass.
+
+        Value streams that declare their columns (report_columns) fill them in place with
+        fill_report; the others are asked for their timeseries_report, whose columns are copied in
+        (numeric columns into the float block, bool columns into the bool block and anything else,
+        such as strings, into the object block).
+
+        Args:
+            value_streams (list, dict): ValueStream instances
+            index (Index): the index of the report (the full analysis horizon)
+
+        Returns: A timeseries DataFrame with the columns of every value stream
+
+        """
+        if isinstance(value_streams, dict):
+            value_streams = list(value_streams.values())
+        compact = any(getattr(value_stream, 'compact', False) for value_stream in value_streams)
+        builder = cls(index, np.float32 if compact else np.float64)
+        # (value stream, its timeseries_report or None if it fills declared columns), in order
+        fills = []
+        for value_stream in value_streams:
+            columns = value_stream.report_columns()
+            report = None
+            if columns is None:
+                report = value_stream.timeseries_report()
+                if report is None or report.empty:
+                    continue
+                columns = [(name, cls.kind_of(values)) for name, values in report.items()]
+            fills.append((value_stream, report))
+            for name, kind in columns:
+                builder.declare(name, kind)
+        builder.allocate()
+        for value_stream, report in fills:
+            if report is None:
+                # in the memory budget mode the results are read back from the stream's chunks
+                with getattr(value_stream, 'all_variables', nullcontext)():
+                    value_stream.fill_report(builder)
+            else:
+                for name, values in report.items():
+                    builder[name] = values
+        return builder.to_frame()
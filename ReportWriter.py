@@ -0,0 +1,229 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ReportWriter.py
+
+This Python class writes the timeseries reports of the value streams into a columnar
+(Parquet or Arrow IPC) results directory, reads them back column by column, and computes the
+proforma from them.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from storagevet.ErrorHandling import *
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+INDEX_NAME = 'Start Datetime (hb)'
+FILE_EXTENSIONS = {'parquet': '.parquet', 'arrow': '.arrow'}
+BOOL_DICTIONARY = pa.array([False, True]) if pa is not None else None
+
+
+class ReportWriter:
+    """ Streams each value stream's timeseries report into its own columnar file, in row chunks,
+    so a report is never converted into one big CSV string.
+
+    """
+
+    def __init__(self, results_path, file_format='parquet', float32=False, compression='zstd',
+                 chunk_rows=2**16):
+        """ Opens the results directory.
+
+        Args:
+            results_path (Path): directory the report files are saved in
+            file_format (str): 'parquet' or 'arrow' (Arrow IPC file)
+            float32 (bool): True to store float columns as float32
+            compression (str): compression codec ('zstd', 'snappy', 'lz4', or None)
+            chunk_rows (int): number of rows written at a time (one row group/record batch)
+        """
+        if pa is None:
+            raise ModuleNotFoundError('pyarrow is required to write Parquet/Arrow reports')
+        if file_format not in FILE_EXTENSIONS:
+            raise ParameterError(f'file_format must be one of {list(FILE_EXTENSIONS)}, not {file_format}')
+        self.results_path = Path(results_path)
+        self.file_format = file_format
+        self.float32 = float32
+        self.compression = compression
+        self.chunk_rows = chunk_rows
+        self.files = []
+        self.results_path.mkdir(parents=True, exist_ok=True)
+
+    def to_table(self, report):
+        """ Converts a (chunk of a) timeseries report into an Arrow table. Boolean columns, such as
+        'RA Event (y/n)', are dictionary encoded.
+
+        Args:
+            report (DataFrame): a timeseries report
+
+        Returns: pyarrow Table, with the index saved as the first column
+
+        """
+        arrays = [pa.array(report.index.values)]
+        names = [INDEX_NAME]
+        for name, column in report.items():
+            values = column.values
+            if values.dtype == bool:
+                # same dictionary for every chunk, as required by the Arrow IPC file format
+                array = pa.DictionaryArray.from_arrays(pa.array(values.astype(np.int8)), BOOL_DICTIONARY)
+            elif self.float32 and values.dtype.kind == 'f':
+                array = pa.array(values.astype(np.float32))
+            else:
+                array = pa.array(values)
+            arrays.append(array)
+            names.append(str(name))
+        return pa.Table.from_arrays(arrays, names=names)
+
+    def write(self, name, report):
+        """ Writes one value stream's timeseries report.
+
+        Args:
+            name (str): name of the value stream (used as the file name)
+            report (DataFrame, iterable): the value stream's timeseries report, or the pieces of it
+                in time order (ex. ValueStream.iter_timeseries_report)
+
+        """
+        reports = [report] if report is None or isinstance(report, pd.DataFrame) else report
+        filename = self.results_path / f"{name}{FILE_EXTENSIONS[self.file_format]}"
+        writer = None
+        try:
+            for report in reports:
+                if report is None or report.empty:
+                    continue
+                for start in range(0, len(report), self.chunk_rows):
+                    table = self.to_table(report.iloc[start:start + self.chunk_rows])
+                    if writer is None:
+                        writer = self.open_writer(filename, table.schema)
+                    if self.file_format == 'parquet':
+                        writer.write_table(table)
+                    else:
+                        writer.write_table(table, max_chunksize=self.chunk_rows)
+        finally:
+            if writer is not None:
+                writer.close()
+        # only a report that was written completely is listed
+        if writer is not None:
+            self.files.append(filename)
+
+    def open_writer(self, filename, schema):
+        if self.file_format == 'parquet':
+            return pq.ParquetWriter(filename, schema, compression=self.compression or 'none')
+        options = pa.ipc.IpcWriteOptions(compression=self.compression)
+        return pa.ipc.new_file(filename, schema, options=options)
+
+    def write_all(self, value_streams):
+        """ Writes the timeseries report of every value stream.
+
+        Args:
+            value_streams (dict): ValueStream instances, keyed by name
+
+        """
+        for name, value_stream in value_streams.items():
+            self.write(name, value_stream.iter_timeseries_report())
+
+    def proforma_reports(self, value_streams, opt_years, apply_inflation_rate_func, fill_forward_func):
+        """ Computes the proforma of every value stream from the report write_all saved for it, so
+        only one value stream's report is loaded at a time.
+
+        Args:
+            value_streams (dict): ValueStream instances, keyed by the names their reports were written as
+            opt_years (list): years the optimization was run for
+            apply_inflation_rate_func: passed on to proforma_report
+            fill_forward_func: passed on to proforma_report
+
+        Returns: a dictionary of value stream name to its proforma DataFrame
+
+        """
+        proforma = {}
+        for name, value_stream in value_streams.items():
+            filename = self.results_path / f"{name}{FILE_EXTENSIONS[self.file_format]}"
+            results = self.read_file(filename) if filename in self.files else None
+            if results is None:
+                results = pd.DataFrame()
+            proforma[name] = value_stream.proforma_report(opt_years, apply_inflation_rate_func, fill_forward_func,
+                                                          results)
+        return proforma
+
+    @staticmethod
+    def read_file(filename, columns=None):
+        """ Reads one report file. Only the requested columns are loaded from it (Arrow files are
+        memory mapped while they are read); the returned DataFrame holds its own copy of the data.
+
+        Args:
+            filename (Path): a .parquet or .arrow report file
+            columns (list): names of the columns to load (all columns if None)
+
+        Returns: the report DataFrame, indexed by 'Start Datetime (hb)', or None if the file is not
+            a report file or has none of COLUMNS
+
+        """
+        if filename.suffix == '.parquet':
+            schema_names = pq.read_schema(filename).names
+        elif filename.suffix == '.arrow':
+            reader = pa.ipc.open_file(pa.memory_map(str(filename), 'r'))
+            schema_names = reader.schema.names
+        else:
+            return None
+        wanted = [name for name in schema_names[1:] if columns is None or name in columns]
+        if not wanted:
+            return None
+        if filename.suffix == '.parquet':
+            table = pq.read_table(filename, columns=[INDEX_NAME] + wanted, memory_map=True)
+        else:
+            table = reader.read_all().select([INDEX_NAME] + wanted)
+        frame = table.to_pandas()
+        for name, column in frame.items():
+            if isinstance(column.dtype, pd.CategoricalDtype) and column.cat.categories.dtype == bool:
+                frame[name] = column.astype(bool)
+        return frame.set_index(INDEX_NAME)
+
+    @staticmethod
+    def read(results_path, columns=None):
+        """ Reads the reports saved in RESULTS_PATH back into a single DataFrame. Only the requested
+        columns are loaded, so proforma_report can be given just the columns it looks up.
+
+        Args:
+            results_path (Path): directory the report files were saved in
+            columns (list): names of the columns to load (all columns if None)
+
+        Returns: A timeseries dataframe, indexed by 'Start Datetime (hb)'
+
+        """
+        if pa is None:
+            raise ModuleNotFoundError('pyarrow is required to read Parquet/Arrow reports')
+        frames = [ReportWriter.read_file(filename, columns) for filename in sorted(Path(results_path).iterdir())]
+        frames = [frame for frame in frames if frame is not None]
+        if not frames:
+            return pd.DataFrame()
+        # every report covers the same time horizon, so the frames can be joined side by side
+        return pd.concat(frames, axis=1)
@@ -0,0 +1,234 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+ReservationWorker.py
+
+This Python class keeps the optimization problem of a set of market value streams built and
+compiled in memory, so that a new price forecast can be solved in well under a second: the new
+prices are written into the problem's parameters instead of building the problem again.
+"""
+import json
+import socket
+import sys
+import time
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+from storagevet.ErrorHandling import *
+
+
+class ReservationWorker:
+    """ A long-running worker for near-real-time bid preparation with market value streams
+    (SpinningReserve, NonspinningReserve, LoadFollowing, MarketServiceUpAndDown, ...).
+
+    Requests and replies are single lines of JSON:
+        {"time_series": {"SR Price ($/kW)": [...], ...}}  -> solve with the new prices
+        {"command": "stats"}                              -> latency statistics
+        {"command": "stop"}                               -> stop serving
+    Each time series column has one value per interval of the forecast window, and is passed
+    to the value streams' update_price_signals.
+
+    """
+
+    def __init__(self, value_streams, index, power_rating, energy_rating=None, solver=None,
+                 extra_constraints=None):
+        """
+        Args:
+            value_streams (dict): ValueStream instances, keyed by name
+            index (DatetimeIndex): the intervals of the forecast window
+            power_rating (float): kW the site can commit to up (and to down) reservations
+            energy_rating (float): kWh available to back the reservations' worst case energy
+                (not constrained if None)
+            solver (str): name of the solver to use (cvxpy's default if None)
+            extra_constraints (function): called with (mask, value_streams), returns a list of
+                additional constraints (ex. the site's DER model)
+        """
+        self.value_streams = value_streams
+        self.index = index
+        self.mask = pd.Series(True, index=index)
+        self.power_rating = power_rating
+        self.energy_rating = energy_rating
+        self.solver = solver
+        self.extra_constraints = extra_constraints
+        self.latencies = []
+        self.problem = self.build()
+        # the first solve compiles the problem; it is not counted in the latency statistics
+        self.problem.solve(solver=self.solver)
+
+    def build(self):
+        """ Builds the problem once. Prices enter it as cvxpy Parameters (ValueStream.parameter),
+        so the problem is DPP and cvxpy reuses its compiled form on every later solve.
+
+        Returns: the cvxpy Problem
+
+        """
+        mask = self.mask
+        size = len(self.index)
+        objective = 0
+        constraints = []
+        for value_stream in self.value_streams.values():
+            value_stream.initialize_variables(size)
+            objective += sum(value_stream.objective_function(mask, 0, 0, 0, 0).values())
+            constraints += value_stream.constraints(mask, 0, 0, 0, 0, self.power_rating)
+        streams = self.value_streams.values()
+        up = sum(stream.p_reservation_charge_up(mask) + stream.p_reservation_discharge_up(mask) for stream in streams)
+        down = sum(stream.p_reservation_charge_down(mask) + stream.p_reservation_discharge_down(mask)
+                   for stream in streams)
+        constraints += [cvx.NonPos(up - self.power_rating), cvx.NonPos(down - self.power_rating)]
+        if self.energy_rating is not None:
+            stored = sum(stream.worst_case_uenergy_stored(mask) for stream in streams)
+            provided = sum(stream.worst_case_uenergy_provided(mask) for stream in streams)
+            constraints += [cvx.NonPos(cvx.abs(stored) - self.energy_rating),
+                            cvx.NonPos(cvx.abs(provided) - self.energy_rating)]
+        if self.extra_constraints is not None:
+            constraints += self.extra_constraints(mask, self.value_streams)
+        problem = cvx.Problem(cvx.Minimize(objective), constraints)
+        if not problem.is_dpp():
+            TellUser.warning('The reservation problem is not DPP, so it will be compiled again on every solve.')
+        return problem
+
+    def update(self, time_series, monthly_data=None):
+        """ Gives the value streams new price signals and writes them into the problem.
+
+        Args:
+            time_series (dict, DataFrame): the new time series columns over the forecast window
+            monthly_data (DataFrame): new monthly data, if any
+
+        """
+        time_series = pd.DataFrame(time_series, index=self.index)
+        for value_stream in self.value_streams.values():
+            value_stream.update_price_signals(monthly_data, time_series)
+            value_stream.update_parameters(self.mask)
+
+    def solve(self):
+        """ Solves the problem with the current price signals.
+
+        Returns: a dictionary of value stream name to {variable name: reservation (kW)} for the
+            next (first) interval of the forecast window; in portfolio mode each reservation is a
+            dictionary of site name to kW
+
+        """
+        start = time.perf_counter()
+        self.problem.solve(solver=self.solver)
+        self.latencies.append(time.perf_counter() - start)
+        if self.problem.status not in cvx.settings.SOLUTION_PRESENT:
+            raise SolverError(f'The reservation problem could not be solved: {self.problem.status}')
+        return {name: {variable: self.first_interval(value_stream, variable) for variable in value_stream.variables}
+                for name, value_stream in self.value_streams.items() if value_stream.variables}
+
+    @staticmethod
+    def first_interval(value_stream, variable):
+        """ Returns: the solved value of VARIABLE in the first interval of the window, by site if
+            VALUE_STREAM is in portfolio mode (its variables are then T x N)
+        """
+        first = np.asarray(value_stream.variable(variable).value)[0]
+        if value_stream.sites is None:
+            return float(first)
+        return dict(zip(value_stream.sites, first.astype(float).tolist()))
+
+    def handle(self, request):
+        """ Answers one request (see the class docstring).
+
+        Args:
+            request (dict): the decoded request
+
+        Returns: the reply (a dictionary), or None if the worker should stop
+
+        """
+        command = request.get('command')
+        if command == 'stop':
+            return None
+        if command == 'stats':
+            return {'stats': self.latency_stats()}
+        start = time.perf_counter()
+        try:
+            self.update(request.get('time_series', {}))
+            reservations = self.solve()
+        except Exception as error:
+            # any failure of one request is answered, so the worker keeps serving the next ones
+            TellUser.error(f'reservation worker could not answer a request: {error!r}')
+            return {'status': 'error', 'message': f'{type(error).__name__}: {error}'}
+        return {'status': self.problem.status, 'objective': self.problem.value, 'reservations': reservations,
+                'latency': time.perf_counter() - start}
+
+    def serve(self, reader=sys.stdin, writer=sys.stdout):
+        """ Answers requests read line by line from READER until a stop command or the end of the
+        input.
+
+        Args:
+            reader (file): text stream the requests are read from
+            writer (file): text stream the replies are written to
+
+        Returns: True if a stop command was received
+
+        """
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('a request must be a JSON object')
+            except ValueError as error:
+                # json.JSONDecodeError is a ValueError; a bad line is answered and the worker goes on
+                TellUser.warning(f'reservation worker received a malformed request: {error}')
+                reply = {'status': 'error', 'message': f'malformed request: {error}'}
+            else:
+                reply = self.handle(request)
+            if reply is None:
+                return True
+            writer.write(json.dumps(reply) + '\n')
+            writer.flush()
+        return False
+
+    def serve_socket(self, port, host='127.0.0.1'):
+        """ Serves the line protocol to one client at a time on a local TCP socket, until a client
+        sends a stop command.
+
+        Args:
+            port (int): port to listen on
+            host (str): address to listen on (local only by default)
+
+        """
+        with socket.create_server((host, port)) as server:
+            TellUser.info(f'reservation worker listening on {host}:{port}')
+            stopped = False
+            while not stopped:
+                connection, _ = server.accept()
+                with connection, connection.makefile('r') as reader, connection.makefile('w') as writer:
+                    stopped = self.serve(reader, writer)
+
+    def latency_stats(self):
+        """ Returns: the number of solves and the p50/p99/max solve latency in seconds """
+        if not self.latencies:
+            return {'solves': 0}
+        latencies = np.array(self.latencies)
+        return {'solves': len(latencies), 'p50': float(np.percentile(latencies, 50)),
+                'p99': float(np.percentile(latencies, 99)), 'max': float(latencies.max())}
@@ -32,16 +32,21 @@ ResourceAdequacy.py
 
 이 Python 클래스에는 StorageVet 내의 서비스 분석에 특정한 메서드와 속성이 포함되어 있습니다.
 """
-from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.ValueStream import ValueStream, stream_context
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
 import pandas as pd
 import numpy as np
 from storagevet.SystemRequirement import Requirement
+from storagevet.ValueStreams import QualifyingCapacity
+from storagevet.ValueStreams.EventIndex import EventIndex
 import storagevet.Library as Lib
 
 
 class ResourceAdequacy(ValueStream):
     """ 자원 충분성(ValueStream) 값 스트림. 각 서비스는 PreDispService 클래스의 하위 클래스가 될 것입니다.
     """
+    checkpoint_attributes = ('system_requirements', 'peak_intervals', 'event_intervals', 'event_start_times', 'qc',
+                             'der_dispatch_discharge_min_constraint', 'energy_min_constraint')
 
     def __init__(self, params):
         """ 목적 함수를 생성하고 제약 조건을 찾고 생성합니다.
@@ -60,6 +65,10 @@ class ResourceAdequacy(ValueStream):
         self.idmode = params['idmode'].lower()  # 피크 선택 모드
         self.dispmode = params['dispmode']  # 디스패치 모드
         self.capacity_rate = params['value']  # 월간 RA 용량 요금 (길이 = 12)
+        # 피크 선택 모드별 피크 순위 (peak_ranking). system_load나 active가 바뀌면 비워집니다.
+        self.peak_rankings = {}
+        # 창별 RA 이벤트 조회를 위한 이벤트 위치 인덱스 (window_requirements에서 생성)
+        self.event_index = None
         if 'active hours' in self.idmode:
             self.active = params['active'] == 1  # 활성 RA 타임스텝 (길이 = 8760/dt)은 불리언
         self.system_load = params['system_load']  # 시스템 부하 프로필 (길이 = 8760/dt)
@@ -73,6 +82,27 @@ class ResourceAdequacy(ValueStream):
         self.energy_min_constraint = None
         self.qc = 0
 
+    @property
+    def system_load(self):
+        return self._system_load
+
+    @system_load.setter
+    def system_load(self, system_load):
+        """ 시스템 부하가 바뀌면 (grow_drop_data, update_price_signals, 워커 등) 그 부하로 계산한 피크 순위와 이벤트 인덱스를 비움"""
+        self._system_load = system_load
+        self.peak_rankings = {}
+        self.event_index = None
+
+    @property
+    def active(self):
+        return self._active
+
+    @active.setter
+    def active(self, active):
+        """ 활성 시간이 바뀌면 'active hours' 모드의 피크 순위를 비움"""
+        self._active = active
+        self.peak_rankings = {}
+
     def grow_drop_data(self, years, frequency, load_growth):
         """ 주어진 데이터를 성장시키거나 추가된 데이터를 제거 / 성장 데이터를 추가한 후에는 최적화가 실행되기 전에 이 메서드를 호출
 
@@ -82,24 +112,28 @@ class ResourceAdequacy(ValueStream):
             load_growth (float): 시뮬레이션에서 부하 성장률의 퍼센트/소수값
         """
         # 시계열 데이터
-        self.system_load = Lib.fill_extra_data(self.system_load, years, load_growth, frequency)
-        self.system_load = Lib.drop_extra_data(self.system_load, years)
+        self.system_load = self.grow_drop_input(self.system_load, years, load_growth, frequency)
+        self.system_load = self.prepare_input(self.system_load)
 
         if 'active hours' in self.idmode:
-            self.active = Lib.fill_extra_data(self.active, years, 0, frequency)
-            self.active = Lib.drop_extra_data(self.active, years)
-            self.active = self.active == 1
+            self.active = self.grow_drop_input(self.active, years, 0, frequency)
+            self.active = self.prepare_input(self.active == 1)
 
         # 월간 데이터
         self.capacity_rate = Lib.fill_extra_data(self.capacity_rate, years, 0, 'M')
         self.capacity_rate = Lib.drop_extra_data(self.capacity_rate, years)
 
+    @stream_context
     def calculate_system_requirements(self, der_lst):
         """ 다른 값 스트림이 활성화되었는지 여부에 관계없이 충족되어야 하는 시스템 요구사항을 계산/ 그러나 이러한 요구사항은 분석에서 활성화된 기술에 따라 달라.
 
         Args:
             der_lst (list): 시나리오에서 초기화된 DER(Distributed Energy Resources) 목록
         """
+        if self.restored:
+            # 체크포인트에서 복원된 요구사항을 그대로 사용
+            return
+        self.event_index = None
        # 시스템 부하 피크 찾기
         self.find_system_load_peaks()
        # 이벤트 스케줄 생성
@@ -128,81 +162,109 @@ class ResourceAdequacy(ValueStream):
         """ 시스템 부하 피크가 발생하는 타임스텝을 찾습니다. RA 이벤트는 이러한 피크 주변에 발생합니다.
             이 메서드는 PEAK_INTERVALS 속성을 편집합니다.
         """
-        for year in self.system_load.index.year.unique():
-            year_o_system_load = self.system_load.loc[self.system_load.index.year == year]
-            if self.idmode == 'peak by year':
-                # 1) 시스템 부하를 가장 큰 것부터 가장 작은 것으로 정렬
-                max_int = year_o_system_load.sort_values(ascending=False)
-                 # 2) 하루에 한 번씩만 나타나는 첫 번째(즉, 가장 큰) 인스턴트 로드만 유지 
-                 # 이미 인덱스에 나타난 항목에 대해 True인 불리언 배열을 사용
-                max_int_date = pd.Series(max_int.index.date, index=max_int.index)
-                max_days = max_int.loc[~max_int_date.duplicated(keep='first')]
-
-                # 3) 피크 타임스텝 선택
-                # system_load가 피크인 이벤트 수를 찾습니다.
-                # 처음 DAYS 타임스텝만 선택합니다.
-                self.peak_intervals += list(max_days.index[:self.days].values)
-
-            elif self.idmode == 'peak by month':
-                # 1) 시스템 부하를 가장 큰 것부터 가장 작은 것으로 정렬
-                max_int = year_o_system_load.sort_values(ascending=False)
-                # 2) 하루에 한 번씩만 나타나는 첫 번째(즉, 가장 큰) 인스턴트 로드만 유지 
-                # 이미 인덱스에 나타난 항목에 대해 True인 불리언 배열을 사용
-                max_int_date = pd.Series(max_int.index.date, index=max_int.index)
-                max_days = max_int.loc[~max_int_date.duplicated(keep='first')]
-
-                # 3) 피크 타임스텝 선택
-                # system_load가 피크인 이벤트 수를 찾습니다.
-                # 각 월별로 DAYS 타임스텝만 선택합니다.
-                self.peak_intervals += list(max_days.groupby(by=max_days.index.month).head(self.days).index.values)
-
-            elif self.idmode == 'peak by month with active hours':
-                active_year_sub = self.active[self.system_load.index.year == year]
-                # 1) 시스템 부하를 활성 시간 동안 가장 큰 것부터 가장 작은 것으로 정렬
-                max_int = year_o_system_load.loc[active_year_sub].sort_values(ascending=False)
-                # 2) 하루에 한 번씩만 나타나는 첫 번째(즉, 가장 큰) 인스턴트 로드만 유지 
-                # 이미 인덱스에 나타난 항목에 대해 True인 불리언 배열을 사용
-                max_int_date = pd.Series(max_int.index.date, index=max_int.index)
-                max_days = max_int.loc[~max_int_date.duplicated(keep='first')]
-
-               # 3) 피크 타임스텝 선택
-               # 시스템 부하가 활성 시간 동안 피크인 이벤트 수를 찾는다.
-               # 각 월별로 DAYS 타임스텝만 선택
-                self.peak_intervals += list(max_days.groupby(by=max_days.index.month).head(self.days).index.values)
+        self.peak_intervals += list(self.system_load.index.values[self.peaks_for(self.days)])
+
+    def peak_ranking(self, idmode=None):
+        """ 피크 후보의 순위를 한 번만 계산합니다. 연도('peak by year') 또는 월별로 시스템 부하를 가장 큰 것부터 정렬하고,
+        하루에 한 번씩만 나타나는 첫 번째(즉, 가장 큰) 타임스텝만 남긴 뒤, 그룹 내 순위 순서로 정렬합니다.
+        따라서 DAYS개의 피크는 (모든 그룹에서) 앞에서부터 잘라낸 구간입니다.
+
+        Args:
+            idmode (str): 피크 선택 모드 (None이면 self.idmode)
+
+        Returns: (positions, rank) - system_load 안의 피크 후보의 정수 위치와 그룹 내 순위 (rank 오름차순)
+
+        """
+        idmode = (idmode or self.idmode).lower()
+        if idmode not in self.peak_rankings:
+            index = self.system_load.index
+            load = np.asarray(self.system_load.values, dtype=np.float64)
+            if 'active hours' in idmode:
+                # 활성 시간 동안의 타임스텝만 후보
+                candidates = np.flatnonzero(np.asarray(self.active, dtype=bool))
+            else:
+                candidates = np.arange(len(load))
+            group = index.year.values[candidates]
+            if idmode != 'peak by year':
+                group = group * 12 + index.month.values[candidates]
+            day = index.normalize().asi8[candidates]
+            # 1) 그룹별로 시스템 부하를 가장 큰 것부터 가장 작은 것으로 정렬
+            order = np.lexsort((-load[candidates], group))
+            # 2) 하루에 한 번씩만 나타나는 첫 번째(즉, 가장 큰) 인스턴트 로드만 유지
+            _, first = np.unique(day[order], return_index=True)
+            order = order[np.sort(first)]
+            group = group[order]
+            # 3) 그룹 내 순위를 구하고 순위 순서로 정렬 (같은 순위는 그룹 순서)
+            starts = np.r_[0, np.flatnonzero(group[1:] != group[:-1]) + 1]
+            rank = np.arange(len(order)) - np.repeat(starts, np.diff(np.r_[starts, len(order)]))
+            by_rank = np.argsort(rank, kind='stable')
+            self.peak_rankings[idmode] = (candidates[order][by_rank], rank[by_rank])
+        return self.peak_rankings[idmode]
+
+    def peaks_for(self, days, idmode=None):
+        """ 그룹(연도 또는 월)마다 DAYS개의 피크 타임스텝의 정수 위치 (peak_ranking의 앞부분)"""
+        positions, rank = self.peak_ranking(idmode)
+        return positions[:np.searchsorted(rank, days)]
+
+    def event_positions(self, peaks, length):
+        """ 피크 주변의 RA 이벤트 타임스텝과 이벤트 시작 타임스텝의 정수 위치를 구합니다.
+        홀수 간격은 피크를 기준으로 양 옆에 걸칩니다. 짝수 간격은 피크 이후에 추가 간격이 있습니다.
+        system_load의 처음이나 끝을 넘는 이벤트는 잘립니다.
+
+        Args:
+            peaks (array): 피크 타임스텝의 정수 위치
+            length (float): 이벤트 길이 (시간)
+
+        Returns: (이벤트 타임스텝의 위치, 이벤트 시작 타임스텝의 위치) - 정렬된 numpy 배열
+
+        """
+        steps = int(round(length / self.dt))
+        presteps = steps // 2 if steps % 2 else steps // 2 - 1
+        last_position = len(self.system_load) - 1
+        first = np.clip(peaks - presteps, 0, last_position)
+        last = np.clip(peaks - presteps + steps - 1, 0, last_position)
+        # 각 이벤트의 시작에 +1, 끝 다음에 -1을 더한 누적 합이 0보다 큰 곳이 이벤트 타임스텝
+        marks = np.zeros(last_position + 2, dtype=np.int64)
+        np.add.at(marks, first, 1)
+        np.add.at(marks, last + 1, -1)
+        return np.flatnonzero(np.cumsum(marks[:-1]) > 0), np.unique(first)
 
     def schedule_events(self):
         """ RA 이벤트 간격 및 이벤트 시작 시간을 결정합니다.
 
          TODO: 고려해야 할 예외 상황 -- 이벤트가 최적화 창의 시작이나 끝에 발생하는 경우 -- HN
-         TODO: 이것이 sub-hourly 시스템 부하 프로파일에 대해 작동하는지 확인 -- HN
 
         """
-        # RA 이벤트 간격 결정
-        event_interval = pd.Series(np.zeros(len(self.system_load)), index=self.system_load.index)
-        event_start = pd.Series(np.zeros(len(self.system_load)), index=self.system_load.index)  # used to set energy constraints
-        # 홀수 간격은 피크를 기준으로 양 옆에 걸칩니다. 짝수 간격은 피크 이후에 추가 간격이 있습니다.
-        steps = self.length / self.dt
-        if steps % 2:  # steps가 홀수인 경우
-            presteps = np.floor_divide(steps, 2)
-        else:   # steps가 짝수인 경우
-            presteps = (steps / 2) - 1
-        poststeps = presteps + 1
-
-        for peak in self.peak_intervals:
-            first_int = peak - pd.Timedelta(presteps * self.dt, unit='h')
-            last_int = peak + pd.Timedelta(poststeps * self.dt, unit='h')
-
-            # 가장자리 RA 이벤트 간격 처리
-            if first_int < event_interval.index[0]:  # RA event starts before the first time-step in the system load
-                first_int = event_interval.index[0]
-            if last_int > event_interval.index[-1]:  # RA event ends after the last time-step in the system load
-                last_int = event_interval.index[-1]
-
-            event_range = pd.date_range(start=first_int, end=last_int, periods=steps)
-            event_interval.loc[event_range] = 1
-            event_start.loc[first_int] = 1
-        self.event_intervals = self.system_load[event_interval == 1].index
-        self.event_start_times = self.system_load[event_start == 1].index
+        index = self.system_load.index
+        peaks = index.get_indexer(pd.DatetimeIndex(self.peak_intervals))
+        peaks = peaks[peaks >= 0]
+        events, starts = self.event_positions(peaks, self.length)
+        self.event_intervals = index[events]
+        self.event_start_times = index[starts]
+
+    def sweep(self, der_lst, days_list, lengths, idmode=None):
+        """ RA 매개변수 스윕: (days, length)의 모든 조합에 대한 피크, 이벤트, 자격 용량을 한 번에 계산합니다.
+        피크 순위는 한 번만 계산되고, 각 조합의 피크는 그 앞부분을 잘라낸 것입니다. 자격 용량은 길이별로 한 번 계산합니다.
+
+        Args:
+            der_lst (list): 시나리오에서 초기화된 DER 목록
+            days_list (list): 그룹(연도 또는 월)별 이벤트 수 목록
+            lengths (list): 이벤트 길이 (시간) 목록
+            idmode (str): 피크 선택 모드 (None이면 self.idmode)
+
+        Returns: (days, length)를 키로, 'peak_intervals', 'event_intervals', 'event_start_times', 'qc'를 가진 딕셔너리를 값으로 가지는 딕셔너리
+
+        """
+        index = self.system_load.index
+        qcs = dict(zip(lengths, QualifyingCapacity.CACHE.qualifying_commitments(der_lst, lengths)))
+        grid = {}
+        for days in days_list:
+            peaks = self.peaks_for(days, idmode)
+            for length in lengths:
+                events, starts = self.event_positions(peaks, length)
+                grid[(days, length)] = {'peak_intervals': index[peaks], 'event_intervals': index[events],
+                                        'event_start_times': index[starts], 'qc': qcs[length]}
+        return grid
 
     @staticmethod
     def qualifying_commitment(der_lst, length):
@@ -212,10 +274,11 @@ class ResourceAdequacy(ValueStream):
             length (int): 이벤트의 길이
 
         NOTE:  DR(Demand Response)에도 이 메서드가 동일하게 존재합니다  -HN
+            두 서비스는 QualifyingCapacity.CACHE를 공유하므로, 같은 DER과 길이이면 다시 계산하지 않습니다.
+            DER의 정격이나 크기를 바꾼 경우에는 QualifyingCapacity.CACHE.invalidate(der)를 호출해야 합니다.
         """
-     # der_lst에 있는 각 DER의 qualifying_capacity 메서드를 호출하고 그 값을 모두 더하여 자격 용량(qc)을 계산합니다.
-        qc = sum(der_instance.qualifying_capacity(length) for der_instance in der_lst)
-        return qc
+     # der_lst에 있는 각 DER의 qualifying_capacity를 (캐시에서) 가져와 모두 더하여 자격 용량(qc)을 계산합니다.
+        return QualifyingCapacity.CACHE.qualifying_commitment(der_lst, length)
 
     def proforma_report(self, opt_years, apply_inflation_rate_func, fill_forward_func, results):
         """ 이 값 스트림에 참여하는 데 해당하는 proforma(수익 계획서)를 계산합니다.
@@ -248,19 +311,74 @@ class ResourceAdequacy(ValueStream):
         Returns: 이 인스턴스와 관련된 결과를 요약하는 사용자 친화적인 열 헤더가 있는 시계열 DataFrame
 
         """
-        # 결과를 저장할 DataFrame 생성
-        report = pd.DataFrame(index=self.system_load.index)
-        # 시스템 부하 정보 추가
-        report.loc[:, "System Load (kW)"] = self.system_load
-        # RA 이벤트 여부 정보 추가
-        report.loc[:, 'RA Event (y/n)'] = False
-        report.loc[self.event_intervals, 'RA Event (y/n)'] = True
-        # 디스패치 모드에 따라 디스패치 파워 제약 또는 에너지 예약 제약 정보 추가
+        return ReportBuilder.build([self], self.report_index(self.system_load.index))
+
+    def requirement_constraint(self):
+        """ 디스패치 모드에 따라 디스패치 파워 제약 또는 에너지 예약 제약을 반환합니다."""
         if self.dispmode:
-            report = pd.merge(report, self.der_dispatch_discharge_min_constraint, how='left', on='Start Datetime (hb)')
+            return self.der_dispatch_discharge_min_constraint
+        return self.energy_min_constraint
+
+    def window_requirements(self, mask):
+        """ 최적화 창에 있는 RA 이벤트만 가진 시스템 요구사항을 반환합니다. 이벤트 위치는 한 번 정렬되고,
+        창의 이벤트는 이진 탐색(searchsorted)으로 찾은 구간이므로 타임스탬프 인덱스를 창마다 교차하지 않습니다.
+        이벤트가 없는 창에서는 빈 목록을 반환하므로 RA 제약 조건이 생성되지 않습니다.
+        마스크가 system_load 인덱스에 있지 않거나 창이 연속되지 않으면 창의 타임스탬프 위치로 이벤트를 찾습니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+
+        Returns: 창의 이벤트에 대한 Requirement 목록 (이벤트가 없으면 빈 목록)
+
+        """
+        constraint = self.requirement_constraint()
+        if constraint is None:
+            return []
+        if self.event_index is None:
+            self.event_index = EventIndex(self.system_load.index, constraint.index)
+        index = self.system_load.index
+        in_window = np.flatnonzero(np.asarray(mask, dtype=bool))
+        if not mask.index.equals(index):
+            in_window = index.get_indexer(mask.index[in_window])
+            in_window = np.sort(in_window[in_window >= 0])
+        if not len(in_window):
+            return []
+        start, stop = in_window[0], in_window[-1] + 1
+        if stop - start == len(in_window):
+            # 연속된 창: 정렬된 이벤트 위치의 구간
+            rows = self.event_index.window_events(start, stop)
         else:
-            report = pd.merge(report, self.energy_min_constraint, how='left', on='Start Datetime (hb)')
-        return report
+            rows = self.event_index.events_at(in_window)
+        if not len(rows):
+            return []
+        constraint_type = 'der dispatch discharge' if self.dispmode else 'energy'
+        return [Requirement(constraint_type, 'min', self.name, constraint.iloc[rows])]
+
+    def report_columns(self):
+        """ 이 값 스트림의 시계열 보고서 열 (순서대로)
+
+        Returns: (열 이름, 'float' 또는 'bool') 튜플의 리스트
+
+        """
+        return [("System Load (kW)", 'float'), ('RA Event (y/n)', 'bool'),
+                (self.requirement_constraint().name, 'float')]
+
+    def fill_report(self, builder):
+        """ report_columns에서 선언한 열을 미리 할당된 블록에 채웁니다.
+        RA 이벤트 여부와 제약 조건 값은 (정렬된) 인덱스에서 searchsorted로 찾은 정수 위치에 바로 기록합니다
+        (전체 기간에 대한 pd.merge / 레이블 .loc 할당을 피함). 인덱스에 없는 타임스탬프는 기록하지 않습니다.
+
+        Args:
+            builder (ReportBuilder): 시나리오 전체의 보고서 빌더
+
+        """
+        index = builder.index
+        builder["System Load (kW)"] = self.system_load
+        positions, _ = EventIndex.locate(index, self.event_intervals)
+        builder.column('RA Event (y/n)')[positions] = True
+        constraint = self.requirement_constraint()
+        positions, found = EventIndex.locate(index, constraint.index)
+        builder.column(constraint.name)[positions] = constraint.values[found]
 
     def monthly_report(self):
         """   이 객체에 저장된 월간 데이터를 수집하여 서비스의 월간 입력 가격을 포함한 DataFrame을 반환합니다.
@@ -273,6 +391,17 @@ class ResourceAdequacy(ValueStream):
 
         return monthly_financial_result
 
+    def input_columns(self):
+        """ 이 Value Stream이 읽는 시계열 입력 열 (시스템 부하, 활성 시간). RA 용량 요금은 월간 데이터입니다.
+
+        Returns: 열 이름을 키로, dtype을 값으로 가지는 딕셔너리
+
+        """
+        columns = {self.system_load.name: 'float64'}
+        if 'active hours' in self.idmode:
+            columns[self.active.name] = 'float64'
+        return columns
+
     def update_price_signals(self, monthly_data, time_series_data):
         """ 새로운 가격 신호를 사용하여 관련된 속성을 업데이트합니다. 이 서비스에 필요한 모든 가격 신호를 요구하지 않으며, 존재하는 가격 신호만 업데이트합니다.
         Args:
@@ -0,0 +1,163 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+SolverSelection.py
+
+This Python class picks the solver used for the optimization windows by solving one or two
+sample windows with every installed solver, and remembers the fastest one for problems with the
+same signature (active value streams, dt and window length).
+"""
+import json
+import time
+from pathlib import Path
+import numpy as np
+import cvxpy as cvx
+from storagevet.ErrorHandling import *
+
+# solvers that are not tried: mixed-integer only, or too slow to be worth benchmarking
+SKIPPED_SOLVERS = {'ECOS_BB', 'GLPK_MI', 'SCIP'}
+
+
+class SolverSelection:
+    """ Benchmarks the installed solvers on sample windows and caches the fastest per problem
+    signature, in memory and (optionally) in a JSON file shared by later runs.
+
+    """
+
+    def __init__(self, cache_path=None, tolerance=1e-4, solvers=None):
+        """
+        Args:
+            cache_path (Path): JSON file the choices are saved to and read from (not saved if None)
+            tolerance (float): relative difference from the reference objective under which a
+                solver's answer is accepted
+            solvers (list): names of the solvers to try (every installed solver if None)
+        """
+        self.cache_path = None if cache_path is None else Path(cache_path)
+        self.tolerance = tolerance
+        self.solvers = solvers
+        self.choices = {}
+        if self.cache_path is not None and self.cache_path.is_file():
+            with open(self.cache_path) as file:
+                self.choices = json.load(file)
+
+    @staticmethod
+    def signature(value_streams, dt, window_length):
+        """
+        Args:
+            value_streams (dict): the active ValueStream instances, keyed by name
+            dt (float): length of one timestep in hours
+            window_length (int): number of timesteps in a window
+
+        Returns: the key the choice of solver is cached under
+
+        """
+        return f"{'|'.join(sorted(value_streams.keys()))}|dt={dt:g}|n={int(window_length)}"
+
+    def candidate_solvers(self):
+        solvers = self.solvers if self.solvers is not None else cvx.installed_solvers()
+        return [solver for solver in solvers if solver not in SKIPPED_SOLVERS]
+
+    def benchmark(self, problems):
+        """ Solves every sample problem with every candidate solver. Each problem is solved once
+        untimed first, so the timing does not include cvxpy compiling the problem for the solver.
+
+        Args:
+            problems (list): cvxpy Problems of sample windows
+
+        Returns: a dictionary of solver name to (total seconds, list of objective values); solvers
+            that fail or do not reach an optimal status on a problem are left out
+
+        """
+        results = {}
+        for solver in self.candidate_solvers():
+            seconds = 0
+            objectives = []
+            try:
+                for problem in problems:
+                    # warm up: compiles the problem for this solver (and loads the solver)
+                    problem.solve(solver=solver)
+                    start = time.perf_counter()
+                    problem.solve(solver=solver)
+                    seconds += time.perf_counter() - start
+                    if problem.status not in cvx.settings.SOLUTION_PRESENT:
+                        raise cvx.error.SolverError(problem.status)
+                    objectives.append(problem.value)
+            except Exception as error:
+                # a solver interface can fail in many ways (missing license, crash, bad option); it is skipped
+                TellUser.debug(f'solver {solver} was not used: {error!r}')
+                continue
+            results[solver] = (seconds, objectives)
+            TellUser.event('solver benchmark', None, None, solver=solver, seconds=seconds, objectives=objectives)
+        return results
+
+    def select(self, results):
+        """ Picks the fastest solver whose objectives agree with the reference (the median over
+        all solvers) within TOLERANCE.
+
+        Args:
+            results (dict): the output of benchmark
+
+        Returns: name of the chosen solver (None if no solver solved the sample windows)
+
+        """
+        if not results:
+            return None
+        objectives = np.array([objectives for seconds, objectives in results.values()])
+        reference = np.median(objectives, axis=0)
+        scale = np.maximum(np.abs(reference), 1)
+        agreeing = {solver: seconds for solver, (seconds, solver_objectives) in results.items()
+                    if np.all(np.abs(np.array(solver_objectives) - reference) <= self.tolerance * scale)}
+        for solver in results.keys() - agreeing.keys():
+            TellUser.warning(f'solver {solver} disagrees with the other solvers on the sample windows and is not used')
+        if not agreeing:
+            return None
+        return min(agreeing, key=agreeing.get)
+
+    def choose(self, signature, problems):
+        """ Returns the cached solver for SIGNATURE, or benchmarks PROBLEMS to choose one.
+
+        Args:
+            signature (str): the problem signature (see signature)
+            problems (list): one or two cvxpy Problems of representative windows (only solved if
+                the signature was not seen before)
+
+        Returns: name of the solver to pass to Problem.solve (None to leave it to cvxpy)
+
+        """
+        if signature in self.choices:
+            return self.choices[signature]
+        solver = self.select(self.benchmark(problems))
+        TellUser.info(f'solver chosen for {signature}: {solver}')
+        self.choices[signature] = solver
+        if self.cache_path is not None and solver is not None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_path, 'w') as file:
+                json.dump(self.choices, file, indent=2)
+        return solver
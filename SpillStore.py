@@ -0,0 +1,202 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+SpillStore.py
+
+This Python class keeps the solved optimization variables of a value stream as a list of window
+chunks. When the chunks of all value streams together exceed a memory budget, the oldest chunks
+are spilled to .npy files, so that a run's peak memory no longer grows with the length
+of the analysis horizon.
+"""
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+class VariableStore:
+    """ Window chunks of one value stream's variables_df, with spill-to-disk under a memory budget
+    shared by every store.
+
+    """
+    memory_budget = None  # bytes of chunks allowed in memory (None = never spill)
+    spill_path = None
+    memory_used = 0
+    in_memory = []  # (store, chunk position) in the order they were added, oldest first
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): name of the value stream that owns the store (used for the spill directory)
+        """
+        self.name = name
+        self.chunks = []  # DataFrame (in memory) or Path (spilled)
+
+    @classmethod
+    def configure(cls, memory_budget, spill_path):
+        """ Sets the memory budget shared by all stores.
+
+        Args:
+            memory_budget (int): bytes of results kept in memory before chunks are spilled
+            spill_path (Path): directory the spilled chunks are written to
+
+        """
+        cls.memory_budget = memory_budget
+        cls.spill_path = Path(spill_path)
+        cls.memory_used = 0
+        cls.in_memory = []
+
+    @staticmethod
+    def chunk_size(frame):
+        return int(frame.memory_usage(index=True, deep=False).sum())
+
+    def append(self, frame):
+        """ Adds the results of one optimization window, spilling older chunks if the budget is
+        exceeded.
+
+        Args:
+            frame (DataFrame): the solved variables of the window
+
+        """
+        self.chunks.append(frame)
+        VariableStore.in_memory.append((self, len(self.chunks) - 1))
+        VariableStore.memory_used += self.chunk_size(frame)
+        # the newest chunk is kept in memory, so that at least one window can always be held
+        while VariableStore.memory_used > VariableStore.memory_budget and len(VariableStore.in_memory) > 1:
+            store, position = VariableStore.in_memory.pop(0)
+            store.spill(position)
+
+    def spill(self, position):
+        """ Writes chunk POSITION to one .npy file per column (plus the index) and drops it from
+        memory.
+
+        Args:
+            position (int): position of the chunk in this store
+
+        """
+        frame = self.chunks[position]
+        directory = VariableStore.spill_path / self.name.replace(' ', '_') / str(position)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'index.npy', frame.index.values.astype('datetime64[ns]').view(np.int64))
+        for i, (column, values) in enumerate(frame.items()):
+            np.save(directory / f'{i}.npy', values.values)
+        # one csv column per level, so (site, variable) MultiIndex columns come back as they were
+        frame.columns.to_frame(index=False).to_csv(directory / 'columns.csv', index=False)
+        VariableStore.memory_used -= self.chunk_size(frame)
+        self.chunks[position] = directory
+
+    @staticmethod
+    def load(directory):
+        """ Reads a spilled chunk back. The .npy files are opened memory-mapped, but building the
+        DataFrame copies the columns, so the returned chunk is an ordinary in-memory frame (only one
+        chunk at a time is resident while iterating). """
+        levels = pd.read_csv(directory / 'columns.csv', keep_default_na=False)
+        # unnamed levels were written with their position as the header
+        names = [None if name == str(i) else name for i, name in enumerate(levels.columns)]
+        if len(names) > 1:
+            columns = pd.MultiIndex.from_frame(levels, names=names)
+        else:
+            columns = pd.Index(levels.iloc[:, 0].values, name=names[0])
+        index = pd.DatetimeIndex(np.load(directory / 'index.npy').view('datetime64[ns]'))
+        frame = pd.DataFrame({i: np.load(directory / f'{i}.npy', mmap_mode='r') for i in range(len(columns))},
+                             index=index)
+        frame.columns = columns
+        return frame
+
+    def __iter__(self):
+        """ Yields the chunks in time order; spilled chunks are read back from their files. """
+        for chunk in self.chunks:
+            yield chunk if isinstance(chunk, pd.DataFrame) else self.load(chunk)
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def to_frame(self):
+        """ Returns: every chunk concatenated into a single variables_df (loads spilled chunks) """
+        if not self.chunks:
+            return pd.DataFrame()
+        return pd.concat(list(self), sort=True)
+
+    def checkpoint(self):
+        """ Returns: the chunks to save in a checkpoint: the directory of each spilled chunk (its files
+            are never rewritten) and the in-memory chunks, which the memory budget keeps small """
+        return list(self.chunks)
+
+    def restore(self, chunks):
+        """ Puts back the chunks returned by checkpoint. Spilled chunks are read from their files
+        again, so the spill directory of the interrupted run has to be kept.
+
+        Args:
+            chunks (list): DataFrame or Path of every chunk, in time order
+
+        """
+        for chunk in chunks:
+            if isinstance(chunk, pd.DataFrame):
+                self.append(chunk)
+            else:
+                self.chunks.append(Path(chunk))
+
+    def site(self, site):
+        """ Returns: a read-only view of the (site, variable) columns of SITE in this portfolio store """
+        return SiteView(self, site)
+
+    def clear(self):
+        """ Forgets every chunk and deletes this store's spill directory. """
+        VariableStore.in_memory = [(store, position) for store, position in VariableStore.in_memory
+                                   if store is not self]
+        for chunk in self.chunks:
+            if isinstance(chunk, pd.DataFrame):
+                VariableStore.memory_used -= self.chunk_size(chunk)
+        if VariableStore.spill_path is not None:
+            shutil.rmtree(VariableStore.spill_path / self.name.replace(' ', '_'), ignore_errors=True)
+        self.chunks = []
+
+
+class SiteView:
+    """ Read-only view of one site's columns of a portfolio VariableStore. Chunks are read the same
+    way as the store's, and only the columns of the site are kept.
+
+    """
+
+    def __init__(self, store, site):
+        self.store = store
+        self.site = site
+
+    def __iter__(self):
+        for chunk in self.store:
+            yield chunk.xs(self.site, axis=1, level=0)
+
+    def __len__(self):
+        return len(self.store)
+
+    def to_frame(self):
+        if not len(self.store):
+            return pd.DataFrame()
+        return pd.concat(list(self), sort=True)
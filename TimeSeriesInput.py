@@ -0,0 +1,278 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+TimeSeriesInput.py
+
+This Python class reads the time series input data, loading only the columns that the active
+value streams declare in their column manifest (ValueStream.input_columns). It can also save
+the time series as memory-mapped NumPy arrays, so several worker processes on the same node
+share one physical copy of the data.
+"""
+import json
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from storagevet.ErrorHandling import *
+
+
+class TimeSeriesInput:
+    """ Selective, typed and chunked loading of time series input data.
+
+    """
+
+    @staticmethod
+    def column_manifest(value_streams, extra_columns=None):
+        """ Collects the union of the input columns that the given value streams need.
+
+        Args:
+            value_streams (list, dict): ValueStream instances
+            extra_columns (dict): other columns to load (ex. site load needed by DERs), column
+                name to dtype
+
+        Returns: dictionary of column name to dtype. If two value streams ask for the same column
+            with different dtypes, the wider one is kept.
+
+        """
+        if isinstance(value_streams, dict):
+            value_streams = value_streams.values()
+        manifest = dict(extra_columns or {})
+        for value_stream in value_streams:
+            for column, dtype in value_stream.input_columns().items():
+                if column not in manifest or manifest[column] == 'float32':
+                    manifest[column] = dtype
+        return manifest
+
+    @staticmethod
+    def read_csv(filename, manifest, index_col='Datetime (he)', float32=False, chunksize=None):
+        """ Reads only the columns in MANIFEST (and the index column) from a time series csv.
+
+        With CHUNKSIZE, the rows are counted first and each typed chunk is copied into columns
+        allocated once for the whole file, so the peak memory is the final DataFrame plus one
+        chunk (concatenating the chunks would hold every chunk and the result at the same time).
+
+        Args:
+            filename (Path, str): the time series input file
+            manifest (dict): column name to dtype, as returned by column_manifest
+            index_col (str): name of the datetime column
+            float32 (bool): True to store every float column as float32
+            chunksize (int): number of rows read at a time (None to read in one pass)
+
+        Returns: DataFrame indexed by INDEX_COL, with the columns in the manifest
+
+        """
+        time_series = TimeSeriesInput.read_frames(filename, manifest, index_col, float32, chunksize)
+        if chunksize is None:
+            return time_series
+        rows = TimeSeriesInput.row_count(filename, index_col, chunksize)
+
+        def allocate(chunk):
+            return np.empty(rows, dtype=np.int64), {column: np.empty(rows, dtype=dtype)
+                                                    for column, dtype in chunk.dtypes.items()}
+
+        arrays = TimeSeriesInput.stream_into(time_series, allocate)
+        if arrays is None:
+            return TimeSeriesInput.read_frames(filename, manifest, index_col, float32, None)
+        index, columns = arrays
+        index = pd.DatetimeIndex(index.view('datetime64[ns]'), name=index_col)
+        return pd.DataFrame(columns, index=index, copy=False)
+
+    @staticmethod
+    def read_frames(filename, manifest, index_col, float32, chunksize):
+        """ Returns: the pandas reader of the columns in MANIFEST (a DataFrame if CHUNKSIZE is None,
+            otherwise an iterator of DataFrames of CHUNKSIZE rows, each already typed)
+        """
+        header = pd.read_csv(filename, nrows=0).columns
+        missing = [column for column in manifest if column not in header]
+        if missing:
+            TellUser.debug(f'time series input does not have columns: {missing}')
+        usecols = [index_col] + [column for column in manifest if column in header]
+        dtypes = {column: ('float32' if float32 else dtype) for column, dtype in manifest.items()
+                  if column in header}
+        return pd.read_csv(filename, usecols=usecols, dtype=dtypes, parse_dates=[index_col],
+                           index_col=index_col, chunksize=chunksize)
+
+    @staticmethod
+    def row_count(filename, index_col, chunksize):
+        """ Returns: the number of data rows in the csv (read CHUNKSIZE rows of one column at a time)"""
+        return sum(len(chunk) for chunk in pd.read_csv(filename, usecols=[index_col], chunksize=chunksize))
+
+    @staticmethod
+    def stream_into(chunks, allocate):
+        """ Copies each chunk into arrays allocated for the whole file when the first chunk is read.
+
+        Args:
+            chunks (iterator): DataFrames indexed by a DatetimeIndex
+            allocate (function): called with the first chunk; returns the int64 index array and a
+                dictionary of column name to array, each as long as the file
+
+        Returns: (index array, dictionary of column arrays), None if there were no rows
+
+        """
+        arrays = None
+        start = 0
+        for chunk in chunks:
+            if arrays is None:
+                arrays = allocate(chunk)
+            stop = start + len(chunk)
+            index, columns = arrays
+            index[start:stop] = chunk.index.values.astype('datetime64[ns]').view(np.int64)
+            for column, values in chunk.items():
+                columns[column][start:stop] = values.values
+            start = stop
+        return arrays
+
+
+class MemoryMappedTimeSeries:
+    """ Time series input data backed by read-only memory-mapped NumPy arrays (one .npy file per
+    column) that all share one DatetimeIndex. Each column is handed out as a read-only pandas
+    Series view, so value streams never copy the data and the OS page cache holds a single copy
+    for every process that opens the same directory.
+
+    Supports the time_series_data.loc[:, column] lookups done in update_price_signals, so it can
+    be passed in place of the time series DataFrame.
+    """
+
+    def __init__(self, directory):
+        """ Opens a directory written by MemoryMappedTimeSeries.save
+
+        Args:
+            directory (Path, str): directory the arrays were saved in
+        """
+        self.directory = Path(directory)
+        with open(self.directory / 'columns.json') as f:
+            meta = json.load(f)
+        index_values = np.load(self.directory / 'index.npy', mmap_mode='r')
+        self.index = pd.DatetimeIndex(index_values.view('datetime64[ns]'), name=meta['index'], freq=meta['freq'])
+        self.columns = list(meta['columns'])
+        self.files = {column: self.directory / filename for column, filename in meta['columns'].items()}
+        self.series = {}
+
+    @staticmethod
+    def save(time_series, directory, float32=False):
+        """ Writes each column of a time series DataFrame to its own .npy file.
+
+        Args:
+            time_series (DataFrame): time series data, indexed by a DatetimeIndex
+            directory (Path, str): directory to save the arrays in
+            float32 (bool): True to store float columns as float32
+
+        Returns: MemoryMappedTimeSeries opened on the new files
+
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / 'index.npy', time_series.index.values.astype('datetime64[ns]').view(np.int64))
+        columns = {}
+        for i, (column, values) in enumerate(time_series.items()):
+            values = values.values
+            if float32 and values.dtype.kind == 'f':
+                values = values.astype(np.float32)
+            columns[column] = f'{i}.npy'
+            np.save(directory / columns[column], values)
+        return MemoryMappedTimeSeries.write_meta(directory, time_series.index.name, time_series.index.freqstr,
+                                                 columns)
+
+    @staticmethod
+    def from_csv(filename, manifest, directory, index_col='Datetime (he)', float32=False, chunksize=100000):
+        """ Streams the columns in MANIFEST from a time series csv straight into the .npy files,
+        CHUNKSIZE rows at a time, so the whole time series is never held in memory.
+
+        Args:
+            filename (Path, str): the time series input file
+            manifest (dict): column name to dtype, as returned by TimeSeriesInput.column_manifest
+            directory (Path, str): directory to save the arrays in
+            index_col (str): name of the datetime column
+            float32 (bool): True to store every float column as float32
+            chunksize (int): number of rows read at a time
+
+        Returns: MemoryMappedTimeSeries opened on the new files
+
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        rows = TimeSeriesInput.row_count(filename, index_col, chunksize)
+        files = {}
+
+        def allocate(chunk):
+            files.update({column: f'{i}.npy' for i, column in enumerate(chunk.columns)})
+            index = np.lib.format.open_memmap(directory / 'index.npy', mode='w+', dtype=np.int64, shape=(rows,))
+            columns = {column: np.lib.format.open_memmap(directory / files[column], mode='w+', dtype=dtype,
+                                                         shape=(rows,))
+                       for column, dtype in chunk.dtypes.items()}
+            return index, columns
+
+        chunks = TimeSeriesInput.read_frames(filename, manifest, index_col, float32, chunksize)
+        arrays = TimeSeriesInput.stream_into(chunks, allocate)
+        if arrays is None:
+            return MemoryMappedTimeSeries.save(TimeSeriesInput.read_frames(filename, manifest, index_col, float32,
+                                                                           None), directory)
+        index, columns = arrays
+        for array in [index, *columns.values()]:
+            array.flush()
+        del index, columns, arrays
+        return MemoryMappedTimeSeries.write_meta(directory, index_col, None, files)
+
+    @staticmethod
+    def write_meta(directory, index_name, freq, columns):
+        """ Writes columns.json (index name, frequency and the file of each column) and opens DIRECTORY."""
+        meta = {'index': index_name, 'freq': freq, 'columns': columns}
+        with open(Path(directory) / 'columns.json', 'w') as f:
+            json.dump(meta, f)
+        return MemoryMappedTimeSeries(directory)
+
+    def __getitem__(self, key):
+        """ Returns the read-only Series view of a column. KEY is either the column name, or the
+        (rows, column) pair of a .loc[:, column] lookup.
+        """
+        if isinstance(key, tuple):
+            rows, column = key
+            if rows != slice(None):
+                return self[column].loc[rows]
+        else:
+            column = key
+        if column not in self.files:
+            raise KeyError(column)
+        if column not in self.series:
+            values = np.load(self.files[column], mmap_mode='r')
+            self.series[column] = pd.Series(values, index=self.index, name=column, copy=False)
+        return self.series[column]
+
+    def __contains__(self, column):
+        return column in self.files
+
+    @property
+    def loc(self):
+        return self
+
+    def get(self, column, default=None):
+        try:
+            return self[column]
+        except KeyError:
+            return default
@@ -32,10 +32,9 @@ UserConstraints.py
 
 This Python class contains methods and attributes specific for service analysis within StorageVet.
 """
-from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.ValueStream import ValueStream, stream_context
 import pandas as pd
 from storagevet.SystemRequirement import Requirement
-import storagevet.Library as Lib
 from storagevet.ErrorHandling import *
 import numpy as np
 
@@ -45,6 +44,9 @@ VERY_LARGE_NEGATIVE_NUMBER = -1 * VERY_LARGE_NUMBER
 class UserConstraints(ValueStream):
     """ 사용자가 입력한 시계열 제약 조건을 나타내는 클래스. 각 서비스는 PreDispService 클래스의 하위 클래스가 됩니다.
     """
+    checkpoint_attributes = ('system_requirements', 'poi_export_max_constraint', 'poi_export_min_constraint',
+                             'poi_import_max_constraint', 'poi_import_min_constraint', 'soe_max_constraint',
+                             'soe_min_constraint')
 
     def __init__(self, params):
         """ 목적 함수를 생성하고 제약 조건을 찾아 생성합니다.
@@ -79,18 +81,22 @@ class UserConstraints(ValueStream):
 
         """
      # 전력(Power) 데이터에 대해 불필요한 데이터를 추가하고 삭제합니다.
-        self.user_power = Lib.fill_extra_data(self.user_power, years, 0, frequency)
-        self.user_power = Lib.drop_extra_data(self.user_power, years)
+        self.user_power = self.grow_drop_input(self.user_power, years, 0, frequency)
      # 에너지(Energy) 데이터에 대해 불필요한 데이터를 추가하고 삭제합니다.
-        self.user_energy = Lib.fill_extra_data(self.user_energy, years, 0, frequency)
-        self.user_energy = Lib.drop_extra_data(self.user_energy, years)
+        self.user_energy = self.grow_drop_input(self.user_energy, years, 0, frequency)
+        self.user_power = self.prepare_input(self.user_power)
+        self.user_energy = self.prepare_input(self.user_energy)
 
+    @stream_context
     def calculate_system_requirements(self, der_lst):
         """ 활성화된 다양한 DER에 따라 무관하게 충족되어야 하는 시스템 요구 사항을 계산합니다.
         Args:
             der_lst (list): 시나리오에서 초기화된 DER(Distributed Energy Resources) 목록
 
         """
+        if self.restored:
+            # 체크포인트에서 복원된 요구사항을 그대로 사용
+            return
         # 전력에 대한 시스템 요구 사항 설정 (모든 값이 양수임을 보장하며 사용자가 값들을 제공하는 방식과 관계없이)
         # NOTE: 이로 인해 최소 제약 조건의 0 값에 대한 처리가 여기서 이루어집니다 (매우 큰 음수 값으로 대체)
         #       최대 제약 조건은 변경하지 마세요 (해당 0 값은 no-export 또는 no-import 경우를 제어하는 데 중요합니다)
@@ -99,29 +105,33 @@ class UserConstraints(ValueStream):
         self.poi_export_max_constraint = self.user_power.get('POI: Max Export (kW)')
         if self.poi_export_max_constraint is not None:
             self.poi_export_max_constraint = self.return_positive_values(self.poi_export_max_constraint)
-            self.system_requirements.append(Requirement('poi export', 'max', self.name, self.poi_export_max_constraint))
+            if ValueStream.slack_penalty is None:
+                self.system_requirements.append(Requirement('poi export', 'max', self.name, self.poi_export_max_constraint))
          
         # POI: Min Export (kW) 제약 조건 설정
         self.poi_export_min_constraint = self.user_power.get('POI: Min Export (kW)')
         if self.poi_export_min_constraint is not None:
-            self.poi_export_min_constraint = self.return_positive_values(self.poi_export_min_constraint)
+            self.poi_export_min_constraint = self.writable(self.return_positive_values(self.poi_export_min_constraint))
             self.poi_export_min_constraint[self.poi_export_min_constraint == 0] = VERY_LARGE_NEGATIVE_NUMBER
             TellUser.info('In order for the POI: Min Export constraint to work, we modify values that are zero to be a very large negative number')
-            self.system_requirements.append(Requirement('poi export', 'min', self.name, self.poi_export_min_constraint))
+            if ValueStream.slack_penalty is None:
+                self.system_requirements.append(Requirement('poi export', 'min', self.name, self.poi_export_min_constraint))
        
         # POI: Max Import (kW) 제약 조건 설정
         self.poi_import_max_constraint = self.user_power.get('POI: Max Import (kW)')
         if self.poi_import_max_constraint is not None:
             self.poi_import_max_constraint = self.return_positive_values(self.poi_import_max_constraint)
-            self.system_requirements.append(Requirement('poi import', 'max', self.name, self.poi_import_max_constraint))
+            if ValueStream.slack_penalty is None:
+                self.system_requirements.append(Requirement('poi import', 'max', self.name, self.poi_import_max_constraint))
 
         # POI: Min Import (kW) 제약 조건 설정
         self.poi_import_min_constraint = self.user_power.get('POI: Min Import (kW)')
         if self.poi_import_min_constraint is not None:
-            self.poi_import_min_constraint = self.return_positive_values(self.poi_import_min_constraint)
+            self.poi_import_min_constraint = self.writable(self.return_positive_values(self.poi_import_min_constraint))
             self.poi_import_min_constraint[self.poi_import_min_constraint == 0] = VERY_LARGE_NEGATIVE_NUMBER
             TellUser.info('In order for the POI: Min Import constraint to work, we modify values that are zero to be a very large negative number')
-            self.system_requirements.append(Requirement('poi import', 'min', self.name, self.poi_import_min_constraint))
+            if ValueStream.slack_penalty is None:
+                self.system_requirements.append(Requirement('poi import', 'min', self.name, self.poi_import_min_constraint))
 
        # 에너지에 대한 시스템 요구 사항 설정
        # Aggregate Energy Max (kWh) 제약 조건 설정
@@ -133,6 +143,46 @@ class UserConstraints(ValueStream):
         if self.soe_min_constraint is not None:
             self.system_requirements.append(Requirement('energy', 'min', self.name, self.soe_min_constraint))
 
+    @stream_context
+    def constraints(self, mask, load_sum, tot_variable_gen, generator_out_sum, net_ess_power, combined_rating):
+        """ 실행 불가능성 진단 모드에서만 사용됩니다. POI 수입/수출 제약 조건을 시스템 요구 사항 대신
+        slack 변수와 함께 직접 생성하여, 어떤 POI 제약 조건이 몇 번째 타임스텝에서 위반되는지 알 수 있게 합니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 시계열 데이터에 해당하는 인덱스에 대한 불리언 배열
+            tot_variable_gen (Expression): 가변 발전원의 합
+            load_sum (list, Expression): 시스템 내의 부하 합계
+            generator_out_sum (list, Expression): 시스템 내의 발전 합계
+            net_ess_power (list, Expression): 시스템 내의 모든 ESS의 순 전력 합계 [= 충전 - 방전]
+            combined_rating (Dictionary): 각 DER 클래스 유형의 결합 등급
+
+        Returns:
+            제약 조건 리스트 (진단 모드가 아니면 빈 리스트)
+        """
+        if ValueStream.slack_penalty is None:
+            return []
+        size = sum(mask)
+        # POI에서의 순 수입 전력 (수출은 음수)
+        net_import = load_sum + net_ess_power - tot_variable_gen - generator_out_sum
+        constraint_list = []
+        if self.poi_import_max_constraint is not None:
+            constraint_list += [self.relaxed_non_pos('POI Max Import', net_import - self.window_values(self.poi_import_max_constraint, mask), size)]
+        if self.poi_import_min_constraint is not None:
+            constraint_list += [self.relaxed_non_pos('POI Min Import', self.window_values(self.poi_import_min_constraint, mask) - net_import, size)]
+        if self.poi_export_max_constraint is not None:
+            constraint_list += [self.relaxed_non_pos('POI Max Export', -net_import - self.window_values(self.poi_export_max_constraint, mask), size)]
+        if self.poi_export_min_constraint is not None:
+            constraint_list += [self.relaxed_non_pos('POI Min Export', self.window_values(self.poi_export_min_constraint, mask) + net_import, size)]
+        return constraint_list
+
+    def input_columns(self):
+        """ 사용자가 입력한 전력 및 에너지 제약 조건 열
+
+        Returns: 열 이름을 키로, dtype을 값으로 가지는 딕셔너리
+
+        """
+        return {column: 'float64' for column in list(self.user_power.columns) + list(self.user_energy.columns)}
+
     def timeseries_report(self):
         """ 해당 Value Stream에 대한 최적화 결과를 요약하는 시계열 데이터프레임을 생성합니다.
 
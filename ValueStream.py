@@ -32,14 +32,42 @@ ValueStreamream.py
 
 This Python class contains methods and attributes specific for service analysis within StorageVet.
 """
+import copy
+import functools
+from contextlib import contextmanager
 import numpy as np
 import cvxpy as cvx
 import pandas as pd
+from scipy import sparse
+import storagevet.Library as Lib
+from storagevet.ValueStreams.HorizonIndex import HorizonIndex
+from storagevet.ValueStreams.SpillStore import VariableStore
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
+from storagevet.ErrorHandling import TellUser
+
+
+def stream_context(method):
+    """ Value Stream 메서드용 데코레이터: 메서드가 실행되는 동안 로그 레코드의 'stream'을 이 Value Stream의 이름으로
+    설정하고, 끝나면 이전 값으로 되돌립니다. 제약 조건, 목적 함수, 시스템 요구 사항을 만드는 메서드에 사용합니다.
+    """
+    @functools.wraps(method)
+    def in_stream_context(self, *args, **kwargs):
+        with TellUser.stream_context(self.name):
+            return method(self, *args, **kwargs)
+    return in_stream_context
 
 
 class ValueStream:
     """ 제공 기술에 의해 제공되고 제약을 받는 서비스에 대한 일반적인 템플릿.
     """
+    # 실행 불가능성 진단 모드에서 제약 조건 slack에 부과되는 페널티 (None이면 진단 모드 꺼짐)
+    slack_penalty = None
+    # 모든 Value Stream이 (객체 동일성으로) 공유하는 분석 기간 전체의 인덱스. set_horizon으로 설정합니다.
+    horizon = None
+    # True이면 입력 시계열, variables_df, 보고서 열을 float32로 저장 (enable_compact_storage로 설정)
+    compact = False
+    # calculate_system_requirements가 계산하고, 체크포인트에 함께 저장되는 속성 이름
+    checkpoint_attributes = ()
 
     def __init__(self, name, params):
         """ 모든 서비스를 다음 속성으로 초기화합니다.
@@ -58,6 +86,41 @@ class ValueStream:
         # 최적화 문제에 특화된 속성 (창에서 창으로 변경될 수 있는 속성)
         self.variables = None
 
+        # 실행 불가능성 진단 모드에서 사용되는 제약 조건 family별 slack 변수와 그 결과
+        # slack family -> [(slack 변수, 제약 조건이 따르는 최적화 변수 이름 (presolve용))], 한 family에 제약 조건이 여럿일 수 있음
+        self.slack_variables = {}
+        self.slack_df = pd.DataFrame()
+
+        # 제약 조건 family -> [(CVXPY 제약 조건, presolve로 줄어든 경우 그 변수 이름)]. 해결 후 dual 값을 저장함
+        self.constraint_families = {}
+        # 제약 조건 family와 시스템 요구 사항별 타임스텝 dual 값 (shadow price). 창마다 DataFrame을 추가하고
+        # shadow_price_report에서 한 번만 합침
+        self.dual_frames = []
+
+        # presolve 결과: 변수 이름 -> 이 창에서 참여하는 타임스텝의 불리언 배열 (모두 참여하는 변수는 없음)
+        self.participating = {}
+        # presolve 결과: 이 창에서 참여하는 타임스텝이 하나도 없어 변수 대신 0 상수를 사용하는 변수 이름
+        self.excluded = set()
+
+        # 가격/예측 신호의 CVXPY Parameter: 이름 -> (Parameter, mask로부터 값을 계산하는 함수)
+        self.parameters = {}
+
+        # 포트폴리오 모드에서 이 Value Stream을 함께 입찰하는 사이트 이름 (None이면 단일 사이트)
+        self.sites = None
+
+        # ESS fleet: ESS별 rte와 스루풋 분담률 (numpy 배열, rte_list 또는 set_fleet으로 설정)
+        self.rte_array = np.ones(1)
+        self.throughput_shares = np.ones(1)
+        self.ess_names = ['ESS']
+
+        # 메모리 예산 모드에서 창별 최적화 결과를 보관하는 청크 저장소 (enable_memory_budget 참고)
+        self.variable_store = None
+        # variable_chunks가 variables_df를 청크 하나로 바꾸어 둔 동안 True
+        self.reading_chunk = False
+
+        # 체크포인트에서 복원되었으면 True (calculate_system_requirements를 다시 계산하지 않음)
+        self.restored = False
+
     def grow_drop_data(self, years, frequency, load_growth):
         """ 주어진 데이터를 성장시키거나 추가로 포함된 데이터를 삭제하여 데이터를 확장합니다. 성장 데이터를 추가한 후 최적화가 실행되기 전에 시계열 데이터를 보관하는 변수를 업데이트합니다.
 
@@ -93,8 +156,8 @@ class ValueStream:
         Returns: CVXPY parameter/variable
 
         """
-     # CVXPY 모듈을 사용하여 매개변수를 생성하고 반환합니다. 초기값은 np.zeros(sum(mask))로 설정되며, 매개변수의 모양은 sum(mask)로, 이름은 f'{self.name}ZeroUp'로 설정됩니다.
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'{self.name}ZeroUp')
+     # 값이 0인 CVXPY 매개변수를 반환합니다. 모양은 최적화 변수와 같습니다 (포트폴리오 모드에서는 (길이, 사이트 수)).
+        return self.zero_parameter(mask, f'{self.name}ZeroUp')
 
     def p_reservation_charge_down(self, mask):
         """ 이 Value Stream에 대한 예약해야 하는 아래 방향(그리드에서 전원을 가져오는 방향)으로의 충전 전력 양입니다.
@@ -104,8 +167,8 @@ class ValueStream:
         Returns: CVXPY parameter/variable
 
         """
-     # CVXPY 모듈을 사용하여 매개변수를 생성하고 반환합니다. 초기값은 np.zeros(sum(mask))로 설정되며, 매개변수의 모양은 sum(mask)로, 이름은 f'{self.name}ZeroDown'로 설정됩니다.
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'{self.name}ZeroDown')
+     # 값이 0인 CVXPY 매개변수를 반환합니다. 모양은 최적화 변수와 같습니다 (포트폴리오 모드에서는 (길이, 사이트 수)).
+        return self.zero_parameter(mask, f'{self.name}ZeroDown')
 
     def p_reservation_discharge_up(self, mask):
         """ 이 Value Stream에 대한 예약해야 하는 위쪽 방향(그리드로 전원을 제공하는 방향)으로의 방전 전력 양입니다.
@@ -115,7 +178,7 @@ class ValueStream:
         Returns: CVXPY parameter/variable
 
         """
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'{self.name}ZeroUp')
+        return self.zero_parameter(mask, f'{self.name}ZeroUp')
 
     def p_reservation_discharge_down(self, mask):
         """ 이 Value Stream에 대한 예약해야 하는 아래쪽 방향(그리드에서 전원을 가져오는 방향)으로의 방전 전력 양입니다.
@@ -126,7 +189,7 @@ class ValueStream:
         Returns: CVXPY parameter/variable
 
         """
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'{self.name}ZeroDown')
+        return self.zero_parameter(mask, f'{self.name}ZeroDown')
 
     def uenergy_option_stored(self, mask):
         """ 이 Value Stream에 대한 예약해야 하는 변동 상승에 따른 에너지 양입니다.
@@ -137,7 +200,7 @@ class ValueStream:
         Returns: the up energy reservation in kWh
 
         """
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'ZeroStored{self.name}')
+        return self.zero_parameter(mask, f'ZeroStored{self.name}')
 
     def uenergy_option_provided(self, mask):
         """ 이 Value Stream 에 대한 변 상승에 따른 예약된 상승 에너지 양입니다.
@@ -148,7 +211,7 @@ class ValueStream:
         Returns: the up energy reservation in kWh
 
         """
-        return cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'ZeroProvided{self.name}')
+        return self.zero_parameter(mask, f'ZeroProvided{self.name}')
 
     def worst_case_uenergy_stored(self, mask):
         """ 현재 SOE로부터 예약되어야 하는 에너지 양으로, 시계열 데이터에 포함되지 않은 시간 단계 사이의 위반을 방지합니다.
@@ -160,7 +223,7 @@ class ValueStream:
         Returns: 예상보다 많은 에너지로 시스템이 끝날 경우의 경우
 
         """
-        stored = cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'uEstoredZero{self.name}')
+        stored = self.zero_parameter(mask, f'uEstoredZero{self.name}')
         return stored
 
     def worst_case_uenergy_provided(self, mask):
@@ -172,9 +235,23 @@ class ValueStream:
         Returns: 예상상보다 적은 에너지로 시스템이 끝날 경우의 경우
 
         """
-        provided = cvx.Parameter(value=np.zeros(sum(mask)), shape=sum(mask), name=f'uEprovidedZero{self.name}')
+        provided = self.zero_parameter(mask, f'uEprovidedZero{self.name}')
         return provided
 
+    def zero_parameter(self, mask, name):
+        """ 예약이 없는 Value Stream의 기본값: 값이 0인 CVXPY 매개변수. 모양은 variable_shape와 같으므로 포트폴리오 모드에서도
+        다른 Value Stream의 (길이, 사이트 수) 표현식과 더할 수 있습니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+            name (str): 매개변수 이름
+
+        Returns: CVXPY parameter
+
+        """
+        shape = self.variable_shape(None, int(sum(mask)))
+        return cvx.Parameter(value=np.zeros(shape), shape=shape, name=name)
+
     def objective_function(self, mask, load_sum, tot_variable_gen, generator_out_sum, net_ess_power, annuity_scalar=1):
         """ 전체 목적 함수를 생성하며 최적화 변수를 포함합니다.
 
@@ -216,9 +293,503 @@ class ValueStream:
 
         """
      # optimization 변수의 값을 저장하는 데이터프레임 생성
-        variable_values = pd.DataFrame({name: self.variables[name].value for name in self.variable_names}, index=subs_index)
-     # 기존 변수 결과와 병합하여 저장
-        self.variables_df = pd.concat([self.variables_df, variable_values], sort=True)
+        if self.sites is None:
+            variable_values = pd.DataFrame({name: self.fill_dropped(name, self.variables[name].value, len(subs_index))
+                                            for name in self.variable_names}, index=subs_index)
+        else:
+            # 포트폴리오 모드: T x N 행렬들을 (사이트, 변수) 열을 가진 하나의 DataFrame으로 한 번에 변환
+            names = sorted(self.variable_names)
+            values = np.stack([self.fill_dropped(name, self.variables[name].value, len(subs_index)) for name in names],
+                              axis=2)
+            variable_values = pd.DataFrame(values.reshape(len(subs_index), -1), index=subs_index,
+                                           columns=pd.MultiIndex.from_product([self.sites, names]))
+        variable_values = self.compact_data(variable_values)
+        if VariableStore.memory_budget is not None:
+            # 메모리 예산 모드: 창 결과를 청크로 보관하고, 예산을 넘으면 오래된 청크를 디스크로 내보냄
+            if self.variable_store is None:
+                self.variable_store = VariableStore(self.name)
+            self.variable_store.append(variable_values)
+        else:
+         # 기존 변수 결과와 병합하여 저장
+            self.variables_df = pd.concat([self.variables_df, variable_values], sort=True)
+        self.variables_changed()
+        if self.slack_variables:
+            # family의 제약 조건들과 (포트폴리오 모드에서는) 사이트 중 가장 큰 slack을 저장
+            size = len(subs_index)
+            slack_values = pd.DataFrame({family: np.max([self.fill_dropped(variable, slack.value, size).reshape(size, -1)
+                                                         .max(axis=1) for slack, variable in slacks], axis=0)
+                                         for family, slacks in self.slack_variables.items()}, index=subs_index)
+            self.slack_df = pd.concat([self.slack_df, slack_values], sort=True)
+            self.slack_variables = {}
+        if self.constraint_families:
+            # family의 dual 값은 그 family의 모든 제약 조건의 dual 값의 합 (family 전체를 1 단위 완화했을 때의 가치)
+            duals = {}
+            for family, constraints in self.constraint_families.items():
+                family_duals = [self.window_duals(constraint, variable, len(subs_index))
+                                for constraint, variable in constraints]
+                family_duals = [dual for dual in family_duals if dual is not None]
+                if family_duals:
+                    duals[family] = np.sum(family_duals, axis=0)
+            self.save_duals(pd.DataFrame(duals, index=subs_index))
+            self.constraint_families = {}
+
+    def window_duals(self, constraint, variable, size):
+        """ 해결된 제약 조건 CONSTRAINT의 dual 값을 창 길이의 배열로 반환합니다. presolve로 제외된 타임스텝은 0이고,
+        포트폴리오 모드에서는 모든 사이트의 합 (모든 사이트의 한도를 1 단위씩 완화했을 때의 가치)입니다.
+
+        Returns: numpy 배열 (해결되지 않았으면 None)
+
+        """
+        if constraint.dual_value is None:
+            return None
+        dual = self.fill_dropped(variable, np.asarray(constraint.dual_value, dtype=np.float64), size)
+        return dual.reshape(size, -1).sum(axis=1)
+
+    def save_duals(self, window_duals):
+        """ 한 창의 dual 값을 dual_frames에 추가합니다. 합치는 것은 shadow_price_report에서 한 번만 합니다."""
+        if not window_duals.empty:
+            self.dual_frames.append(window_duals)
+
+    def duals(self):
+        """ 지금까지 저장된 모든 창의 dual 값을 하나의 DataFrame으로 합칩니다. 같은 타임스텝과 family의 값이 여러 번
+        저장되었으면 나중 값을 사용합니다. 합친 결과로 dual_frames를 바꾸므로 다시 호출해도 합치지 않습니다.
+
+        Returns: 타임스텝을 인덱스로, 제약 조건 family를 열로 가지는 DataFrame
+
+        """
+        if not self.dual_frames:
+            return pd.DataFrame()
+        if len(self.dual_frames) > 1:
+            self.dual_frames = [pd.concat(self.dual_frames, sort=True).groupby(level=0).last()]
+        return self.dual_frames[0]
+
+    @staticmethod
+    def save_requirement_duals(value_streams, requirement_constraints, subs_index):
+        """ 시스템 요구 사항(Requirement)에서 만든 제약 조건의 dual 값을 그 요구 사항을 만든 Value Stream에 저장합니다.
+        (ex. RA의 'der dispatch discharge min', UserConstraints의 'poi export max')
+
+        Args:
+            value_streams (list, dict): ValueStream 인스턴스들
+            requirement_constraints (list): 해결된 창의 (Requirement, CVXPY 제약 조건) 목록
+            subs_index (Index): 변수가 해결된 데이터의 하위 집합의 인덱스
+
+        """
+        if isinstance(value_streams, dict):
+            value_streams = value_streams.values()
+        by_name = {value_stream.name: value_stream for value_stream in value_streams}
+        for requirement, constraint in requirement_constraints:
+            value_stream = by_name.get(requirement.parent)
+            if value_stream is None or constraint.dual_value is None:
+                continue
+            dual = np.asarray(constraint.dual_value, dtype=np.float64).reshape(-1)
+            if len(dual) == len(subs_index):
+                index = subs_index
+            else:
+                # 요구 사항이 창의 일부 타임스텝에만 있는 경우 (ex. RA 이벤트)
+                index = requirement.value.index[requirement.value.index.isin(subs_index)]
+            family = f'{requirement.type} {requirement.limit_type}'
+            value_stream.save_duals(pd.DataFrame({family: dual}, index=index))
+
+    def shadow_price_report(self):
+        """ 제약 조건 family와 시스템 요구 사항별 타임스텝 shadow price. 값은 그 타임스텝의 한도를 1 단위 완화했을 때
+        목적 함수(비용)가 줄어드는 양입니다 (ex. SR max를 1 kW 늘렸을 때의 가치).
+
+        Returns: 타임스텝을 인덱스로 가지는 DataFrame
+
+        """
+        return self.duals().rename(columns=lambda family: f'{self.name} {family} Shadow Price')
+
+    def yearly_shadow_prices(self, opt_years):
+        """ 연도별 shadow price: 한 해 동안 모든 타임스텝의 한도를 1 단위 완화했을 때의 가치
+
+        Args:
+            opt_years (list): 최적화 문제가 실행된 연도 목록
+
+        Returns: 연도를 인덱스로 가지는 DataFrame
+
+        """
+        report = self.shadow_price_report()
+        yearly = {pd.Period(year=year, freq='y'): report.loc[self.year_mask(report.index, year)].sum()
+                  for year in opt_years}
+        return pd.DataFrame(yearly).T
+
+    def participation(self, mask):
+        """ presolve 훅: 이 창에서 최적화 변수가 0으로 고정되지 않는 (참여할 수 있는) 타임스텝을 반환합니다.
+        가격이 0 이하이거나 참여 한도가 0인 타임스텝이 있는 서비스가 재정의합니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+
+        Returns: 변수 이름을 키로, 창 길이의 불리언 numpy 배열을 값으로 가지는 딕셔너리 (기본값 {}: 모든 타임스텝 참여)
+
+        """
+        return {}
+
+    def presolve(self, mask):
+        """ initialize_variables 전에 호출되는 presolve 단계입니다. 참여할 수 없는 타임스텝의 변수는 0으로 고정되므로
+        문제에서 제외하고 (변수 길이 = 참여 타임스텝 수), 결과를 저장할 때 0으로 채웁니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+
+        """
+        self.participating = {}
+        self.excluded = set()
+        for name, participating in self.participation(mask).items():
+            participating = np.asarray(participating, dtype=bool)
+            if not participating.any():
+                # 길이가 0인 CVXPY 변수는 만들 수 없으므로, 창 전체에서 0인 상수로 대신함 (new_variable 참고)
+                self.excluded.add(name)
+            elif not participating.all():
+                self.participating[name] = participating
+
+    def variable_size(self, name, size):
+        """ presolve 이후 최적화 변수 NAME의 길이 (창 길이 SIZE에서 제외된 타임스텝을 뺀 값)"""
+        if name in self.participating:
+            return int(self.participating[name].sum())
+        return size
+
+    def new_variable(self, name, size, label=None):
+        """ 최적화 변수 NAME을 만듭니다. presolve에서 창의 모든 타임스텝이 제외된 변수는 CVXPY 변수 대신 창 전체
+        길이의 0 상수가 되므로, 제약 조건과 목적 함수는 그대로 만들 수 있고 결과는 0으로 저장됩니다.
+
+        Args:
+            name (str): 최적화 변수의 이름
+            size (int): 창 길이
+            label (str): CVXPY 변수 이름에 사용할 이름 (None이면 NAME)
+
+        Returns: CVXPY variable/constant
+
+        """
+        shape = self.variable_shape(name, size)
+        if name in self.excluded:
+            return cvx.Constant(np.zeros(shape))
+        return cvx.Variable(shape=shape, name=f'{self.name}_{label or name}')
+
+    def variable(self, name):
+        """ 최적화 변수 NAME을 창 전체 길이의 표현식으로 반환합니다. presolve로 제외된 타임스텝의 값은 0입니다.
+
+        Returns: CVXPY variable/expression
+
+        """
+        variable = self.variables[name]
+        if name not in self.participating:
+            return variable
+        participating = self.participating[name]
+        positions = np.flatnonzero(participating)
+        scatter = sparse.csr_matrix((np.ones(len(positions)), (positions, np.arange(len(positions)))),
+                                    shape=(len(participating), len(positions)))
+        return scatter @ variable
+
+    def on_participating(self, name, values):
+        """ 창 길이의 값 배열 VALUES에서 최적화 변수 NAME이 참여하는 타임스텝의 값만 남깁니다."""
+        values = np.asarray(values)
+        if name in self.participating:
+            return values[self.participating[name]]
+        return values
+
+    def fill_dropped(self, name, values, size):
+        """ presolve로 줄어든 변수 NAME의 해 VALUES를 창 길이 SIZE로 되돌립니다 (제외된 타임스텝은 0)."""
+        if name not in self.participating:
+            return values
+        full = np.zeros((size,) + np.shape(values)[1:])
+        full[self.participating[name]] = values
+        return full
+
+    def enable_portfolio(self, sites):
+        """ 포트폴리오 모드를 켭니다. 같은 서비스를 입찰하는 N개 사이트를, 사이트별 Value Stream 복사본 대신
+        상품별 T x N 행렬 변수 하나로 모델링합니다. 가격과 시계열 제약 한도는 모든 사이트에 broadcast 됩니다.
+        사이트별 결과와 보고서는 for_site로 얻습니다.
+
+        Args:
+            sites (list): 사이트 이름 목록
+
+        """
+        self.sites = list(sites)
+        self.variables_df = pd.DataFrame(columns=pd.MultiIndex.from_product([self.sites,
+                                                                             sorted(self.variable_names)]))
+
+    def variable_shape(self, name, size):
+        """ 최적화 변수 NAME의 모양: 단일 사이트이면 (presolve 이후) 길이, 포트폴리오 모드이면 (길이, 사이트 수)"""
+        rows = self.variable_size(name, size)
+        if self.sites is None:
+            return rows
+        return rows, len(self.sites)
+
+    def broadcast(self, values):
+        """ 타임스텝별 값 배열 (또는 CVXPY 표현식) VALUES를 포트폴리오 모드에서는 모든 사이트 열로 broadcast 합니다."""
+        if self.sites is None:
+            return values
+        if isinstance(values, cvx.Expression):
+            return cvx.reshape(values, (values.shape[0], 1))
+        values = np.asarray(values)
+        return np.broadcast_to(values[:, None], (len(values), len(self.sites)))
+
+    def for_site(self, site):
+        """ 포트폴리오 결과에서 사이트 하나의 결과를 가진 단일 사이트 Value Stream을 반환합니다. 반환된 객체의
+        variables_df는 공유 결과의 해당 사이트 열이므로 timeseries_report, proforma_report를 그대로 사용할 수 있습니다.
+
+        Args:
+            site (str): 사이트 이름
+
+        Returns: ValueStream (얕은 복사본)
+
+        """
+        view = copy.copy(self)
+        view.sites = None
+        if self.variable_store is not None:
+            # 메모리 예산 모드: 청크를 읽을 때 사이트 열만 남기는 보기
+            view.variable_store = self.variable_store.site(site)
+        else:
+            view.variables_df = self.variables_df.xs(site, axis=1, level=0)
+        view.variables_changed()
+        return view
+
+    def parameter(self, name, values, mask):
+        """ 가격이나 예측 신호에 대한 CVXPY Parameter를 반환합니다. 같은 이름과 길이의 Parameter가 이미 있으면
+        값만 바꾸어 재사용하므로, 컴파일된 문제를 다시 만들지 않고 update_parameters로 새 신호를 반영할 수 있습니다.
+
+        Args:
+            name (str): 신호의 이름 (ex. 'price')
+            values (function): MASK를 받아 Parameter의 값(numpy 배열)을 반환하는 함수
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+
+        Returns: CVXPY Parameter
+
+        """
+        value = values(mask)
+        parameter, _ = self.parameters.get(name, (None, None))
+        if parameter is None or parameter.shape != (len(value),):
+            parameter = cvx.Parameter(len(value), name=f'{self.name}_{name}')
+        parameter.value = value
+        self.parameters[name] = (parameter, values)
+        return parameter
+
+    def update_parameters(self, mask):
+        """ update_price_signals로 바뀐 신호를 이 Value Stream의 모든 Parameter에 반영합니다.
+
+        Args:
+            mask (DataFrame): 문제를 만들 때 사용한 부울 배열
+
+        """
+        for parameter, values in self.parameters.values():
+            parameter.value = values(mask)
+
+    def variables_changed(self):
+        """ variables_df가 바뀐 후 호출됩니다. variables_df로부터 계산된 캐시를 가진 서비스가 재정의합니다."""
+        pass
+
+    @classmethod
+    def enable_memory_budget(cls, memory_budget, spill_path):
+        """ 매우 긴 분석 기간을 위한 메모리 예산 모드를 켭니다. 모든 Value Stream의 창별 결과의 합이 MEMORY_BUDGET을
+        넘으면 오래된 창의 결과를 청크 파일(.npy)로 내보냅니다. 이 모드에서 variables_df는 비어 있으며,
+        보고서는 iter_timeseries_report와 chunked_proforma_report로 청크 단위로 만듭니다. timeseries_report도
+        청크를 읽지만 (all_variables 참고) 전체 결과를 한 번에 메모리에 올립니다.
+
+        Args:
+            memory_budget (int): 메모리에 보관할 결과의 바이트 수
+            spill_path (Path): 청크 파일을 저장할 디렉토리
+
+        """
+        VariableStore.configure(memory_budget, spill_path)
+
+    def materialize_variables(self):
+        """ 청크로 보관된 결과를 모두 읽어 variables_df 하나로 합칩니다. (전체 결과가 메모리에 들어갈 때만 사용)"""
+        if self.variable_store is not None:
+            self.variables_df = self.variable_store.to_frame()
+            self.variables_changed()
+
+    def variable_chunks(self):
+        """ 최적화 결과를 창 청크 단위로 반환합니다. 각 청크를 반환하는 동안 variables_df는 그 청크로 설정됩니다.
+
+        Returns: 청크 DataFrame의 generator (메모리 예산 모드가 아니면 variables_df 하나)
+
+        """
+        if self.variable_store is None:
+            yield self.variables_df
+            return
+        original = self.variables_df
+        self.reading_chunk = True
+        try:
+            for chunk in self.variable_store:
+                self.variables_df = chunk
+                self.variables_changed()
+                yield chunk
+        finally:
+            self.reading_chunk = False
+            self.variables_df = original
+            self.variables_changed()
+
+    @contextmanager
+    def all_variables(self):
+        """ 메모리 예산 모드에서 비어 있는 variables_df를 with 블록 동안 모든 청크 (디스크로 내보낸 청크 포함)로 채웁니다.
+        ReportBuilder.build가 fill_report를 호출할 때 사용하므로, timeseries_report처럼 전체 결과를 읽는 보고서도
+        올바른 값을 가집니다 (이때는 전체 결과가 메모리에 올라오므로, 최대 메모리를 지키려면 iter_timeseries_report와
+        chunked_proforma_report를 사용해야 합니다). 메모리 예산 모드가 아니거나 청크 하나를 읽는 중이면 아무것도 하지 않습니다.
+        """
+        if self.variable_store is None or self.reading_chunk:
+            yield
+            return
+        original = self.variables_df
+        self.variables_df = self.variable_store.to_frame()
+        self.variables_changed()
+        try:
+            yield
+        finally:
+            self.variables_df = original
+            self.variables_changed()
+
+    def chunked(self):
+        """ 보고서를 청크 단위로 만들 수 있는지 여부 (최적화 변수가 있고, 열을 선언했으며, 결과가 청크로 보관된 경우)"""
+        return self.variable_store is not None and bool(self.variable_names) and self.report_columns() is not None
+
+    def iter_timeseries_report(self):
+        """ 시계열 보고서를 창 청크 단위로 만듭니다. 최대 메모리는 청크 하나의 보고서 크기입니다.
+
+        Returns: 시계열 보고서 DataFrame의 generator
+
+        """
+        if not self.chunked():
+            yield self.timeseries_report()
+            return
+        for chunk in self.variable_chunks():
+            yield ReportBuilder.build([self], chunk.index)
+
+    def chunked_proforma_report(self, opt_years, apply_inflation_rate_func, fill_forward_func):
+        """ 청크별 proforma의 합으로 proforma를 계산합니다. 청크에 없는 연도의 값은 0이고, 연도별 합과
+        인플레이션/성장 채우기는 값에 대해 선형이므로 합은 전체 결과로 계산한 proforma와 같습니다.
+
+        Args:
+            opt_years (list): 최적화 문제를 실행한 연도 목록
+            apply_inflation_rate_func:
+            fill_forward_func:
+
+        Returns: 연도별로 색인이 지정된 DataFrame
+
+        """
+        if not self.chunked():
+            return self.proforma_report(opt_years, apply_inflation_rate_func, fill_forward_func,
+                                        self.timeseries_report())
+        proforma = None
+        for chunk in self.variable_chunks():
+            results = ReportBuilder.build([self], chunk.index)
+            chunk_proforma = self.proforma_report(opt_years, apply_inflation_rate_func, fill_forward_func, results)
+            proforma = chunk_proforma if proforma is None else proforma.add(chunk_proforma, fill_value=0)
+        return proforma
+
+    def checkpoint_state(self):
+        """ 체크포인트에 저장할 이 Value Stream의 진행 상태를 반환합니다: 지금까지 해결된 창의 결과, dual 값과
+        calculate_system_requirements가 계산한 속성들 (CHECKPOINT_ATTRIBUTES).
+        메모리 예산 모드에서는 디스크로 내보낸 청크의 파일 경로와 메모리에 남은 청크만 저장하므로, 체크포인트 크기가
+        전체 결과에 비례하지 않습니다.
+
+        Returns: 상태 딕셔너리
+
+        """
+        if self.variable_store is None:
+            variables = {'variables_df': self.variables_df}
+        else:
+            variables = {'variable_chunks': self.variable_store.checkpoint()}
+        return {**variables,
+                'slack_df': self.slack_df,
+                'dual_frames': list(self.dual_frames),
+                'attributes': {name: getattr(self, name) for name in self.checkpoint_attributes}}
+
+    def restore_checkpoint(self, state):
+        """ checkpoint_state로 저장된 진행 상태를 복원합니다.
+
+        Args:
+            state (dict): checkpoint_state가 반환한 상태
+
+        """
+        if 'variable_chunks' in state:
+            self.variable_store = VariableStore(self.name)
+            self.variable_store.restore(state['variable_chunks'])
+        elif VariableStore.memory_budget is not None:
+            self.variable_store = VariableStore(self.name)
+            if not state['variables_df'].empty:
+                self.variable_store.append(state['variables_df'])
+        else:
+            self.variables_df = state['variables_df']
+        self.variables_changed()
+        self.slack_df = state['slack_df']
+        self.dual_frames = list(state.get('dual_frames', []))
+        for name, value in state['attributes'].items():
+            setattr(self, name, value)
+        self.restored = True
+
+    @classmethod
+    def enable_infeasibility_triage(cls, penalty=1e6):
+        """ 실행 불가능성 진단 모드를 켭니다. 모든 제약 조건 family에 페널티가 부과된 음이 아닌 slack 변수가
+        추가되므로, 한 번의 solve로 어떤 family와 타임스텝이 문제를 실행 불가능하게 만드는지 알 수 있습니다.
+
+        Args:
+            penalty (float): slack 1 단위당 목적 함수에 추가되는 비용. None이면 진단 모드를 끕니다.
+
+        """
+        ValueStream.slack_penalty = penalty
+
+    def relaxed_non_pos(self, family, expression, size, variable=None):
+        """ EXPRESSION <= 0 제약 조건을 생성합니다. 진단 모드에서는 EXPRESSION - slack <= 0 으로 완화하고,
+        slack 변수를 FAMILY 이름으로 저장합니다. 같은 FAMILY의 제약 조건이 여럿이면 모두 저장되고,
+        결과는 family별로 합쳐집니다 (slack은 최댓값, dual 값은 합).
+
+        Args:
+            family (str): 제약 조건 family의 이름 (ex. 'Max', 'Min')
+            expression (Expression): 0 이하로 제한되는 CVXPY 표현식
+            size (int): EXPRESSION의 길이
+            variable (str): EXPRESSION이 presolve로 줄어든 최적화 변수 위에 정의된 경우, 그 변수의 이름
+
+        Returns: CVXPY 제약 조건
+
+        """
+        if ValueStream.slack_penalty is None:
+            constraint = cvx.NonPos(expression)
+        else:
+            slack = cvx.Variable(shape=size, nonneg=True, name=f'{self.name}_{family}_slack')
+            self.slack_variables.setdefault(family, []).append((slack, variable))
+            constraint = cvx.NonPos(expression - slack)
+        self.constraint_families.setdefault(family, []).append((constraint, variable))
+        return constraint
+
+    def slack_objective(self):
+        """ 진단 모드에서 slack 변수에 대한 페널티 항을 반환합니다. constraints 메서드 이후에 호출해야 합니다.
+
+        Returns: 목적 함수에 추가할 표현식의 딕셔너리 (진단 모드가 아니거나 slack이 없으면 {})
+
+        """
+        if ValueStream.slack_penalty is None or not self.slack_variables:
+            return {}
+        penalty = sum(cvx.sum(slack) for slacks in self.slack_variables.values()
+                      for slack, _ in slacks) * ValueStream.slack_penalty
+        return {f'{self.name} Constraint Slack': penalty}
+
+    @staticmethod
+    def rank_constraint_slack(value_streams, tolerance=1e-6):
+        """ 진단 solve 이후, 0이 아닌 slack이 필요했던 제약 조건 family와 타임스텝을 크기 순으로 정렬합니다.
+
+        Args:
+            value_streams (list, dict): ValueStream 인스턴스들
+            tolerance (float): 이 값보다 작은 slack은 무시합니다
+
+        Returns: 'Value Stream', 'Constraint', 'Timestep', 'Slack' 열을 가진 DataFrame (Slack이 큰 순서)
+
+        """
+        if isinstance(value_streams, dict):
+            value_streams = value_streams.values()
+        ranked = []
+        for vs in value_streams:
+            if vs.slack_df.empty:
+                continue
+            slack = vs.slack_df.stack()
+            slack = slack[slack > tolerance]
+            ranked.append(pd.DataFrame({'Value Stream': vs.name,
+                                        'Constraint': slack.index.get_level_values(1),
+                                        'Timestep': slack.index.get_level_values(0),
+                                        'Slack': slack.values}))
+        if not ranked:
+            return pd.DataFrame(columns=['Value Stream', 'Constraint', 'Timestep', 'Slack'])
+        return pd.concat(ranked, ignore_index=True).sort_values('Slack', ascending=False, ignore_index=True)
 
     def timeseries_report(self):
         """  이 Value Stream에 대한 최적화 결과를 요약하는 시계열 데이터프레임 생성
@@ -227,6 +798,24 @@ class ValueStream:
         """
      # 구현 필요
 
+    def report_columns(self):
+        """ ReportBuilder가 미리 할당할 이 Value Stream의 시계열 보고서 열 목록입니다.
+
+        Returns: (열 이름, 'float' 또는 'bool') 튜플의 리스트. 기본값 None은 열을 선언하지 않음을 의미하며,
+            이 경우 ReportBuilder는 timeseries_report의 결과를 복사합니다.
+
+        """
+        return None
+
+    def fill_report(self, builder):
+        """ report_columns에서 선언한 열을 ReportBuilder의 미리 할당된 블록에 채웁니다.
+
+        Args:
+            builder (ReportBuilder): 시나리오 전체의 보고서 빌더
+
+        """
+        pass
+
     def monthly_report(self):
         """  이 객체에 저장된 모든 월간 데이터를 수집
 
@@ -240,6 +829,158 @@ class ValueStream:
         """
         return {}
 
+    @classmethod
+    def set_horizon(cls, index):
+        """ 분석 기간 전체의 시계열 인덱스를 한 번 생성하여 모든 Value Stream이 공유하도록 합니다.
+        grow_drop_data 이전에 호출해야 합니다.
+
+        Args:
+            index (DatetimeIndex): 분석 기간 전체의 시계열 인덱스
+
+        Returns: 공유되는 HorizonIndex
+
+        """
+        ValueStream.horizon = HorizonIndex(index)
+        return ValueStream.horizon
+
+    def align_to_horizon(self, data):
+        """ 시계열 데이터를 공유 인덱스 위에 놓습니다. 공유 인덱스가 없으면 그대로 반환합니다.
+
+        Args:
+            data (Series, DataFrame): 시계열 데이터
+
+        Returns: 인덱스가 공유 인덱스 객체인 데이터
+
+        """
+        if ValueStream.horizon is None:
+            return data
+        return ValueStream.horizon.align(data)
+
+    @classmethod
+    def enable_compact_storage(cls, compact=True):
+        """ 메모리가 부족한 포트폴리오 실행을 위한 compact 저장 모드를 켭니다. 입력 시계열, variables_df,
+        보고서 열은 float32로, 불리언 플래그는 bool 배열로 저장됩니다. proforma 집계는 항상 float64로 누적됩니다.
+
+        Args:
+            compact (bool): True이면 compact 저장 모드를 켬
+
+        """
+        ValueStream.compact = compact
+
+    @staticmethod
+    def compact_data(data):
+        """ compact 저장 모드에서 DATA의 float 열을 float32로 변환합니다. 그 외의 경우 그대로 반환합니다.
+
+        Args:
+            data (Series, DataFrame, scalar): 시계열 데이터
+
+        """
+        if not ValueStream.compact or not hasattr(data, 'dtypes'):
+            return data
+        if isinstance(data, pd.Series):
+            return data.astype(np.float32) if data.dtype == np.float64 else data
+        float_columns = {column: np.float32 for column, dtype in data.dtypes.items() if dtype == np.float64}
+        return data.astype(float_columns) if float_columns else data
+
+    def grow_drop_input(self, data, years, growth, frequency):
+        """ 입력 시계열에 Lib.fill_extra_data와 Lib.drop_extra_data를 적용합니다. 분석 연도가 모두 있으면 Lib를 거치지 않고
+        분석 연도의 연속 구간을 위치로 잘라내므로, 메모리 매핑된 입력은 복사 없이 읽기 전용 보기로 남습니다.
+        성장으로 채워야 하는 연도가 있을 때만 새 데이터를 만듭니다.
+
+        Args:
+            data (Series, DataFrame): 시계열 입력
+            years (List): 분석이 수행될 연도 목록
+            growth (float): 없는 연도를 채울 때 사용하는 성장률
+            frequency (str): 시계열 데이터의 주기
+
+        """
+        if isinstance(data, (pd.Series, pd.DataFrame)) and isinstance(data.index, pd.DatetimeIndex):
+            data_years = np.asarray(data.index.year)
+            positions = np.flatnonzero(np.isin(data_years, years))
+            if len(positions) and set(years) <= set(np.unique(data_years[positions]).tolist()) \
+                    and positions[-1] - positions[0] + 1 == len(positions):
+                if len(positions) == len(data):
+                    return data
+                return data.iloc[positions[0]:positions[-1] + 1]
+        data = Lib.fill_extra_data(data, years, growth, frequency)
+        return Lib.drop_extra_data(data, years)
+
+    @staticmethod
+    def window_values(data, mask):
+        """ DATA(스칼라 또는 Series)의 MASK 창 값을 numpy 배열로 반환합니다. 창이 연속된 타임스텝이면 입력 배열의
+        위치 슬라이스를 반환하므로, 메모리 매핑된 입력은 복사되지 않습니다 (반환값은 읽기 전용일 수 있음).
+
+        Args:
+            data (Series, float): 시계열 입력 또는 모든 타임스텝에 같은 값
+            mask (Series): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+
+        """
+        in_window = np.asarray(mask, dtype=bool)
+        if ValueStream.horizon is not None and mask.index is ValueStream.horizon.index:
+            start, stop, size = ValueStream.horizon.window_span(mask)
+        else:
+            start, stop, size = HorizonIndex.span(in_window)
+        if not isinstance(data, pd.Series):
+            return np.full(size, data, dtype=np.float64)
+        if len(data) != len(in_window) or not (data.index is mask.index or data.index.equals(mask.index)):
+            return data.reindex(mask.index[in_window]).values
+        if stop - start == size:
+            return data.values[start:stop]
+        return data.values[in_window]
+
+    @staticmethod
+    def writable(data):
+        """ 값을 바꾸기 전에 호출합니다. 읽기 전용(메모리 매핑된) 입력일 때만 복사본을 반환하고, 그 외에는 DATA를 그대로 반환합니다."""
+        values = getattr(data, 'values', None)
+        if isinstance(values, np.ndarray) and not values.flags.writeable:
+            return data.copy()
+        return data
+
+    def prepare_input(self, data):
+        """ 성장/삭제 이후의 입력 시계열을 공유 인덱스 위에 놓고, compact 저장 모드이면 float32로 변환합니다."""
+        return self.compact_data(self.align_to_horizon(data))
+
+    @staticmethod
+    def check_compact_precision(compact_proforma, full_proforma, rtol=1e-4):
+        """ compact 저장 모드로 실행한 proforma를 전체 정밀도로 실행한 proforma와 비교합니다.
+
+        Args:
+            compact_proforma (DataFrame): compact 저장 모드 실행의 proforma
+            full_proforma (DataFrame): 전체 정밀도 실행의 proforma
+            rtol (float): 허용되는 최대 상대 오차
+
+        Returns: tuple (모든 값이 허용 오차 이내인지 여부, 열별 최대 상대 오차 Series)
+
+        """
+        full = full_proforma.astype(np.float64)
+        compact = compact_proforma.reindex_like(full).astype(np.float64)
+        scale = full.abs().where(full.abs() > 0, 1)
+        relative_error = ((compact - full).abs() / scale).max()
+        return bool((relative_error <= rtol).all()), relative_error
+
+    @staticmethod
+    def report_index(index):
+        """ 시계열 보고서를 만들 때 사용할 인덱스. 공유 인덱스가 있으면 그것을, 없으면 INDEX를 반환합니다."""
+        if ValueStream.horizon is None:
+            return index
+        return ValueStream.horizon.index
+
+    @staticmethod
+    def year_mask(index, year):
+        """ INDEX에서 YEAR에 해당하는 타임스텝에 대해 true인 불리언 배열. INDEX가 공유 인덱스이면 캐시된 값을 사용합니다."""
+        if ValueStream.horizon is not None and index is ValueStream.horizon.index:
+            return ValueStream.horizon.year_mask(year)
+        return index.year == year
+
+    def input_columns(self):
+        """ 이 Value Stream이 시계열 입력 데이터에서 읽는 열의 목록 (column manifest)입니다.
+        입력 리더는 모든 Value Stream의 목록의 합집합만 읽습니다.
+
+        Returns: 열 이름을 키로, dtype을 값으로 가지는 딕셔너리. 기본값은 {}를 반환합니다.
+
+        """
+        return {}
+
     def update_price_signals(self, monthly_data, time_series_data):
         """ 새 가격 신호로 가격 신호와 관련된 속성을 업데이트합니다. 이 서비스에 필요한 가격 신호만 업데이트하며 모든 가격 신호를 필요로하지 않습니다.
 
@@ -276,18 +1017,64 @@ class ValueStream:
         return False
 
     def rte_list(self, poi):
-       """ 값 스트림은 때로는 계산에 rte가 필요합니다.
-    모든 활성 ess에서 rte 값 목록을 가져옵니다.
-    기본값은 [1]로 설정되어 있어 rte로의 나눗셈이 유효합니다.
+        """ 값 스트림은 때로는 계산에 rte가 필요합니다.
+        모든 활성 ess에서 rte 값 목록을 가져옵니다.
+        기본값은 [1]로 설정되어 있어 rte로의 나눗셈이 유효합니다.
 
-    Args:
-        poi: PointOfInterconnection 객체
+        Args:
+            poi: PointOfInterconnection 객체
 
-    Returns:
-        list: rte 값 목록
-    """
-        rte_list = [der.rte for der in poi.der_list if der.technology_type == 'Energy Storage System']
+        Returns:
+            list: rte 값 목록
+        """
+        ess_list = [der for der in poi.der_list if der.technology_type == 'Energy Storage System']
+        rte_list = [der.rte for der in ess_list]
         if len(rte_list) == 0:
             rte_list = [1]
         # 값 스트림에 속성을 설정합니다
         self.rte_list = rte_list
+        if ess_list:
+            # 스루풋은 ESS의 정격 방전 전력에 비례하여 나누어진다고 가정
+            self.set_fleet(np.array(rte_list, dtype=np.float64),
+                           np.array([getattr(der, 'dis_max_rated', 1) for der in ess_list], dtype=np.float64),
+                           [getattr(der, 'name', f'ESS {i}') for i, der in enumerate(ess_list)])
+
+    def set_fleet(self, rtes, shares=None, names=None):
+        """ ESS fleet의 rte와 스루풋 분담률을 설정합니다.
+
+        Args:
+            rtes (array): ESS별 왕복 효율
+            shares (array): ESS별 스루풋 가중치 (합이 1이 되도록 정규화, None이면 균등 분담)
+            names (list): ESS 이름
+
+        """
+        self.rte_array = np.asarray(rtes, dtype=np.float64)
+        shares = np.ones(len(self.rte_array)) if shares is None else np.asarray(shares, dtype=np.float64)
+        total = shares.sum()
+        self.throughput_shares = shares / total if total > 0 else np.full(len(shares), 1 / len(shares))
+        self.ess_names = list(names) if names is not None else [f'ESS {i}' for i in range(len(self.rte_array))]
+
+    def fleet_energy_cost(self, index, charging, discharging, price, opt_years):
+        """ 모든 ESS와 모든 연도의 에너지 정산 비용을 행렬 연산 한 번으로 계산합니다. 충전 스루풋은 ESS의 rte로
+        나누어 (계통에서 가져온 에너지로) 정산합니다. 연도별 합을 먼저 구한 뒤 ESS별 계수와의 외적을 취하므로,
+        메모리는 타임스텝 x ESS가 아니라 연도 x ESS에 비례합니다.
+
+        Args:
+            index (DatetimeIndex): 타임스텝
+            charging (array): 타임스텝별 충전 방향 에너지 스루풋 (kWh)
+            discharging (array): 타임스텝별 방전 방향 에너지 스루풋 (kWh)
+            price (array, float): 타임스텝별 에너지 정산 가격 ($/kWh)
+            opt_years (list): 최적화 문제가 실행된 연도 목록
+
+        Returns: 연도를 인덱스로, ESS 이름을 열로 가지는 DataFrame ($)
+
+        """
+        price = np.broadcast_to(np.asarray(price, dtype=np.float64), len(index))
+        years = np.sort(np.asarray(opt_years))
+        position = np.searchsorted(years, index.year)
+        in_years = (position < len(years)) & (years[np.minimum(position, len(years) - 1)] == index.year)
+        charging_cost = np.bincount(position[in_years], weights=(charging * price)[in_years], minlength=len(years))
+        discharging_cost = np.bincount(position[in_years], weights=(discharging * price)[in_years], minlength=len(years))
+        cost = np.outer(charging_cost, self.throughput_shares / self.rte_array) \
+            + np.outer(discharging_cost, self.throughput_shares)
+        return pd.DataFrame(cost, index=pd.Index(years, name='Year'), columns=self.ess_names)
@@ -34,12 +34,14 @@ This Python class contains methods and attributes specific for service analysis
 THIS CLASS HAS NOT BEEN VALIDATED OR TESTED TO SEE IF IT WOULD SOLVE.
 """
 
-from storagevet.ValueStreams.ValueStream import ValueStream
-import math
+from storagevet.ValueStreams.ValueStream import ValueStream, stream_context
+import numpy as np
+import cvxpy as cvx
 import pandas as pd
 import logging
 from storagevet.SystemRequirement import Requirement
 import storagevet.Library as Lib
+from storagevet.ErrorHandling import *
 
 
 class VoltVar(ValueStream):
@@ -61,6 +63,14 @@ class VoltVar(ValueStream):
         self.price = params['price']
 
         self.vars_reservation = 0
+        # 타임스텝 격자로 확장된 vars_percent와 그 인덱스 (timestep_vars_percent에서 인덱스마다 한 번 계산)
+        self.vars_percent_ts = None
+        self.vars_percent_index = None
+        # 타임스텝별 충전/방전 여유 용량 (kW)
+        self.ch_max = None
+        self.dis_max = None
+        # 인버터 용량이 크기 결정 변수인 경우: (타임스텝별 여유 용량 비율, 인버터 용량 표현식, PV 발전량) - constraints에서 사용
+        self.sized_headroom = None
 
     def grow_drop_data(self, years, frequency, load_growth):
         """  데이터를 성장시키거나 추가로 들어온 데이터를 제거합니다. 최적화를 실행하기 전에 add_growth_data 메서드를 호출한 후에 이 메서드들이 호출되어야 합니다.
@@ -75,45 +85,172 @@ class VoltVar(ValueStream):
         self.vars_percent = Lib.fill_extra_data(self.vars_percent, years, 0, 'M')
         # 추가로 들어온 데이터를 제거합니다.
         self.vars_percent = Lib.drop_extra_data(self.vars_percent, years)
+        # 월간 값이 바뀌었으므로 타임스텝 격자 값을 다시 계산
+        self.vars_percent_ts = None
+        self.vars_percent_index = None
 
+    @stream_context
     def calculate_system_requirements(self, der_lst):
         """ 다른 Value Stream이 활성화되어 있더라도 충족해야 할 시스템 요구 사항을 계산합니다. 그러나 이러한 요구 사항은 분석에 활성화된 기술에 따라 달라집니다.
+        무효 전력 예약 후 남는 유효 전력 여유 용량을 타임스텝별로 계산하고, 여유 용량이 ESS 정격보다 작은 (즉, 제약이 걸리는)
+        타임스텝에서만 Requirement를 만듭니다.
 
         Args:
             der_lst (list): 시나리오에서 초기화된 DER(분산 에너지 자원) 목록
 
         """
-        # PV가 포함되어 있고 'dc'로 연결되어 있는지 확인합니다. TODO: 이 부분을 수정하여 서비스가 작동하도록 합니다.
-        pv_max = 0
-        inv_max = 0
-        # if 'PV' in der_dict.keys:
-        #     if der_dict['PV'].loc == 'dc':
-        #         # use inv_max of the inverter shared by pv and ess and save pv generation
-        #         inv_max = der_dict['PV'].inv_max
-        #         pv_max = der_dict['PV'].generation
-        # else:
-        #     # otherwise just use the storage's rated discharge
-        #     inv_max = der_dict['Storage'].dis_max_rated
-
-        # # save load
-        # self.load = load_data['load']
-
-        self.vars_reservation = self.vars_percent * inv_max
-
-        # constrain power s.t. enough vars are being outted as well
-        power_sqrd = (inv_max**2) - (self.vars_reservation**2)
-
-        dis_max = math.sqrt(power_sqrd) - pv_max
-        ch_max = math.sqrt(power_sqrd)
-
-        dis_min = 0
-        ch_min = 0
-
-        self.system_requirements = {
-            'ch_max': ch_max,
-            'dis_min': dis_min,
-            'ch_min': ch_min,
-            'dis_max': dis_max}
+        index = self.requirement_index(der_lst)
+        if index is None:
+            TellUser.warning(f'{self.name}: no time series index to compute the reactive power headroom on')
+            return
+        inv_max, pv_max, ess_ch_max, ess_dis_max = self.inverter_ratings(der_lst, index)
+        vars_percent = self.timestep_vars_percent(index)
+        self.system_requirements = []
+        self.sized_headroom = None
+
+        if isinstance(inv_max, cvx.Expression):
+            # 인버터(또는 ESS) 크기를 결정하는 중: 여유 용량이 인버터 용량에 비례하므로 (sqrt(1 - vars_percent^2) * inv_max),
+            # 비율만 계산해 두고 constraints에서 CVXPY 제약 조건으로 만듭니다.
+            self.sized_headroom = (pd.Series(self.headroom_ratio(vars_percent), index=index), inv_max,
+                                   pd.Series(pv_max, index=index))
+            return
+
+        self.vars_reservation = pd.Series(vars_percent * inv_max, index=index, name='VoltVar Reservation (kVAR)')
+        ch_max, dis_max = self.headroom(inv_max, pv_max, vars_percent)
+        self.ch_max = pd.Series(ch_max, index=index, name='VoltVar Charge Max (kW)')
+        self.dis_max = pd.Series(dis_max, index=index, name='VoltVar Discharge Max (kW)')
+
+        # dis_min과 ch_min은 0이므로 요구 사항이 없습니다.
+        for constraint_type, headroom, rating in (('der dispatch charge', self.ch_max, ess_ch_max),
+                                                  ('der dispatch discharge', self.dis_max, ess_dis_max)):
+            binding = self.binding(headroom.values, rating)
+            if binding.any():
+                self.system_requirements.append(Requirement(constraint_type, 'max', self.name, headroom[binding]))
+
+    @staticmethod
+    def headroom(inv_max, pv_max, vars_percent):
+        """ 인버터 용량 중 무효 전력 예약 후 남는 유효 전력 (벡터화)
+
+        Args:
+            inv_max (float): 고정된 인버터 용량 (kVA). 크기 결정 변수인 경우는 constraints를 참고
+            pv_max (float, array): 인버터를 공유하는 (dc 연결) PV의 타임스텝별 발전량 (kW)
+            vars_percent (array): 타임스텝별 무효 전력 예약 비율 (인버터 용량의 비율)
+
+        Returns: 타임스텝별 (ch_max, dis_max) 배열 (kW). dis_max는 PV 발전량이 여유 용량을 넘는 경우 0입니다.
+
+        """
+        power = VoltVar.headroom_ratio(vars_percent) * inv_max
+        ch_max = np.broadcast_to(power, np.shape(vars_percent)).astype(np.float64)
+        dis_max = np.maximum(power - pv_max, 0)
+        return ch_max, np.broadcast_to(dis_max, np.shape(vars_percent)).astype(np.float64)
+
+    @staticmethod
+    def headroom_ratio(vars_percent):
+        """ 무효 전력 예약 후 남는 유효 전력의 인버터 용량에 대한 비율: sqrt(1 - vars_percent^2)"""
+        return np.sqrt(np.maximum(1 - np.square(vars_percent), 0))
+
+    @stream_context
+    def constraints(self, mask, load_sum, tot_variable_gen, generator_out_sum, net_ess_power, combined_rating):
+        """ 인버터 용량이 크기 결정 변수인 경우, 여유 용량 제약 조건을 CVXPY 제약 조건으로 만듭니다. ESS의 순 전력(충전 - 방전)을
+        -dis_max 이상, ch_max 이하로 제한합니다. 고정된 용량의 경우에는 Requirement로 제약하므로 빈 목록을 반환합니다.
+
+        Args:
+            mask (DataFrame): subs 데이터 세트에 포함된 time_series 데이터에 해당하는 인덱스에 대해 true인 부울 배열
+            load_sum (list, Expression): 시스템 내의 부하 합계
+            tot_variable_gen (Expression): variable/intermittent generation sources의 합
+            generator_out_sum (list, Expression): 시스템 내에서의 발전 합계
+            net_ess_power (list, Expression): 시스템 내의 모든 ESS의 순 전력의 합계 [= 충전 - 방전]
+            combined_rating (Dictionary): 각 DER 클래스 유형의 결합 등급
+
+        Returns: CVXPY 제약 조건 목록
+
+        """
+        if self.sized_headroom is None:
+            return []
+        ratio, inv_max, pv_max = self.sized_headroom
+        size = int(sum(mask))
+        ch_max = inv_max * self.window_values(ratio, mask)
+        # PV 발전량이 여유 용량을 넘는 경우의 0 하한은 볼록하지 않으므로 크기 결정 중에는 적용하지 않습니다.
+        dis_max = ch_max - self.window_values(pv_max, mask)
+        return [self.relaxed_non_pos('Charge Max', net_ess_power - ch_max, size),
+                self.relaxed_non_pos('Discharge Max', -net_ess_power - dis_max, size)]
+
+    @staticmethod
+    def binding(headroom, rating):
+        """ 여유 용량이 ESS 정격보다 작은 타임스텝. 정격이 크기 결정 변수(cvxpy)이면 모든 타임스텝입니다."""
+        if isinstance(rating, cvx.Expression):
+            return np.ones(len(headroom), dtype=bool)
+        return headroom < rating
+
+    def requirement_index(self, der_lst):
+        """ 요구 사항을 만들 시계열 인덱스: 공유 인덱스가 있으면 그것을, 없으면 PV 발전량의 인덱스를 사용합니다."""
+        if ValueStream.horizon is not None:
+            return ValueStream.horizon.index
+        for der in der_lst:
+            if getattr(der, 'tag', None) == 'PV':
+                return der.maximum_generation().index
+        return None
+
+    @staticmethod
+    def inverter_ratings(der_lst, index):
+        """ DER 목록에서 인버터 용량, 인버터를 공유하는 PV의 발전량, ESS의 정격을 가져옵니다.
+        dc로 연결된 PV가 있으면 PV와 ESS가 공유하는 인버터의 용량(inv_max)을 사용하고 PV 발전량을 뺍니다.
+        그렇지 않으면 ESS의 정격 방전 전력을 인버터 용량으로 사용합니다.
+
+        Args:
+            der_lst (list): 시나리오에서 초기화된 DER 목록
+            index (DatetimeIndex): 요구 사항의 시계열 인덱스
+
+        Returns: (inv_max, pv_max 배열, ESS 정격 충전 전력 합계, ESS 정격 방전 전력 합계)
+
+        """
+        ess = [der for der in der_lst if getattr(der, 'technology_type', None) == 'Energy Storage System']
+        ess_ch_max = sum(der.ch_max_rated for der in ess)
+        ess_dis_max = sum(der.dis_max_rated for der in ess)
+        dc_pv = [der for der in der_lst if getattr(der, 'tag', None) == 'PV' and getattr(der, 'loc', 'ac') == 'dc']
+        if dc_pv:
+            inv_max = sum(der.inv_max for der in dc_pv)
+            pv_max = sum(np.asarray(der.maximum_generation().reindex(index).fillna(0), dtype=np.float64)
+                         for der in dc_pv)
+        else:
+            inv_max = ess_dis_max
+            pv_max = np.zeros(len(index))
+        return inv_max, pv_max, ess_ch_max, ess_dis_max
+
+    def timestep_vars_percent(self, index):
+        """ 월간 vars_percent를 타임스텝 격자로 한 번 확장합니다. 결과는 INDEX와 함께 저장되며,
+        같은 인덱스 (같은 객체이거나 같은 타임스텝)일 때만 다시 사용합니다.
+
+        Args:
+            index (DatetimeIndex): 시계열 인덱스
+
+        Returns: 타임스텝별 vars_percent 배열 (값이 없는 달은 0)
+
+        """
+        if self.vars_percent_index is not None and \
+                (index is self.vars_percent_index or index.equals(self.vars_percent_index)):
+            return self.vars_percent_ts
+        self.vars_percent_index = index
+        monthly = self.vars_percent
+        if not isinstance(monthly, pd.Series):
+            # 모든 달에 같은 비율
+            self.vars_percent_ts = np.full(len(index), float(monthly))
+            return self.vars_percent_ts
+        if isinstance(monthly.index, pd.MultiIndex):
+            keys = (np.asarray(monthly.index.get_level_values(0), dtype=np.int64) * 12 +
+                    np.asarray(monthly.index.get_level_values(1), dtype=np.int64))
+            timestep_keys = np.asarray(index.year, dtype=np.int64) * 12 + np.asarray(index.month, dtype=np.int64)
+        elif hasattr(monthly.index, 'month'):
+            keys = np.asarray(monthly.index.year, dtype=np.int64) * 12 + np.asarray(monthly.index.month, dtype=np.int64)
+            timestep_keys = np.asarray(index.year, dtype=np.int64) * 12 + np.asarray(index.month, dtype=np.int64)
+        else:
+            # 월 번호(1-12)로만 인덱싱된 경우
+            keys = np.asarray(monthly.index, dtype=np.int64)
+            timestep_keys = np.asarray(index.month, dtype=np.int64)
+        positions = pd.Index(keys).get_indexer(timestep_keys)
+        values = np.append(np.asarray(monthly.values, dtype=np.float64), 0)
+        self.vars_percent_ts = values[positions]
+        return self.vars_percent_ts
 
     def proforma_report(self, opt_years, apply_inflation_rate_func, fill_forward_func, results):
         """ Value Stream에 해당하는 proforma를 계산합니다.
@@ -0,0 +1,186 @@
+"""
+Copyright (c) 2023, Electric Power Research Institute
+
+ All rights reserved.
+
+ Redistribution and use in source and binary forms, with or without modification,
+ are permitted provided that the following conditions are met:
+
+     * Redistributions of source code must retain the above copyright notice,
+       this list of conditions and the following disclaimer.
+     * Redistributions in binary form must reproduce the above copyright notice,
+       this list of conditions and the following disclaimer in the documentation
+       and/or other materials provided with the distribution.
+     * Neither the name of DER-VET nor the names of its contributors
+       may be used to endorse or promote products derived from this software
+       without specific prior written permission.
+
+ THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+ "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+ LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+ A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT OWNER OR
+ CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL,
+ EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO,
+ PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR
+ PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF
+ LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING
+ NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+"""
+"""
+WindowScheduler.py
+
+This Python class chooses the length of the optimization windows from the measured cost of the
+first windows of a run, instead of using a fixed window (a month, a year) whatever dt and the set
+of active value streams are.
+"""
+import numpy as np
+import pandas as pd
+from scipy.optimize import nnls
+from storagevet.ErrorHandling import *
+
+# exponents tried when the cost of a window is fitted to overhead + scale * length ** exponent
+EXPONENTS = np.linspace(0.5, 3, 251)
+
+
+class WindowScheduler:
+    """ Measures the build and solve time of the first (probe) windows, fits how the cost of one
+    window grows with its length, and picks the window length that minimizes the total wall time
+    of the run while keeping one window's memory under a ceiling.
+
+    The cost of one window is modelled as overhead + scale * length ** exponent. The fixed overhead
+    (building the problem, starting the solver) favours few long windows, a superlinear exponent
+    favours many short ones, so the best length is usually somewhere in between.
+
+    Window lengths are counted in timesteps. Every candidate length is a multiple of the SOE
+    coupling length (the number of timesteps the state of energy is coupled over, ex. one day
+    if the SOE has to return to its target every day), so a window never cuts a coupled period.
+
+    """
+
+    def __init__(self, horizon_length, dt, coupling_length=None, max_length=None, memory_ceiling=None,
+                 probes=3):
+        """
+        Args:
+            horizon_length (int): number of timesteps in the whole analysis horizon
+            dt (float): length of one timestep in hours
+            coupling_length (int): the SOE coupling length in timesteps (one day if None)
+            max_length (int): the longest window allowed in timesteps (ex. one year, so growth
+                is applied between windows); the whole horizon if None
+            memory_ceiling (int): bytes one window may use (no limit if None)
+            probes (int): number of windows to measure before a plan is made
+        """
+        self.horizon_length = horizon_length
+        self.dt = dt
+        self.coupling_length = coupling_length or int(round(24 / dt))
+        self.max_length = min(max_length or horizon_length, horizon_length)
+        self.memory_ceiling = memory_ceiling
+        self.probes = probes
+        self.measurements = []
+
+    def probe_lengths(self):
+        """ Returns: the lengths the first windows should be given, so that the cost is measured at
+            more than one size (1, 2, 4, ... coupling lengths, not longer than MAX_LENGTH)
+
+        """
+        lengths = self.coupling_length * 2 ** np.arange(self.probes)
+        return [int(length) for length in np.minimum(lengths, self.max_length)]
+
+    def record(self, window_length, build_seconds, solve_seconds, peak_memory=None):
+        """ Records the measured cost of one window.
+
+        Args:
+            window_length (int): number of timesteps in the window
+            build_seconds (float): time spent building the problem (constraints and objective)
+            solve_seconds (float): time spent in the solver
+            peak_memory (int): bytes used while building and solving the window (if measured)
+
+        """
+        self.measurements.append({'length': window_length, 'build': build_seconds, 'solve': solve_seconds,
+                                  'memory': peak_memory})
+        TellUser.event('window cost', None, len(self.measurements) - 1, length=int(window_length),
+                       build=float(build_seconds), solve=float(solve_seconds),
+                       memory=None if peak_memory is None else int(peak_memory))
+
+    def ready(self):
+        return len(self.measurements) >= self.probes
+
+    def fit(self):
+        """ Fits seconds = overhead + scale * length ** exponent to the measured windows. For each
+        exponent in EXPONENTS, the non-negative overhead and scale are a least squares fit of the
+        relative error; the exponent with the smallest error is kept. Three parameters need three
+        measured lengths: with two the cost is assumed to be linear (overhead + scale * length),
+        with one it is assumed to be proportional to the length.
+
+        Returns: overhead, scale, exponent, bytes of memory per timestep (None if memory was not
+            measured)
+
+        """
+        measured = pd.DataFrame(self.measurements)
+        lengths = measured['length'].to_numpy(dtype=float)
+        seconds = (measured['build'] + measured['solve']).to_numpy(dtype=float)
+        seconds = np.maximum(seconds, 1e-6)
+        distinct = len(np.unique(lengths))
+        if distinct == 1:
+            overhead, scale, exponent = 0.0, seconds.mean() / lengths.mean(), 1.0
+        else:
+            best = None
+            for exponent in (EXPONENTS if distinct > 2 else [1.0]):
+                # dividing each row by the measured seconds weighs short and long windows equally
+                terms = np.column_stack([np.ones_like(lengths), lengths ** exponent]) / seconds[:, None]
+                (overhead, scale), error = nnls(terms, np.ones_like(seconds))
+                if best is None or error < best[0] - 1e-12:
+                    best = (error, overhead, scale, exponent)
+            _, overhead, scale, exponent = best
+        memory = measured['memory'].dropna()
+        memory_per_step = None
+        if len(memory):
+            memory_per_step = (memory.to_numpy(dtype=float) / lengths[memory.index]).max()
+        return overhead, scale, exponent, memory_per_step
+
+    def candidates(self):
+        """ Returns: a DataFrame with the estimated total time and window memory of every allowed
+            window length, indexed by the length in timesteps
+
+        """
+        overhead, scale, exponent, memory_per_step = self.fit()
+        lengths = np.arange(self.coupling_length, self.max_length + 1, self.coupling_length)
+        if not len(lengths):
+            lengths = np.array([self.max_length])
+        windows = np.ceil(self.horizon_length / lengths)
+        # the last window is only as long as what is left of the horizon
+        last = self.horizon_length - (windows - 1) * lengths
+        total_seconds = windows * overhead + (windows - 1) * scale * lengths ** exponent + scale * last ** exponent
+        memory = lengths * memory_per_step if memory_per_step is not None else np.full(len(lengths), np.nan)
+        return pd.DataFrame({'Hours': lengths * self.dt, 'Windows': windows.astype(int),
+                             'Estimated Seconds': total_seconds, 'Estimated Memory (bytes)': memory},
+                            index=pd.Index(lengths, name='Window Length (timesteps)'))
+
+    def plan(self):
+        """ Picks the window length for the rest of the run and reports it.
+
+        Returns: a dictionary with the chosen 'window length' (timesteps), 'hours', 'windows',
+            'estimated seconds' and 'estimated memory'
+
+        """
+        if not self.measurements:
+            raise ParameterError('WindowScheduler.plan needs the cost of at least one measured window.')
+        candidates = self.candidates()
+        allowed = candidates
+        if self.memory_ceiling is not None:
+            if candidates['Estimated Memory (bytes)'].isna().all():
+                TellUser.warning('No window memory was measured, so the window memory ceiling is ignored.')
+            else:
+                allowed = candidates.loc[candidates['Estimated Memory (bytes)'] <= self.memory_ceiling]
+                if allowed.empty:
+                    TellUser.warning('Even the shortest window is estimated to exceed the memory ceiling.')
+                    allowed = candidates.iloc[:1]
+        length = allowed['Estimated Seconds'].idxmin()
+        chosen = allowed.loc[length]
+        plan = {'window length': int(length), 'hours': float(chosen['Hours']), 'windows': int(chosen['Windows']),
+                'estimated seconds': float(chosen['Estimated Seconds']),
+                'estimated memory': chosen['Estimated Memory (bytes)']}
+        TellUser.info(f"Window plan: {plan['windows']} windows of {plan['hours']:g} hours "
+                      f"({plan['window length']} timesteps), estimated {plan['estimated seconds']:.1f} s")
+        TellUser.event('window plan', None, None, **{key.replace(' ', '_'): value for key, value in plan.items()})
+        return plan
@@ -0,0 +1,23 @@
+"""
+Shared fixtures of the value stream tests. Every test starts with a fresh logger and with the
+class level modes of ValueStream (portfolio horizon, triage, compact storage, memory budget) off.
+"""
+import logging
+import pytest
+from storagevet.ErrorHandling import TellUser
+from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.SpillStore import VariableStore
+
+
+@pytest.fixture(autouse=True)
+def reset_value_stream_modes():
+    TellUser.logger = logging.getLogger('Error')
+    yield
+    ValueStream.horizon = None
+    ValueStream.slack_penalty = None
+    ValueStream.compact = False
+    VariableStore.memory_budget = None
+    VariableStore.spill_path = None
+    VariableStore.memory_used = 0
+    VariableStore.in_memory = []
+    TellUser.context = {'scenario': '-', 'stream': '-'}
@@ -0,0 +1,103 @@
+"""
+Checkpoint and resume of a windowed run that is interrupted.
+"""
+import pickle
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pytest
+from storagevet.ErrorHandling import ParameterError
+from storagevet.ValueStreams.MarketServiceUp import MarketServiceUp
+from storagevet.ValueStreams.ResourceAdequacy import ResourceAdequacy
+from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.Checkpoint import Checkpoint
+
+INDEX = pd.date_range('2017-01-01', periods=24 * 70, freq='h')
+PARAMS = {'price': pd.Series(np.random.default_rng(3).random(len(INDEX)), index=INDEX),
+          'growth': 0, 'duration': 1, 'dt': 1}
+WINDOWS = [INDEX[start:start + 24 * 7] for start in range(0, len(INDEX), 24 * 7)]
+RNG = np.random.default_rng(4)
+VALUES = [(RNG.random(len(window)), RNG.random(len(window)), RNG.random(len(window))) for window in WINDOWS]
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+def run(value_streams, checkpoint, start=0, crash=None):
+    for position in range(start, len(WINDOWS)):
+        if position == crash:
+            return
+        market = value_streams['SR']
+        ch_less, dis_more, dual = VALUES[position]
+        market.variables = {'ch_less': Solved(ch_less), 'dis_more': Solved(dis_more)}
+        market.save_variable_results(WINDOWS[position])
+        market.save_duals(pd.DataFrame({'Max': dual}, index=WINDOWS[position]))
+        if checkpoint.due(position + 1):
+            checkpoint.save(value_streams, position)
+
+
+class Battery:
+    def qualifying_capacity(self, length):
+        return 25
+
+
+def market():
+    return {'SR': MarketServiceUp('SR', 'Spinning Reserve', PARAMS)}
+
+
+def test_resume_after_a_crash_gives_the_uninterrupted_results(tmp_path):
+    checkpoint = Checkpoint(tmp_path / 'run.ckpt', every=3)
+    full = market()
+    run(full, Checkpoint(tmp_path / 'unused.ckpt', every=0))
+    run(market(), checkpoint, crash=8)
+    resumed = market()
+    start = checkpoint.resume(resumed)
+    assert start == 6 and resumed['SR'].restored
+    run(resumed, checkpoint, start)
+    pd.testing.assert_frame_equal(full['SR'].variables_df, resumed['SR'].variables_df)
+    pd.testing.assert_frame_equal(full['SR'].shadow_price_report(), resumed['SR'].shadow_price_report())
+
+
+def test_memory_budget_checkpoint_saves_references_to_spilled_chunks(tmp_path):
+    full = market()
+    run(full, Checkpoint(tmp_path / 'unused.ckpt', every=0))
+    ValueStream.enable_memory_budget(5000, tmp_path / 'spill')
+    checkpoint = Checkpoint(tmp_path / 'run.ckpt', every=3)
+    run(market(), checkpoint, crash=8)
+    with open(checkpoint.path, 'rb') as file:
+        chunks = pickle.load(file)['value streams']['SR']['variable_chunks']
+    # spilled windows are saved as paths; only the in-memory tail is pickled
+    assert any(isinstance(chunk, Path) for chunk in chunks)
+    assert sum(isinstance(chunk, pd.DataFrame) for chunk in chunks) < len(chunks)
+    # a new process: same spill directory, empty memory accounting
+    ValueStream.enable_memory_budget(5000, tmp_path / 'spill')
+    resumed = market()
+    run(resumed, checkpoint, checkpoint.resume(resumed))
+    resumed['SR'].materialize_variables()
+    pd.testing.assert_frame_equal(full['SR'].variables_df, resumed['SR'].variables_df, check_freq=False)
+    pd.testing.assert_frame_equal(full['SR'].shadow_price_report(), resumed['SR'].shadow_price_report())
+
+
+def test_restored_requirements_are_not_computed_again(tmp_path):
+    load = pd.Series(np.random.default_rng(5).random(len(INDEX)) * 100, index=INDEX, name='System Load (kW)')
+
+    def resource_adequacy():
+        return ResourceAdequacy({'days': 2, 'length': 3, 'idmode': 'Peak by Month', 'dispmode': True,
+                                 'value': pd.Series(5.0, index=pd.period_range('2017-01', periods=3, freq='M')),
+                                 'system_load': load, 'growth': 0, 'dt': 1})
+    ra = resource_adequacy()
+    ra.calculate_system_requirements([Battery()])
+    checkpoint = Checkpoint(tmp_path / 'run.ckpt', every=1)
+    checkpoint.save({'RA': ra}, 4)
+
+    resumed = resource_adequacy()
+    assert checkpoint.resume({'RA': resumed}) == 5
+    resumed.find_system_load_peaks = None  # the peaks are not searched for again
+    resumed.calculate_system_requirements([Battery()])
+    assert resumed.event_intervals.equals(ra.event_intervals) and resumed.qc == 25
+    pd.testing.assert_series_equal(resumed.requirement_constraint(), ra.requirement_constraint())
+    with pytest.raises(ParameterError):
+        checkpoint.resume({'SR': resumed})
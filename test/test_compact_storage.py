@@ -0,0 +1,61 @@
+"""
+Compact storage: inputs, variable results and reports are float32 while the proforma stays float64.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.ValueStream import ValueStream
+
+INDEX = pd.date_range('2017-01-01', periods=24 * 30, freq='h')
+RNG = np.random.default_rng(3)
+PRICE = pd.Series(RNG.random(len(INDEX)) * 40, index=INDEX)
+CH_LESS = RNG.random(len(INDEX)) * 100
+DIS_MORE = RNG.random(len(INDEX)) * 100
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+def keep(frame, *args):
+    return frame
+
+
+def run():
+    sr = SpinningReserve({'price': PRICE, 'growth': 0, 'duration': 1, 'dt': 1})
+    sr.dt = 1
+    sr.grow_drop_data([2017], 'h', 0)
+    sr.variables = {'ch_less': Solved(CH_LESS), 'dis_more': Solved(DIS_MORE)}
+    sr.save_variable_results(INDEX)
+    report = sr.timeseries_report()
+    return sr, report, sr.proforma_report([2017], keep, keep, report)
+
+
+def test_compact_run_stores_float32_and_keeps_the_proforma_precise():
+    full, full_report, full_proforma = run()
+    assert full.price.dtype == np.float64
+
+    ValueStream.enable_compact_storage()
+    compact, compact_report, compact_proforma = run()
+    assert compact.price.dtype == np.float32
+    assert (compact.variables_df.dtypes == np.float32).all()
+    assert (compact_report.dtypes == np.float32).all()
+    assert (compact_proforma.dtypes == np.float64).all()
+    np.testing.assert_allclose(compact_report.values, full_report.values, rtol=1e-6)
+
+    within, error = ValueStream.check_compact_precision(compact_proforma, full_proforma)
+    assert within and (error <= 1e-4).all()
+    within, _ = ValueStream.check_compact_precision(compact_proforma * 1.01, full_proforma)
+    assert not within
+
+
+def test_compact_data_only_converts_in_compact_mode():
+    frame = pd.DataFrame({'kW': [1.0, 2.0], 'flag': [True, False], 'count': [1, 2]})
+    assert ValueStream.compact_data(frame) is frame
+    ValueStream.enable_compact_storage()
+    compact = ValueStream.compact_data(frame)
+    assert compact.dtypes.tolist() == [np.float32, bool, np.int64]
+    ValueStream.enable_compact_storage(False)
+    assert ValueStream.compact_data(frame) is frame
@@ -0,0 +1,55 @@
+"""
+Market services compute their energy throughput columns only when they are first used.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+
+INDEX = pd.date_range('2017-01-01', periods=48, freq='h')
+RNG = np.random.default_rng(5)
+EOD = pd.Series(RNG.random(48), index=INDEX)
+EOU = pd.Series(RNG.random(48), index=INDEX)
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+def load_following():
+    lf = LoadFollowing({'CombinedMarket': True, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+                        'eod': EOD, 'eou': EOU, 'regd_price': pd.Series(1.0, index=INDEX),
+                        'regu_price': pd.Series(2.0, index=INDEX), 'energy_price': pd.Series(0.1, index=INDEX),
+                        'dt': 1, 'u_ts_constraints': False, 'd_ts_constraints': False})
+    lf.dt = 1
+    return lf
+
+
+def save(lf, index, value):
+    lf.variables = {name: Solved(np.full(len(index), value)) for name in ['up_ch', 'up_dis', 'down_ch', 'down_dis']}
+    lf.save_variable_results(index)
+
+
+def test_throughput_is_computed_on_first_use_and_recomputed_after_new_results():
+    lf = load_following()
+    save(lf, INDEX[:24], 1.0)
+    assert lf.derived_cache == {}
+    total = 'LF Energy Throughput (kWh)'
+    first = lf.derived(total)
+    np.testing.assert_allclose(first, EOD[:24] * 2 - EOU[:24] * 2)
+    assert lf.derived(total) is first
+    assert len(lf.derived_cache) == 5
+
+    save(lf, INDEX[24:], 2.0)
+    assert lf.derived_cache == {}
+    np.testing.assert_allclose(lf.derived(total), np.r_[first, (EOD[24:] * 4 - EOU[24:] * 4).values])
+
+
+def test_report_columns_are_the_derived_values():
+    lf = load_following()
+    save(lf, INDEX, 1.5)
+    report = lf.timeseries_report()
+    for name in lf.derived_columns():
+        np.testing.assert_allclose(report[name].values, lf.derived(name))
+    np.testing.assert_allclose(report['LF Energy Throughput Down (Charging) (kWh)'], EOD * 1.5)
@@ -0,0 +1,41 @@
+"""
+EventIndex: the events of a window of contiguous timesteps are found by binary search.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.EventIndex import EventIndex
+
+INDEX = pd.date_range('2017-01-01', periods=100, freq='h')
+# given out of time order, as the RA event intervals may be
+EVENTS = INDEX[[40, 5, 41, 97, 6, 42]]
+
+
+def test_window_events_match_a_timestamp_intersection():
+    events = EventIndex(INDEX, EVENTS)
+    assert len(events) == 6
+    for start in range(0, 100, 7):
+        for stop in [start, start + 1, start + 24, 100]:
+            rows = events.window_events(start, stop)
+            expected = EVENTS.isin(INDEX[start:stop])
+            assert sorted(rows) == list(np.flatnonzero(expected))
+            assert list(EVENTS[rows]) == sorted(EVENTS[expected])
+            assert events.has_events(start, stop) == expected.any()
+
+
+def test_window_slice_is_over_the_sorted_positions():
+    events = EventIndex(INDEX, EVENTS)
+    assert list(events.positions) == [5, 6, 40, 41, 42, 97]
+    assert events.window_slice(6, 42) == slice(1, 4)
+    assert events.window_slice(43, 97) == slice(5, 5)
+
+
+def test_events_outside_the_index_are_left_out():
+    events = EventIndex(INDEX[:50], EVENTS)
+    assert list(events.positions) == [5, 6, 40, 41, 42]
+    assert sorted(events.window_events(0, 50)) == [0, 1, 2, 4, 5]
+
+
+def test_locate_keeps_only_exact_hits():
+    timestamps = pd.DatetimeIndex([INDEX[3], INDEX[3] + pd.Timedelta(minutes=30), INDEX[-1] + pd.Timedelta(hours=1)])
+    positions, found = EventIndex.locate(INDEX, timestamps)
+    assert list(positions) == [3] and list(found) == [True, False, False]
@@ -0,0 +1,53 @@
+"""
+Structured event log: one JSON object per line, loadable with pd.read_json(lines=True).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from storagevet.ErrorHandling import TellUser, ParameterError
+
+
+def test_events_are_json_lines(tmp_path):
+    TellUser.event('not recorded before the event log is created')
+    TellUser.create_event_log(tmp_path)
+    TellUser.set_context(scenario='a')
+    TellUser.problem_size(0, np.int64(96), 120, stream='SR')
+    TellUser.build_time(0, 0.25)
+    TellUser.solve_time(0, 1.5, solver='ECOS')
+    TellUser.solver_status(0, 'infeasible', solver='ECOS')
+    with TellUser.stream_context('NSR'):
+        TellUser.objective_contribution(1, {'SR': -3.0, 'NSR': None})
+    TellUser.close_log()
+
+    events = pd.read_json(tmp_path / 'dervet_events.jsonl', lines=True)
+    assert events['event'].tolist() == ['problem size', 'build time', 'solve time', 'solver status',
+                                        'objective contribution', 'objective contribution']
+    assert (events['scenario'] == 'a').all()
+    assert events['stream'].tolist() == ['SR', '-', '-', '-', 'SR', 'NSR']
+    assert events.loc[0, 'variables'] == 96 and events.loc[2, 'seconds'] == 1.5
+    assert events.loc[3, 'level'] == 'WARNING'
+    assert events.loc[4, 'value'] == -3 and pd.isna(events.loc[5, 'value'])
+
+
+def test_fields_cannot_overwrite_the_core_keys(tmp_path):
+    TellUser.create_event_log(tmp_path)
+    with pytest.raises(ParameterError, match='scenario'):
+        TellUser.event('solve time', scenario='other', seconds=1.0)
+    TellUser.close_log()
+
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_events_and_log_records_share_the_logger(tmp_path, asynchronous):
+    TellUser.create_log(tmp_path, False, asynchronous=asynchronous)
+    TellUser.create_event_log(tmp_path)
+    TellUser.set_context(scenario='a')
+    TellUser.info('plain record')
+    TellUser.solve_time(0, 2.0, solver='ECOS')
+    # the context may change before an asynchronous record is written
+    TellUser.set_context(scenario='b')
+    TellUser.close_log()
+
+    events = pd.read_json(tmp_path / 'dervet_events.jsonl', lines=True)
+    assert events['event'].tolist() == ['solve time'] and events.loc[0, 'scenario'] == 'a'
+    log = (tmp_path / 'dervet_log.log').read_text()
+    assert 'plain record' in log and 'solve time' not in log
@@ -0,0 +1,55 @@
+"""
+ESS fleet: energy settlement for every ESS and year, with charging divided by each ESS's rte.
+"""
+from types import SimpleNamespace
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+
+INDEX = pd.date_range('2017-12-31', periods=48, freq='h')
+RNG = np.random.default_rng(11)
+CHARGING = RNG.random(len(INDEX))
+DISCHARGING = RNG.random(len(INDEX))
+PRICE = RNG.random(len(INDEX))
+
+
+def spinning_reserve():
+    return SpinningReserve({'price': pd.Series(1.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1})
+
+
+def test_rte_list_sets_the_fleet_from_the_active_ess():
+    poi = SimpleNamespace(der_list=[
+        SimpleNamespace(technology_type='Energy Storage System', rte=0.8, dis_max_rated=300, name='Li-ion'),
+        SimpleNamespace(technology_type='Generator', rte=None),
+        SimpleNamespace(technology_type='Energy Storage System', rte=0.5, dis_max_rated=100, name='Flow')])
+    sr = spinning_reserve()
+    sr.rte_list(poi)
+    assert sr.rte_list == [0.8, 0.5]
+    np.testing.assert_allclose(sr.throughput_shares, [0.75, 0.25])
+    assert sr.ess_names == ['Li-ion', 'Flow']
+
+    no_ess = spinning_reserve()
+    no_ess.rte_list(SimpleNamespace(der_list=[]))
+    assert no_ess.rte_list == [1]
+    np.testing.assert_allclose(no_ess.rte_array, [1])
+
+
+def test_fleet_energy_cost_matches_a_loop_over_ess_and_years():
+    sr = spinning_reserve()
+    sr.set_fleet([0.8, 0.5, 0.9], [2, 1, 1], ['a', 'b', 'c'])
+    cost = sr.fleet_energy_cost(INDEX, CHARGING, DISCHARGING, PRICE, [2018, 2017])
+    assert list(cost.index) == [2017, 2018] and list(cost.columns) == ['a', 'b', 'c']
+    for year in [2017, 2018]:
+        in_year = INDEX.year == year
+        for name, rte, share in zip(['a', 'b', 'c'], [0.8, 0.5, 0.9], [0.5, 0.25, 0.25]):
+            expected = share * (np.sum(CHARGING[in_year] * PRICE[in_year]) / rte
+                                + np.sum(DISCHARGING[in_year] * PRICE[in_year]))
+            assert np.isclose(cost.loc[year, name], expected)
+
+
+def test_timesteps_outside_the_optimization_years_are_ignored():
+    sr = spinning_reserve()
+    sr.set_fleet([0.5])
+    cost = sr.fleet_energy_cost(INDEX, CHARGING, DISCHARGING, 2.0, [2018])
+    in_year = INDEX.year == 2018
+    assert np.isclose(cost.loc[2018, 'ESS 0'], 2 * (CHARGING[in_year].sum() / 0.5 + DISCHARGING[in_year].sum()))
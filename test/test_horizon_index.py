@@ -0,0 +1,62 @@
+"""
+HorizonIndex: one shared index, swapped in without copying and never silently reindexed.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from storagevet.ErrorHandling import TimeseriesDataError
+from storagevet.ValueStreams.HorizonIndex import HorizonIndex
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.ValueStream import ValueStream
+
+INDEX = pd.date_range('2017-01-01', periods=8760, freq='h')
+
+
+def test_align_swaps_in_the_shared_index_without_copying():
+    horizon = HorizonIndex(INDEX)
+    series = pd.Series(np.arange(len(INDEX), dtype=float), index=pd.DatetimeIndex(INDEX.values))
+    aligned = horizon.align(series)
+    assert aligned.index is INDEX
+    assert np.shares_memory(aligned.values, series.values)
+    assert horizon.align(aligned) is aligned
+
+
+def test_align_rejects_data_that_does_not_cover_the_horizon():
+    horizon = HorizonIndex(INDEX)
+    with pytest.raises(TimeseriesDataError, match='1 timesteps are missing'):
+        horizon.align(pd.Series(1.0, index=INDEX[1:], name='SR Price ($/kW)'))
+    with pytest.raises(TimeseriesDataError):
+        horizon.align(pd.DataFrame({'a': 1.0}, index=INDEX.shift(1)))
+
+
+def test_grow_drop_data_puts_inputs_on_the_horizon():
+    ValueStream.set_horizon(INDEX)
+    sr = SpinningReserve({'price': pd.Series(1.0, index=pd.DatetimeIndex(INDEX.values)), 'growth': 0,
+                          'duration': 1, 'dt': 1, 'ts_constraints': False})
+    sr.grow_drop_data([2017], 'h', 0)
+    assert sr.price.index is INDEX
+
+    sr = SpinningReserve({'price': pd.Series(1.0, index=INDEX[:-24]), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': False})
+    with pytest.raises(TimeseriesDataError):
+        sr.grow_drop_data([2017], 'h', 0)
+
+
+def test_year_masks_and_window_offsets():
+    horizon = HorizonIndex(pd.date_range('2017-12-31', periods=48, freq='h'))
+    assert horizon.year_mask(2018).sum() == 24
+    assert horizon.year_mask(2018) is horizon.year_mask(2018)
+    assert horizon.window_offsets(horizon.year_mask(2018)) == (24, 48)
+    assert horizon.window_offsets(np.zeros(48, dtype=bool)) == (0, 0)
+
+
+def test_the_span_of_the_last_window_is_kept():
+    horizon = ValueStream.set_horizon(pd.date_range('2017-01-01', periods=48, freq='h'))
+    mask = pd.Series(horizon.index.hour < 12, index=horizon.index)
+    price = pd.Series(np.arange(48.0), index=horizon.index)
+    np.testing.assert_array_equal(ValueStream.window_values(price, mask), np.r_[0:12, 24:36])
+    assert horizon.last_window[0] is mask and horizon.window_span(mask) == (0, 36, 24)
+    window = pd.Series(np.arange(48) >= 40, index=horizon.index)
+    np.testing.assert_array_equal(ValueStream.window_values(price, window), np.arange(40.0, 48.0))
+    assert horizon.window_offsets(window) == (40, 48)
+    assert horizon.last_window[0] is window
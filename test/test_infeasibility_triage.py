@@ -0,0 +1,73 @@
+"""
+Infeasibility triage: penalized slack on every constraint family points at the conflicting timesteps.
+"""
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.ValueStream import ValueStream
+
+INDEX = pd.date_range('2017-01-01', periods=24, freq='h')
+MASK = pd.Series(True, index=INDEX)
+
+
+def spinning_reserve():
+    sr = SpinningReserve({'price': pd.Series(1.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': True, 'max': pd.Series(3.0, index=INDEX, name='SR Max (kW)'),
+                          'min': pd.Series(np.where(np.arange(24) == 5, 5.0, 0.0), index=INDEX,
+                                           name='SR Min (kW)')})
+    sr.dt = 1
+    sr.initialize_variables(24)
+    return sr
+
+
+def solve(sr):
+    constraints = sr.constraints(MASK, 0, 0, 0, 0, 0)
+    objective = {**sr.objective_function(MASK, 0, 0, 0, 0), **sr.slack_objective()}
+    problem = cvx.Problem(cvx.Minimize(sum(objective.values())), constraints)
+    problem.solve()
+    return problem
+
+
+def test_the_conflicting_timestep_is_ranked_first():
+    assert solve(spinning_reserve()).status == 'infeasible'
+
+    ValueStream.enable_infeasibility_triage(penalty=1e4)
+    sr = spinning_reserve()
+    problem = solve(sr)
+    assert problem.status == 'optimal'
+    assert set(sr.slack_objective()) == {'SR Constraint Slack'}
+    sr.save_variable_results(INDEX)
+    ranked = ValueStream.rank_constraint_slack({'SR': sr}, tolerance=1e-4)
+    assert set(ranked['Constraint']) <= {'Max', 'Min'}
+    assert (ranked['Timestep'] == INDEX[5]).all()
+    assert abs(ranked['Slack'].sum() - 2) < 1e-4
+    assert ranked['Slack'].is_monotonic_decreasing
+
+
+def test_triage_off_adds_no_slack():
+    sr = spinning_reserve()
+    solve(sr)
+    assert sr.slack_objective() == {} and sr.slack_variables == {}
+    assert ValueStream.rank_constraint_slack([sr]).empty
+
+
+def test_constraints_of_one_family_are_all_kept():
+    ValueStream.enable_infeasibility_triage(penalty=10)
+    sr = SpinningReserve({'price': pd.Series(0.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': False})
+    sr.dt = 1
+    sr.initialize_variables(24)
+    ch_less, dis_more = sr.variables['ch_less'], sr.variables['dis_more']
+    # two 'Max' constraints that can only hold with slack
+    constraints = [cvx.Zero(ch_less), cvx.Zero(dis_more),
+                   sr.relaxed_non_pos('Max', 2 - ch_less, 24),
+                   sr.relaxed_non_pos('Max', np.arange(24) / 10 - dis_more, 24)]
+    assert len(sr.slack_variables['Max']) == 2 and len(sr.constraint_families['Max']) == 2
+    problem = cvx.Problem(cvx.Minimize(sum(sr.slack_objective().values())), constraints)
+    problem.solve()
+    assert np.isclose(problem.value, 10 * (2 * 24 + np.arange(24).sum() / 10), rtol=1e-5)
+    sr.save_variable_results(INDEX)
+    np.testing.assert_allclose(sr.slack_df['Max'], np.maximum(2, np.arange(24) / 10), atol=1e-5)
+    # both constraints bind at every timestep, so the family's dual is the sum of two penalties
+    np.testing.assert_allclose(np.abs(sr.duals()['Max'].iloc[1:]), 20, rtol=1e-4)
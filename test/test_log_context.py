@@ -0,0 +1,58 @@
+"""
+Log records made while a value stream builds its constraints carry the value stream's name.
+"""
+import logging
+import numpy as np
+import pandas as pd
+from storagevet.ErrorHandling import TellUser, ContextFilter
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.UserConstraints import UserConstraints
+
+INDEX = pd.date_range('2017-01-01', periods=48, freq='h')
+MASK = pd.Series(True, index=INDEX)
+
+
+class Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.streams = []
+        self.addFilter(ContextFilter())
+
+    def emit(self, record):
+        self.streams.append(record.stream)
+
+
+def capture():
+    handler = Records()
+    TellUser.logger = logging.getLogger('test_log_context')
+    TellUser.logger.setLevel(logging.INFO)
+    TellUser.logger.addHandler(handler)
+    return handler
+
+
+def test_records_are_tagged_with_the_stream_building_constraints():
+    records = capture()
+    TellUser.set_context(stream='Scenario')
+    uc = UserConstraints({'power': pd.DataFrame({'POI: Min Export (kW)': np.zeros(48)}, index=INDEX),
+                          'energy': pd.DataFrame(index=INDEX), 'price': 0, 'dt': 1})
+    uc.calculate_system_requirements([])
+    TellUser.info('after')
+    assert records.streams == ['User Constraints', 'Scenario']
+    TellUser.logger.removeHandler(records)
+
+
+def test_nested_contexts_restore_the_caller():
+    sr = SpinningReserve({'price': pd.Series(1.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': False})
+    sr.initialize_variables(48)
+    with TellUser.stream_context('outer'):
+        # SpinningReserve.constraints calls MarketServiceUp.constraints: both are wrapped
+        sr.constraints(MASK, 0, 0, 0, 0, 0)
+        assert TellUser.context['stream'] == 'outer'
+        try:
+            with TellUser.stream_context('inner'):
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        assert TellUser.context['stream'] == 'outer'
+    assert TellUser.context['stream'] == '-'
@@ -0,0 +1,108 @@
+"""
+TellUser logging modes: asynchronous batched writes, the collector process and exit flushing.
+"""
+import os
+import json
+import sys
+import logging
+import subprocess
+import multiprocessing
+from pathlib import Path
+import storagevet
+from storagevet.ErrorHandling import TellUser
+
+PACKAGE_ROOT = str(Path(storagevet.__file__).resolve().parent.parent)
+
+
+def run_python(code, tmp_path):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([PACKAGE_ROOT, os.environ.get('PYTHONPATH', '')]))
+    subprocess.run([sys.executable, '-c', code], cwd=tmp_path, env=env, check=True, timeout=60)
+
+
+def test_asynchronous_log_is_written_when_closed(tmp_path):
+    TellUser.create_log(tmp_path, False, asynchronous=True, batch_size=1000)
+    for i in range(50):
+        TellUser.info(f'record {i}')
+    TellUser.close_log()
+    lines = (tmp_path / 'dervet_log.log').read_text().splitlines()
+    assert len(lines) == 51 and lines[-1].endswith('record 49')
+    assert TellUser.listener is None
+
+
+def test_asynchronous_log_is_written_without_close_log(tmp_path):
+    run_python("from pathlib import Path\n"
+               "from storagevet.ErrorHandling import TellUser\n"
+               "TellUser.create_log(Path('.'), False, asynchronous=True, batch_size=1000)\n"
+               "for i in range(50):\n"
+               "    TellUser.info(f'record {i}')\n", tmp_path)
+    lines = (tmp_path / 'dervet_log.log').read_text().splitlines()
+    assert len(lines) == 51 and lines[-1].endswith('record 49')
+
+
+def worker(log_queue, scenario):
+    TellUser.create_worker_log(log_queue, scenario)
+    with TellUser.stream_context('SR'):
+        TellUser.info(f'building {scenario}')
+    TellUser.end_scenario()
+    logging.getLogger('Error').handlers[0].flush()
+
+
+def test_collector_writes_one_file_per_scenario(tmp_path):
+    log_queue = TellUser.start_log_collector(tmp_path)
+    processes = [multiprocessing.Process(target=worker, args=(log_queue, scenario)) for scenario in ['a', 'b']]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    TellUser.stop_log_collector()
+    for scenario in ['a', 'b']:
+        text = (tmp_path / f'dervet_log_{scenario}.log').read_text()
+        assert f'[{scenario} | pid' in text and f'| SR] - building {scenario}' in text
+        assert text.splitlines()[-1].endswith(f'Finished scenario {scenario}')
+
+
+
+def test_collector_closes_a_scenario_file_when_the_scenario_ends(tmp_path, monkeypatch):
+    events = []
+
+    class FileHandler(logging.FileHandler):
+        def __init__(self, filename, mode='a'):
+            events.append(('open', Path(filename).name, mode))
+            super().__init__(filename, mode)
+
+        def close(self):
+            events.append(('close', Path(self.baseFilename).name))
+            super().close()
+    monkeypatch.setattr(logging, 'FileHandler', FileHandler)
+
+    def record(scenario, msg, end=False):
+        return logging.makeLogRecord({'msg': msg, 'levelname': 'INFO', 'scenario': scenario, 'stream': '-',
+                                      'scenario_end': end})
+    records = multiprocessing.Queue()
+    for item in [record('a', 'first'), record('a', 'done', end=True), record('b', 'other'),
+                 record('a', 'again'), None]:
+        records.put(item)
+    TellUser.run_log_collector(records, tmp_path, per_scenario=True)
+    assert events == [('open', 'dervet_log_a.log', 'w'), ('close', 'dervet_log_a.log'),
+                      ('open', 'dervet_log_b.log', 'w'), ('open', 'dervet_log_a.log', 'a'),
+                      ('close', 'dervet_log_b.log'), ('close', 'dervet_log_a.log')]
+    lines = (tmp_path / 'dervet_log_a.log').read_text().splitlines()
+    assert [line.rsplit(' - ', 1)[1] for line in lines] == ['first', 'done', 'again']
+
+
+def event_worker(log_queue, scenario):
+    TellUser.create_worker_log(log_queue, scenario, events=True)
+    with TellUser.stream_context('SR'):
+        TellUser.build_time(0, 0.5)
+    logging.getLogger('Error').handlers[0].flush()
+
+
+def test_collector_writes_the_workers_events(tmp_path):
+    log_queue = TellUser.start_log_collector(tmp_path)
+    process = multiprocessing.Process(target=event_worker, args=(log_queue, 'a'))
+    process.start()
+    process.join()
+    TellUser.stop_log_collector()
+    event = json.loads((tmp_path / 'dervet_events.jsonl').read_text())
+    assert (event['event'], event['scenario'], event['stream'], event['seconds']) == ('build time', 'a', 'SR', 0.5)
+    assert not (tmp_path / 'dervet_log_a.log').exists()
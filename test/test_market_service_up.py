@@ -0,0 +1,52 @@
+"""
+SpinningReserve and NonspinningReserve share the timeseries Max/Min handling of MarketServiceUp.
+"""
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+import pytest
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.NonspinningReserve import NonspinningReserve
+
+INDEX = pd.date_range('2017-01-01', periods=24, freq='h')
+MASK = pd.Series(True, index=INDEX)
+PRICE = pd.Series(np.where(np.arange(24) < 12, 1.0, -1.0), index=INDEX)
+
+
+def reserve(cls, name):
+    service = cls({'price': PRICE, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': True,
+                   'max': pd.Series(np.where(np.arange(24) % 2, 3.0, 0.0), index=INDEX, name=f'{name} Max (kW)'),
+                   'min': pd.Series(np.where(np.arange(24) == 21, 1.0, 0.0), index=INDEX, name=f'{name} Min (kW)')})
+    service.dt = 1
+    service.grow_drop_data([2017], 'h', 0)
+    return service
+
+
+@pytest.mark.parametrize('cls, name', [(SpinningReserve, 'SR'), (NonspinningReserve, 'NSR')])
+def test_timeseries_max_and_min_limit_the_reservation(cls, name):
+    service = reserve(cls, name)
+    assert list(service.input_columns()) == [f'{name} Price ($/kW)', f'{name} Max (kW)', f'{name} Min (kW)']
+    assert service.max_participation_is_defined()
+    assert service.min_regulation_down() is service.min
+
+    service.presolve(MASK)
+    participating = (np.arange(24) < 12) & (np.arange(24) % 2 == 1) | (np.arange(24) == 21)
+    np.testing.assert_array_equal(service.participating['ch_less'], participating)
+    service.initialize_variables(24)
+    problem = cvx.Problem(cvx.Minimize(service.objective_function(MASK, 0, 0, 0, 0)[name]),
+                          service.constraints(MASK, 0, 0, 0, 0, 0))
+    problem.solve()
+    service.save_variable_results(INDEX)
+    reserved = (service.variables_df['ch_less'] + service.variables_df['dis_more']).values
+    expected = np.where(participating, np.where(np.arange(24) == 21, 1.0, 3.0), 0.0)
+    np.testing.assert_allclose(reserved, expected, atol=1e-6)
+
+    report = service.timeseries_report()
+    assert list(report.columns)[-2:] == [f'{name} Max (kW)', f'{name} Min (kW)']
+
+
+def test_without_timeseries_constraints():
+    service = SpinningReserve({'price': PRICE, 'growth': 0, 'duration': 1, 'dt': 1})
+    assert not service.ts_constraints and not service.max_participation_is_defined()
+    assert service.min_regulation_down() == 0
+    assert list(service.input_columns()) == ['SR Price ($/kW)']
@@ -0,0 +1,62 @@
+"""
+MarketServiceUpAndDown: the objective, discharge reservations and stored energy option of an up/down market.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+
+INDEX = pd.date_range('2017-01-01', periods=24, freq='h')
+MASK = pd.Series(True, index=INDEX)
+RNG = np.random.default_rng(9)
+EOD = RNG.random(24)
+EOU = RNG.random(24)
+UP_PRICE, DOWN_PRICE, ENERGY_PRICE = RNG.random(24), RNG.random(24), RNG.random(24) * 0.1
+VALUES = {name: RNG.random(24) * 10 for name in ['up_ch', 'down_ch', 'up_dis', 'down_dis']}
+
+
+def load_following():
+    lf = LoadFollowing({'CombinedMarket': False, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+                        'eod': pd.Series(EOD, index=INDEX), 'eou': pd.Series(EOU, index=INDEX),
+                        'regd_price': pd.Series(DOWN_PRICE, index=INDEX),
+                        'regu_price': pd.Series(UP_PRICE, index=INDEX),
+                        'energy_price': pd.Series(ENERGY_PRICE, index=INDEX), 'dt': 0.5,
+                        'u_ts_constraints': False, 'd_ts_constraints': False})
+    lf.dt = 0.5
+    lf.initialize_variables(len(INDEX))
+    for name, value in VALUES.items():
+        lf.variables[name].value = value
+    return lf
+
+
+def expected_objective(up_price, down_price, energy_price):
+    up = VALUES['up_ch'] + VALUES['up_dis']
+    down = VALUES['down_ch'] + VALUES['down_dis']
+    return {'LF Up': -up_price @ up, 'LF Down': -down_price @ down,
+            'LF Energy Throughput': (energy_price * EOD) @ down * 0.5 - (energy_price * EOU) @ up * 0.5}
+
+
+def test_objective_pays_capacity_and_settles_the_energy_throughput():
+    objective = load_following().objective_function(MASK, 0, 0, 0, 0)
+    expected = expected_objective(UP_PRICE, DOWN_PRICE, ENERGY_PRICE)
+    assert set(objective) == set(expected)
+    for name, value in expected.items():
+        assert np.isclose(objective[name].value, value)
+
+
+def test_new_prices_update_the_same_objective():
+    lf = load_following()
+    objective = lf.objective_function(MASK, 0, 0, 0, 0)
+    prices = RNG.random((3, 24))
+    lf.update_price_signals(None, pd.DataFrame({'LF Up Price ($/kW)': prices[0], 'LF Down Price ($/kW)': prices[1],
+                                                'DA Price ($/kWh)': prices[2]}, index=INDEX))
+    lf.update_parameters(MASK)
+    for name, value in expected_objective(*prices).items():
+        assert np.isclose(objective[name].value, value)
+
+
+def test_discharge_reservations_and_stored_energy_option():
+    lf = load_following()
+    np.testing.assert_allclose(lf.p_reservation_discharge_up(MASK).value, VALUES['up_dis'])
+    np.testing.assert_allclose(lf.p_reservation_discharge_down(MASK).value, VALUES['down_dis'])
+    np.testing.assert_allclose(lf.uenergy_option_stored(MASK).value,
+                               (VALUES['up_ch'] * EOU - VALUES['down_ch'] * EOD) * 0.5)
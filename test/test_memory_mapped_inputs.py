@@ -0,0 +1,58 @@
+"""
+Memory-mapped inputs stay read-only views through grow_drop_data and the constraint windows.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.UserConstraints import UserConstraints, VERY_LARGE_NEGATIVE_NUMBER
+from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.TimeSeriesInput import MemoryMappedTimeSeries
+
+INDEX = pd.date_range('2017-01-01', periods=8760, freq='h')
+
+
+def time_series(tmp_path):
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({'SR Price ($/kW)': rng.random(len(INDEX)),
+                          'SR Max (kW)': np.full(len(INDEX), 5.0),
+                          'SR Min (kW)': np.zeros(len(INDEX)),
+                          'POI: Min Import (kW)': np.where(np.arange(len(INDEX)) % 2, 3.0, 0.0)}, index=INDEX)
+    return MemoryMappedTimeSeries.save(frame, tmp_path)
+
+
+def test_grow_drop_data_keeps_the_memory_mapped_views(tmp_path):
+    data = time_series(tmp_path)
+    sr = SpinningReserve({'price': data['SR Price ($/kW)'], 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': True, 'max': data['SR Max (kW)'], 'min': data['SR Min (kW)']})
+    sr.grow_drop_data([2017], 'h', 0)
+    for name, series in [('SR Price ($/kW)', sr.price), ('SR Max (kW)', sr.max), ('SR Min (kW)', sr.min)]:
+        assert np.shares_memory(series.values, data[name].values)
+
+    mask = pd.Series((INDEX.month == 3), index=INDEX)
+    window = sr.window_values(sr.max, mask)
+    assert len(window) == mask.sum()
+    assert np.shares_memory(window, data['SR Max (kW)'].values)
+
+
+def test_window_values_without_a_contiguous_window():
+    series = pd.Series(np.arange(10.0), index=INDEX[:10])
+    mask = pd.Series(np.arange(10) % 3 == 0, index=INDEX[:10])
+    np.testing.assert_array_equal(ValueStream.window_values(series, mask), [0, 3, 6, 9])
+    np.testing.assert_array_equal(ValueStream.window_values(2.5, mask), [2.5] * 4)
+
+
+def test_grow_drop_data_slices_the_analysis_year():
+    series = pd.Series(np.arange(24 * 3, dtype=float), index=pd.date_range('2016-12-31', periods=24 * 3, freq='h'))
+    sr = SpinningReserve({'price': series, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': False})
+    sr.grow_drop_data([2017], 'h', 0)
+    assert sr.price.index.year.unique().tolist() == [2017]
+    assert np.shares_memory(sr.price.values, series.values)
+
+
+def test_user_constraints_copy_a_read_only_column_before_writing(tmp_path):
+    data = time_series(tmp_path)
+    uc = UserConstraints({'power': pd.DataFrame({'POI: Min Import (kW)': data['POI: Min Import (kW)']}),
+                          'energy': pd.DataFrame(index=INDEX), 'price': 0, 'dt': 1})
+    uc.calculate_system_requirements([])
+    assert (uc.poi_import_min_constraint.values[::2] == VERY_LARGE_NEGATIVE_NUMBER).all()
+    assert (data['POI: Min Import (kW)'].values[::2] == 0).all()
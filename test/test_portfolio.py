@@ -0,0 +1,83 @@
+"""
+Portfolio mode: N sites bidding the same services share one T x N variable per product.
+"""
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+
+SITES = ['a', 'b', 'c']
+CAPACITY = np.array([2., 4., 6.])
+INDEX = pd.date_range('2017-01-01', periods=48, freq='h')
+PRICE = pd.Series(np.random.default_rng(0).random(48), index=INDEX)
+MASK = pd.Series(True, index=INDEX)
+
+
+def spinning_reserve():
+    sr = SpinningReserve({'price': PRICE, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': True,
+                          'max': pd.Series(5.0, index=INDEX, name='SR Max (kW)'),
+                          'min': pd.Series(0.0, index=INDEX, name='SR Min (kW)')})
+    sr.dt = 1
+    return sr
+
+
+def load_following():
+    return LoadFollowing({'CombinedMarket': True, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+                          'eod': pd.Series(0.3, index=INDEX), 'eou': pd.Series(0.3, index=INDEX),
+                          'regd_price': PRICE, 'regu_price': PRICE, 'energy_price': PRICE * 0.1, 'dt': 1,
+                          'u_ts_constraints': False, 'd_ts_constraints': False})
+
+
+def build(value_stream, sites=None):
+    if sites is not None:
+        value_stream.enable_portfolio(sites)
+    value_stream.presolve(MASK)
+    value_stream.initialize_variables(len(INDEX))
+    return value_stream
+
+
+def test_default_reservations_have_the_portfolio_shape():
+    sr = build(spinning_reserve(), SITES)
+    # SR does not reserve down power, so these come from the ValueStream defaults
+    assert sr.p_reservation_charge_down(MASK).shape == (48, 3)
+    assert sr.p_reservation_discharge_down(MASK).shape == (48, 3)
+    assert sr.uenergy_option_stored(MASK).shape == (48, 3)
+    assert sr.worst_case_uenergy_stored(MASK).shape == (48, 3)
+
+
+def test_multi_stream_portfolio_sums_reservations_across_streams():
+    streams = [build(spinning_reserve(), SITES), build(load_following(), SITES)]
+    cap = np.tile(CAPACITY, (48, 1))
+    up = sum(s.p_reservation_charge_up(MASK) + s.p_reservation_discharge_up(MASK) for s in streams)
+    down = sum(s.p_reservation_charge_down(MASK) + s.p_reservation_discharge_down(MASK) for s in streams)
+    stored = sum(s.uenergy_option_stored(MASK) for s in streams)
+    provided = sum(s.uenergy_option_provided(MASK) for s in streams)
+    objective = sum(sum(s.objective_function(MASK, 0, 0, 0, 0).values()) for s in streams)
+    constraints = [up <= cap, down <= cap, stored <= 10, provided <= 10]
+    for s in streams:
+        constraints += s.constraints(MASK, 0, 0, 0, 0, 0)
+    problem = cvx.Problem(cvx.Minimize(objective), constraints)
+    problem.solve()
+    assert problem.status == 'optimal'
+    for s in streams:
+        s.save_variable_results(INDEX)
+        assert s.for_site('b').timeseries_report().shape[0] == 48
+
+
+def test_portfolio_equals_separate_site_solves():
+    portfolio = build(spinning_reserve(), SITES)
+    problem = cvx.Problem(cvx.Minimize(portfolio.objective_function(MASK, 0, 0, 0, 0)['SR']),
+                          portfolio.constraints(MASK, 0, 0, 0, 0, 0) +
+                          [portfolio.p_reservation_charge_up(MASK) + portfolio.p_reservation_discharge_up(MASK)
+                           <= np.tile(CAPACITY, (48, 1))])
+    problem.solve()
+    separate = 0
+    for capacity in CAPACITY:
+        sr = build(spinning_reserve())
+        site_problem = cvx.Problem(cvx.Minimize(sr.objective_function(MASK, 0, 0, 0, 0)['SR']),
+                                   sr.constraints(MASK, 0, 0, 0, 0, 0) +
+                                   [sr.p_reservation_charge_up(MASK) + sr.p_reservation_discharge_up(MASK) <= capacity])
+        site_problem.solve()
+        separate += site_problem.value
+    assert np.isclose(problem.value, separate, rtol=1e-5)
@@ -0,0 +1,82 @@
+"""
+Presolve: timesteps where a market service cannot participate are dropped from the problem.
+"""
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+
+INDEX = pd.date_range('2017-01-01', periods=24 * 14, freq='h')
+MASK = pd.Series(True, index=INDEX)
+RNG = np.random.default_rng(1)
+PRICE = pd.Series(np.where(RNG.random(len(INDEX)) < 0.3, RNG.random(len(INDEX)), 0), index=INDEX)
+MAX = pd.Series(np.where(RNG.random(len(INDEX)) < 0.5, 5.0, 0.0), index=INDEX, name='SR Max (kW)')
+MIN = pd.Series(np.where((RNG.random(len(INDEX)) < 0.2) & (MAX.values > 0), 1.0, 0.0), index=INDEX,
+                name='SR Min (kW)')
+
+
+def load_following_params():
+    return {'CombinedMarket': False, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+            'eod': pd.Series(0.3, index=INDEX), 'eou': pd.Series(0.3, index=INDEX),
+            'regd_price': PRICE, 'regu_price': PRICE, 'energy_price': PRICE, 'dt': 1,
+            'u_ts_constraints': True, 'd_ts_constraints': True,
+            'lf_u_max': MAX.rename('u max'), 'lf_u_min': pd.Series(0.0, index=INDEX, name='u min'),
+            'lf_d_max': MAX[::-1].set_axis(INDEX).rename('d max'),
+            'lf_d_min': pd.Series(0.0, index=INDEX, name='d min')}
+
+
+def solve_spinning_reserve(presolve):
+    sr = SpinningReserve({'price': PRICE, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': True,
+                          'max': MAX, 'min': MIN})
+    if presolve:
+        sr.presolve(MASK)
+    sr.initialize_variables(len(INDEX))
+    constraints = sr.constraints(MASK, 0, 0, 0, 0, 0)
+    constraints += [sr.p_reservation_charge_up(MASK) + sr.p_reservation_discharge_up(MASK) <= 3,
+                    sr.worst_case_uenergy_provided(MASK) <= 10]
+    problem = cvx.Problem(cvx.Minimize(sr.objective_function(MASK, 0, 0, 0, 0)['SR']), constraints)
+    problem.solve()
+    sr.save_variable_results(INDEX)
+    return problem, sr
+
+
+def test_up_and_down_services_construct_with_ordered_columns():
+    lf = LoadFollowing(load_following_params())
+    assert list(lf.variables_df.columns) == ['down_ch', 'down_dis', 'up_ch', 'up_dis']
+
+
+def test_presolve_keeps_the_objective_and_drops_variables():
+    full, full_sr = solve_spinning_reserve(False)
+    reduced, reduced_sr = solve_spinning_reserve(True)
+    assert np.isclose(full.value, reduced.value, atol=1e-6)
+    assert sum(v.size for v in reduced.variables()) < sum(v.size for v in full.variables())
+    # dropped timesteps are reported as zero, on the full index
+    assert reduced_sr.variables_df.index.equals(INDEX)
+    dropped = ~reduced_sr.participating['ch_less']
+    assert (reduced_sr.variables_df.loc[dropped, 'ch_less'] == 0).all()
+
+
+def test_a_window_without_participating_intervals_builds_and_reports_zeros():
+    sr = SpinningReserve({'price': pd.Series(-1.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': True, 'max': MAX, 'min': MIN * 0})
+    lf_params = load_following_params()
+    lf_params['lf_u_max'] = lf_params['lf_d_max'] = pd.Series(0.0, index=INDEX, name='max')
+    lf = LoadFollowing(lf_params)
+    battery = cvx.Variable(len(INDEX), nonneg=True)
+    constraints = [battery <= 2]
+    objective = -cvx.sum(battery)
+    for stream in [sr, lf]:
+        stream.dt = 1
+        stream.presolve(MASK)
+        stream.initialize_variables(len(INDEX))
+        constraints += stream.constraints(MASK, 0, 0, 0, 0, 0)
+        objective += sum(stream.objective_function(MASK, 0, 0, 0, 0).values())
+    problem = cvx.Problem(cvx.Minimize(objective), constraints)
+    problem.solve()
+    assert problem.status == 'optimal'
+    assert sr.excluded == {'ch_less', 'dis_more'} and lf.excluded == {'up_ch', 'up_dis', 'down_ch', 'down_dis'}
+    for stream in [sr, lf]:
+        stream.save_variable_results(INDEX)
+        assert stream.variables_df.index.equals(INDEX)
+        assert (stream.variables_df == 0).all().all()
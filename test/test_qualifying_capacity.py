@@ -0,0 +1,58 @@
+"""
+QualifyingCapacity: cached per DER object and event length, with explicit invalidation.
+"""
+import gc
+import numpy as np
+import cvxpy as cvx
+from storagevet.ValueStreams.QualifyingCapacity import QualifyingCapacity
+
+
+class Battery:
+    def __init__(self, dis_max_rated, ene_max_rated):
+        self.dis_max_rated = dis_max_rated
+        self.ene_max_rated = ene_max_rated
+        self.calls = 0
+
+    def qualifying_capacity(self, length):
+        self.calls += 1
+        return min(self.dis_max_rated, self.ene_max_rated / length)
+
+
+def test_capacities_are_computed_once_per_der_and_length():
+    cache = QualifyingCapacity()
+    batteries = [Battery(100, 400), Battery(50, 100)]
+    np.testing.assert_allclose(cache.qualifying_commitments(batteries, [1, 2, 4]), [150, 150, 125])
+    assert cache.qualifying_commitment(batteries, 4) == 125
+    assert cache.qualifying_commitment(batteries, 8) == 50 + 12.5
+    assert [battery.calls for battery in batteries] == [4, 4]
+
+
+def test_invalidate_after_a_der_changes_in_place():
+    cache = QualifyingCapacity()
+    battery = Battery(100, 400)
+    assert cache.qualifying_capacity(battery, 8) == 50
+    battery.ene_max_rated = 800
+    assert cache.qualifying_capacity(battery, 8) == 50
+    cache.invalidate(battery)
+    assert cache.qualifying_capacity(battery, 8) == 100
+
+
+def test_entries_go_away_with_their_der():
+    cache = QualifyingCapacity()
+    cache.qualifying_commitment([Battery(100, 400)], 4)
+    gc.collect()
+    assert len(cache.entries) == 0
+    assert cache.qualifying_commitment([Battery(10, 10)], 4) == 2.5
+
+
+def test_sized_der_gives_expressions():
+    class SizedBattery(Battery):
+        def qualifying_capacity(self, length):
+            return self.dis_max_rated
+
+    cache = QualifyingCapacity()
+    size = cvx.Variable(name='dis_max_rated')
+    commitments = cache.qualifying_commitments([SizedBattery(size, 0), Battery(10, 10)], [1, 2])
+    assert isinstance(commitments, list) and len(commitments) == 2
+    assert all(isinstance(commitment, cvx.Expression) for commitment in commitments)
+    assert cache.qualifying_commitments([], [1, 2]).tolist() == [0, 0]
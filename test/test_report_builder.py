@@ -0,0 +1,92 @@
+"""
+ReportBuilder: the report is one preallocated block, filled in place and wrapped without copying.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+
+INDEX = pd.date_range('2017-01-01', periods=24, freq='h')
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+class Flags:
+    """ a value stream that does not declare its columns """
+    name = 'Flags'
+
+    def report_columns(self):
+        return None
+
+    def timeseries_report(self):
+        return pd.DataFrame({'Flags Active': np.arange(len(INDEX)) % 2 == 0,
+                             'Flags Level': pd.Series(1.0, index=INDEX[:12])}, index=INDEX)
+
+
+def test_the_float_block_is_wrapped_without_copying():
+    builder = ReportBuilder(INDEX)
+    builder.declare('a')
+    builder.declare('flag', 'bool')
+    builder.declare('b')
+    builder.declare('a')
+    builder.allocate()
+    builder['a'] = np.arange(24.0)
+    builder['b'] = pd.Series(2.0, index=INDEX[:6])
+    builder['flag'] = True
+    frame = builder.to_frame()
+    assert list(frame.columns) == ['a', 'flag', 'b']
+    assert frame['flag'].dtype == bool and frame['flag'].all()
+    assert np.shares_memory(frame['a'].values, builder.float_block)
+    assert np.shares_memory(frame['b'].values, builder.float_block)
+    assert frame['b'].notna().sum() == 6
+
+
+def test_build_combines_declared_and_copied_reports():
+    sr = SpinningReserve({'price': pd.Series(np.arange(24.0), index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1,
+                          'ts_constraints': False})
+    sr.variables = {'ch_less': Solved(np.ones(24)), 'dis_more': Solved(np.full(24, 2.0))}
+    sr.save_variable_results(INDEX)
+    report = ReportBuilder.build([sr, Flags()], INDEX)
+    own = sr.timeseries_report()
+    assert list(report.columns) == list(own.columns) + ['Flags Active', 'Flags Level']
+    pd.testing.assert_frame_equal(report[own.columns], own)
+    assert report['Flags Active'].dtype == bool
+    assert report['Flags Level'].isna().sum() == 12
+
+
+def test_missing_rows_of_bool_columns_are_false():
+    builder = ReportBuilder(INDEX)
+    builder.declare('flag', 'bool')
+    builder.declare('label', 'object')
+    builder.allocate()
+    builder['flag'] = pd.Series([True, False], index=INDEX[:2])
+    builder['label'] = pd.Series(['on', 'off'], index=INDEX[:2])
+    frame = builder.to_frame()
+    assert frame['flag'].tolist() == [True, False] + [False] * 22
+    assert frame['label'].tolist()[:2] == ['on', 'off'] and frame['label'][2:].isna().all()
+
+
+class Labels(Flags):
+    """ a value stream whose report has a string column """
+    name = 'Labels'
+    calls = 0
+
+    def report_columns(self):
+        Labels.calls += 1
+        return None
+
+    def timeseries_report(self):
+        report = super().timeseries_report()
+        report['Labels Mode'] = np.where(report['Flags Active'], 'charge', 'idle')
+        return report
+
+
+def test_build_keeps_string_columns_and_asks_for_the_columns_once():
+    report = ReportBuilder.build([Labels()], INDEX)
+    assert Labels.calls == 1
+    assert report['Labels Mode'].tolist() == ['charge', 'idle'] * 12
+    assert report['Flags Active'].dtype == bool
@@ -0,0 +1,78 @@
+"""
+ReportWriter: timeseries reports stream into Parquet/Arrow files in row chunks and read back.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+
+pytest.importorskip('pyarrow')
+from storagevet.ValueStreams.ReportWriter import ReportWriter, INDEX_NAME
+
+INDEX = pd.date_range('2017-01-01', periods=1000, freq='h', name=INDEX_NAME)
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+def ra_report():
+    return pd.DataFrame({'RA Event (y/n)': np.arange(len(INDEX)) % 7 == 0,
+                         'RA Load (kW)': np.linspace(0, 1, len(INDEX))}, index=INDEX)
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_reports_round_trip_in_chunks(tmp_path, file_format):
+    writer = ReportWriter(tmp_path, file_format, chunk_rows=128)
+    report = ra_report()
+    # the report may also be handed over in pieces, in time order
+    writer.write('RA', [report.iloc[:300], report.iloc[300:]])
+    writer.write('Empty', pd.DataFrame())
+    assert [path.name for path in writer.files] == [f'RA.{file_format}']
+    read = ReportWriter.read(tmp_path)
+    assert read['RA Event (y/n)'].dtype == bool
+    pd.testing.assert_frame_equal(read, report, check_freq=False)
+    only = ReportWriter.read(tmp_path, columns=['RA Load (kW)'])
+    assert list(only.columns) == ['RA Load (kW)']
+
+
+def test_float32_reports_of_value_streams(tmp_path):
+    sr = SpinningReserve({'price': pd.Series(1.5, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1})
+    sr.variables = {'ch_less': Solved(np.ones(len(INDEX))), 'dis_more': Solved(np.full(len(INDEX), 0.1))}
+    sr.save_variable_results(INDEX)
+    ReportWriter(tmp_path, float32=True).write_all({'SR': sr})
+    read = ReportWriter.read(tmp_path)
+    assert (read.dtypes == np.float32).all()
+    np.testing.assert_allclose(read.values, sr.timeseries_report().values, rtol=1e-6)
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ReportWriter(tmp_path, 'csv')
+
+
+def test_a_report_that_fails_to_write_is_not_listed(tmp_path):
+    writer = ReportWriter(tmp_path, chunk_rows=128)
+    bad = pd.DataFrame({'RA Load (kW)': [1, 'a']}, index=INDEX[:2])
+    with pytest.raises(Exception):
+        writer.write('RA', [ra_report(), bad])
+    assert writer.files == []
+
+
+def keep(frame, *args):
+    return frame
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'arrow'])
+def test_proforma_from_the_written_reports(tmp_path, file_format):
+    sr = SpinningReserve({'price': pd.Series(np.linspace(1, 2, len(INDEX)), index=INDEX.rename(None)),
+                          'growth': 0, 'duration': 1, 'dt': 1})
+    sr.variables = {'ch_less': Solved(np.ones(len(INDEX))), 'dis_more': Solved(np.full(len(INDEX), 0.1))}
+    sr.save_variable_results(INDEX)
+    writer = ReportWriter(tmp_path, file_format)
+    writer.write_all({'SR': sr})
+    proforma = writer.proforma_reports({'SR': sr}, [2017], keep, keep)
+    expected = sr.proforma_report([2017], keep, keep, sr.timeseries_report())
+    pd.testing.assert_frame_equal(proforma['SR'], expected)
@@ -0,0 +1,80 @@
+"""
+Reservation worker: a hot problem answering JSON line requests with new price forecasts.
+"""
+import io
+import json
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+from storagevet.ValueStreams.ReservationWorker import ReservationWorker
+
+INDEX = pd.date_range('2017-01-01', periods=48, freq='5min')
+RNG = np.random.default_rng(0)
+
+
+def series(scale=1.0):
+    return pd.Series(RNG.random(len(INDEX)) * scale, index=INDEX)
+
+
+def worker():
+    sr = SpinningReserve({'price': series(), 'growth': 0, 'duration': 1, 'dt': 1 / 12})
+    lf = LoadFollowing({'CombinedMarket': False, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+                        'eod': pd.Series(0.3, index=INDEX), 'eou': pd.Series(0.3, index=INDEX),
+                        'regd_price': series(), 'regu_price': series(), 'energy_price': series(0.1),
+                        'dt': 1 / 12})
+    return ReservationWorker({'SR': sr, 'LF': lf}, INDEX, power_rating=100, energy_rating=200)
+
+
+def forecast():
+    return json.dumps({'time_series': {'SR Price ($/kW)': list(RNG.random(len(INDEX))),
+                                       'LF Up Price ($/kW)': list(RNG.random(len(INDEX))),
+                                       'LF Down Price ($/kW)': list(RNG.random(len(INDEX))),
+                                       'DA Price ($/kWh)': list(RNG.random(len(INDEX)) * 0.1)}})
+
+
+def serve(lines):
+    reservation_worker = worker()
+    replies = io.StringIO()
+    stopped = reservation_worker.serve(io.StringIO('\n'.join(lines)), replies)
+    return stopped, [json.loads(reply) for reply in replies.getvalue().splitlines()]
+
+
+def test_forecasts_are_solved_and_stats_are_reported():
+    stopped, replies = serve([forecast(), forecast(), '{"command": "stats"}', '{"command": "stop"}'])
+    assert stopped
+    assert [reply.get('status') for reply in replies[:2]] == ['optimal', 'optimal']
+    assert set(replies[0]['reservations']) == {'SR', 'LF'}
+    assert replies[2]['stats']['solves'] == 2
+
+
+def test_malformed_line_is_answered_and_the_worker_keeps_serving():
+    stopped, replies = serve(['{"time_series": [1, 2', '[1, 2]', forecast(), '{"command": "stop"}'])
+    assert stopped
+    assert replies[0]['status'] == 'error' and 'malformed' in replies[0]['message']
+    assert replies[1]['status'] == 'error'
+    assert replies[2]['status'] == 'optimal'
+
+
+def test_any_failure_is_answered_and_the_worker_keeps_serving():
+    reservation_worker = worker()
+
+    def fail(time_series):
+        raise RuntimeError('forecast feed is down')
+    reservation_worker.update = fail
+    replies = io.StringIO()
+    reservation_worker.serve(io.StringIO(forecast() + '\n' + '{"command": "stats"}'), replies)
+    first, second = [json.loads(reply) for reply in replies.getvalue().splitlines()]
+    assert first['status'] == 'error' and 'RuntimeError' in first['message']
+    assert second['stats']['solves'] == 0
+
+
+def test_portfolio_reservations_are_reported_by_site():
+    sr = SpinningReserve({'price': series(), 'growth': 0, 'duration': 1, 'dt': 1 / 12})
+    sr.enable_portfolio(['a', 'b'])
+    reservation_worker = ReservationWorker({'SR': sr}, INDEX, power_rating=100)
+    reply = reservation_worker.handle(json.loads(forecast()))
+    assert reply['status'] == 'optimal'
+    for reservation in reply['reservations']['SR'].values():
+        assert set(reservation) == {'a', 'b'}
+        assert all(isinstance(kw, float) for kw in reservation.values())
@@ -0,0 +1,131 @@
+"""
+ResourceAdequacy: peak ranking, RA events and the timeseries report built by integer position.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.ResourceAdequacy import ResourceAdequacy
+
+INDEX = pd.date_range('2017-01-01', periods=24 * 59, freq='h')
+LOAD = pd.Series(np.random.default_rng(7).random(len(INDEX)) * 100, index=INDEX, name='System Load (kW)')
+
+
+class Battery:
+    def __init__(self, dis_max_rated=50, ene_max_rated=100):
+        self.dis_max_rated = dis_max_rated
+        self.ene_max_rated = ene_max_rated
+
+    def qualifying_capacity(self, length):
+        return min(self.dis_max_rated, self.ene_max_rated / length)
+
+
+def resource_adequacy(days=2, length=3, dispmode=True, idmode='Peak by Month'):
+    ra = ResourceAdequacy({'days': days, 'length': length, 'idmode': idmode, 'dispmode': dispmode,
+                           'value': pd.Series(5.0, index=pd.period_range('2017-01', periods=2, freq='M')),
+                           'system_load': LOAD, 'growth': 0, 'dt': 1})
+    ra.calculate_system_requirements([Battery()])
+    return ra
+
+
+def expected_peaks(days, by='M', load=LOAD):
+    """ the timestep of the largest load of each of the DAYS days with the largest daily peak, per group """
+    daily_peak = load.groupby(load.index.normalize()).idxmax()
+    daily_load = load.loc[daily_peak.values].set_axis(daily_peak.index)
+    peaks = []
+    for _, group in daily_load.groupby(daily_load.index.to_period(by)):
+        peaks += list(daily_peak[group.nlargest(days).index])
+    return pd.DatetimeIndex(sorted(peaks))
+
+
+def expected_events(peaks, length):
+    presteps = length // 2 if length % 2 else length // 2 - 1
+    events = set()
+    for peak in peaks:
+        for step in range(length):
+            timestep = peak + pd.Timedelta(hours=step - presteps)
+            if INDEX[0] <= timestep <= INDEX[-1]:
+                events.add(timestep)
+    return pd.DatetimeIndex(sorted(events))
+
+
+def test_events_are_scheduled_around_the_monthly_peaks():
+    ra = resource_adequacy()
+    assert pd.DatetimeIndex(sorted(ra.peak_intervals)).equals(expected_peaks(2))
+    assert ra.event_intervals.equals(expected_events(expected_peaks(2), 3))
+    assert np.isclose(ra.qc, 100 / 3)
+    assert (ra.der_dispatch_discharge_min_constraint == ra.qc).all()
+
+
+def test_timeseries_report_matches_the_label_based_merge():
+    for dispmode in [True, False]:
+        ra = resource_adequacy(dispmode=dispmode)
+        report = ra.timeseries_report()
+        constraint = ra.requirement_constraint()
+        expected = pd.DataFrame({'System Load (kW)': LOAD.values,
+                                 'RA Event (y/n)': INDEX.isin(ra.event_intervals),
+                                 constraint.name: constraint.reindex(INDEX).values}, index=INDEX)
+        pd.testing.assert_frame_equal(report, expected, check_freq=False)
+
+
+def test_sweep_matches_separate_runs():
+    battery = Battery()
+    grid = resource_adequacy().sweep([battery], [1, 3], [2, 4])
+    assert set(grid) == {(1, 2), (1, 4), (3, 2), (3, 4)}
+    for (days, length), result in grid.items():
+        ra = resource_adequacy(days, length)
+        assert pd.DatetimeIndex(sorted(result['peak_intervals'])).equals(pd.DatetimeIndex(sorted(ra.peak_intervals)))
+        assert result['event_intervals'].equals(ra.event_intervals)
+        assert pd.DatetimeIndex(result['event_start_times']).equals(pd.DatetimeIndex(ra.event_start_times))
+        assert np.isclose(result['qc'], battery.qualifying_capacity(length))
+
+
+def test_window_requirements_hold_only_the_events_in_the_window():
+    for dispmode in [True, False]:
+        ra = resource_adequacy(dispmode=dispmode)
+        constraint = ra.requirement_constraint()
+        for start in range(0, len(INDEX), 24 * 7):
+            mask = pd.Series(False, index=INDEX)
+            mask.iloc[start:start + 24 * 7] = True
+            requirements = ra.window_requirements(mask)
+            expected = constraint[constraint.index.isin(INDEX[mask.values])]
+            if expected.empty:
+                assert requirements == []
+                continue
+            assert len(requirements) == 1
+            pd.testing.assert_series_equal(requirements[0].value.sort_index(), expected.sort_index())
+
+
+def test_a_new_system_load_is_ranked_again():
+    ra = resource_adequacy()
+    first = ra.sweep([Battery()], [2], [3])[(2, 3)]
+    shifted = LOAD.shift(36, fill_value=0)
+    ra.system_load = shifted
+    assert ra.peak_rankings == {} and ra.event_index is None
+    second = ra.sweep([Battery()], [2], [3])[(2, 3)]
+    assert pd.DatetimeIndex(sorted(second['peak_intervals'])).equals(expected_peaks(2, load=shifted))
+    assert not second['peak_intervals'].equals(first['peak_intervals'])
+
+
+def test_window_requirements_for_a_split_or_foreign_mask():
+    ra = resource_adequacy()
+    constraint = ra.requirement_constraint()
+    # two separate weeks of the same mask
+    mask = pd.Series(False, index=INDEX)
+    mask.iloc[:24 * 7] = True
+    mask.iloc[24 * 28:24 * 35] = True
+    # the same window on a mask indexed by only part of the horizon
+    partial = mask.iloc[24:24 * 40]
+    for window in [mask, partial]:
+        expected = constraint[constraint.index.isin(window.index[window.values])]
+        assert not expected.empty
+        requirements = ra.window_requirements(window)
+        pd.testing.assert_series_equal(requirements[0].value.sort_index(), expected.sort_index())
+
+
+def test_report_on_part_of_the_horizon_writes_only_its_events():
+    from storagevet.ValueStreams.ReportBuilder import ReportBuilder
+    ra = resource_adequacy()
+    index = INDEX[100:24 * 20]
+    report = ReportBuilder.build([ra], index)
+    constraint = ra.requirement_constraint()
+    assert (report['RA Event (y/n)'].values == index.isin(ra.event_intervals)).all()
+    np.testing.assert_allclose(report[constraint.name].values, constraint.reindex(index).values)
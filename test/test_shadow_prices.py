@@ -0,0 +1,40 @@
+"""
+Shadow prices: per window duals are kept as a list and combined once for the report.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.MarketServiceUp import MarketServiceUp
+
+INDEX = pd.date_range('2017-12-30', periods=24 * 4, freq='h')
+PARAMS = {'price': pd.Series(1.0, index=INDEX), 'growth': 0, 'duration': 1, 'dt': 1}
+
+
+def test_window_duals_are_combined_once():
+    market = MarketServiceUp('SR', 'Spinning Reserve', PARAMS)
+    first, second = INDEX[:48], INDEX[48:]
+    market.save_duals(pd.DataFrame({'Max': np.ones(48)}, index=first))
+    market.save_duals(pd.DataFrame({'Max': np.full(48, 2.0)}, index=second))
+    # a requirement family saved separately for part of the second window
+    market.save_duals(pd.DataFrame({'poi export max': np.full(24, 5.0)}, index=second[:24]))
+    market.save_duals(pd.DataFrame())
+    assert len(market.dual_frames) == 3
+
+    report = market.shadow_price_report()
+    assert len(market.dual_frames) == 1
+    assert list(report.columns) == ['SR Max Shadow Price', 'SR poi export max Shadow Price']
+    assert report.index.equals(INDEX)
+    np.testing.assert_array_equal(report['SR Max Shadow Price'], [1.0] * 48 + [2.0] * 48)
+    assert report['SR poi export max Shadow Price'].notna().sum() == 24
+
+    yearly = market.yearly_shadow_prices([2017, 2018])
+    assert yearly.loc[pd.Period(year=2017, freq='y'), 'SR Max Shadow Price'] == 48
+    assert yearly.loc[pd.Period(year=2018, freq='y'), 'SR Max Shadow Price'] == 96
+    assert yearly.loc[pd.Period(year=2018, freq='y'), 'SR poi export max Shadow Price'] == 120
+
+
+def test_a_resolved_window_replaces_its_duals():
+    market = MarketServiceUp('SR', 'Spinning Reserve', PARAMS)
+    market.save_duals(pd.DataFrame({'Max': np.ones(len(INDEX))}, index=INDEX))
+    market.save_duals(pd.DataFrame({'Max': np.full(24, 3.0)}, index=INDEX[:24]))
+    assert market.shadow_price_report()['SR Max Shadow Price'].sum() == 3 * 24 + len(INDEX) - 24
+    assert MarketServiceUp('SR', 'Spinning Reserve', PARAMS).shadow_price_report().empty
@@ -0,0 +1,74 @@
+"""
+SolverSelection: the fastest solver that agrees with the others is cached per problem signature.
+"""
+import numpy as np
+import cvxpy as cvx
+from storagevet.ValueStreams.SolverSelection import SolverSelection
+
+SOLVERS = ['ECOS', 'CLARABEL', 'NOT_INSTALLED']
+
+
+def sample_problem(size=24):
+    x = cvx.Variable(size)
+    price = np.linspace(-1, 1, size)
+    return cvx.Problem(cvx.Minimize(price @ x), [x >= 0, x <= 5])
+
+
+def test_benchmark_skips_solvers_that_fail():
+    results = SolverSelection(solvers=SOLVERS).benchmark([sample_problem(), sample_problem(48)])
+    assert set(results) == {'ECOS', 'CLARABEL'}
+    for seconds, objectives in results.values():
+        assert seconds > 0
+        np.testing.assert_allclose(objectives, [sample_problem().solve(), sample_problem(48).solve()], rtol=1e-5)
+
+
+def test_fastest_agreeing_solver_is_selected():
+    selection = SolverSelection()
+    results = {'FAST_BUT_WRONG': (0.1, [-10.0]), 'SLOW': (3.0, [-12.0]),
+               'QUICK': (1.0, [-12.000001]), 'OTHER': (2.0, [-12.0])}
+    assert selection.select(results) == 'QUICK'
+    assert selection.select({}) is None
+
+
+def test_choice_is_cached_per_signature(tmp_path):
+    cache = tmp_path / 'solvers' / 'choices.json'
+    signature = SolverSelection.signature({'SR': None, 'LF': None}, 0.25, 96)
+    assert signature == 'LF|SR|dt=0.25|n=96'
+    solver = SolverSelection(cache, solvers=SOLVERS).choose(signature, [sample_problem()])
+    assert solver in {'ECOS', 'CLARABEL'}
+
+    later = SolverSelection(cache, solvers=SOLVERS)
+    later.benchmark = None  # a cached signature is not benchmarked again
+    assert later.choose(signature, []) == solver
+
+
+class Failing:
+    """ a sample problem whose solver interface fails with an unexpected error """
+    def solve(self, solver=None):
+        raise RuntimeError('license server unreachable')
+
+
+def test_any_solver_failure_skips_the_solver():
+    assert SolverSelection(solvers=['ECOS']).benchmark([Failing()]) == {}
+
+
+class Counting:
+    """ a sample problem that records its solves """
+    status = 'optimal'
+    value = -1.0
+
+    def __init__(self):
+        self.solves = []
+
+    def solve(self, solver=None):
+        self.solves.append(solver)
+
+
+def test_the_first_solve_of_each_problem_is_not_timed(monkeypatch):
+    problem = Counting()
+    clock = iter(range(100))
+    monkeypatch.setattr('time.perf_counter', lambda: next(clock))
+    results = SolverSelection(solvers=['ECOS']).benchmark([problem])
+    assert problem.solves == ['ECOS', 'ECOS']
+    # only the second solve is timed: two clock reads, one second apart
+    assert results == {'ECOS': (1, [-1.0])}
@@ -0,0 +1,76 @@
+"""
+Memory budget: window results are kept as chunks and the oldest are spilled to memory-mapped files.
+"""
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.MarketServiceUp import MarketServiceUp
+from storagevet.ValueStreams.ValueStream import ValueStream
+from storagevet.ValueStreams.ReportBuilder import ReportBuilder
+
+INDEX = pd.date_range('2017-01-01', periods=24 * 400, freq='h')
+PARAMS = {'price': pd.Series(np.random.default_rng(2).random(len(INDEX)), index=INDEX),
+          'growth': 0, 'duration': 1, 'dt': 1}
+WEEK = 24 * 7
+SITES = ['north', 'south']
+
+
+class Solved:
+    """ stands in for a solved CVXPY variable """
+    def __init__(self, value):
+        self.value = value
+
+
+def keep(frame, *args):
+    return frame
+
+
+def run(spill_path=None, sites=None):
+    market = MarketServiceUp('SR', 'Spinning Reserve', PARAMS)
+    if sites is not None:
+        market.enable_portfolio(sites)
+    if spill_path is not None:
+        ValueStream.enable_memory_budget(5000, spill_path)
+    rng = np.random.default_rng(0)
+    shape = (lambda n: n) if sites is None else (lambda n: (n, len(sites)))
+    for start in range(0, len(INDEX), WEEK):
+        window = INDEX[start:start + WEEK]
+        market.variables = {'ch_less': Solved(rng.random(shape(len(window)))),
+                            'dis_more': Solved(rng.random(shape(len(window))))}
+        market.save_variable_results(window)
+    return market
+
+
+def test_chunked_reports_match_the_in_memory_run(tmp_path):
+    full = run()
+    spilled = run(tmp_path)
+    assert any(isinstance(chunk, Path) for chunk in spilled.variable_store.chunks)
+    timeseries = full.timeseries_report()
+    pd.testing.assert_frame_equal(timeseries, pd.concat(list(spilled.iter_timeseries_report())), check_freq=False)
+    pd.testing.assert_frame_equal(full.proforma_report([2017, 2018], keep, keep, timeseries),
+                                  spilled.chunked_proforma_report([2017, 2018], keep, keep), check_freq=False)
+
+
+def test_spilled_portfolio_chunks_keep_their_site_columns(tmp_path):
+    full = run(sites=SITES)
+    spilled = run(tmp_path, sites=SITES)
+    assert any(isinstance(chunk, Path) for chunk in spilled.variable_store.chunks)
+    for chunk in spilled.variable_store:
+        assert isinstance(chunk.columns, pd.MultiIndex)
+    for site in SITES:
+        expected = full.for_site(site).timeseries_report()
+        actual = pd.concat(list(spilled.for_site(site).iter_timeseries_report()))
+        pd.testing.assert_frame_equal(expected, actual, check_freq=False)
+
+
+def test_default_reports_read_the_spilled_chunks(tmp_path):
+    full = run()
+    spilled = run(tmp_path)
+    assert spilled.variables_df.empty
+    expected = full.timeseries_report()
+    pd.testing.assert_frame_equal(spilled.timeseries_report(), expected, check_freq=False)
+    pd.testing.assert_frame_equal(ReportBuilder.build([spilled], INDEX), expected, check_freq=False)
+    pd.testing.assert_frame_equal(spilled.proforma_report([2017, 2018], keep, keep, spilled.timeseries_report()),
+                                  full.proforma_report([2017, 2018], keep, keep, expected), check_freq=False)
+    # the chunks are only read for the report
+    assert spilled.variables_df.empty
@@ -0,0 +1,67 @@
+"""
+TimeSeriesInput: only the manifest columns are read, in chunks, without holding every chunk.
+"""
+import numpy as np
+import pandas as pd
+from storagevet.ValueStreams.SpinningReserve import SpinningReserve
+from storagevet.ValueStreams.LoadFollowing import LoadFollowing
+from storagevet.ValueStreams.TimeSeriesInput import TimeSeriesInput, MemoryMappedTimeSeries
+
+INDEX = pd.date_range('2017-01-01', periods=1000, freq='h', name='Datetime (he)')
+MANIFEST = {'SR Price ($/kW)': 'float64', 'SR Max (kW)': 'float32'}
+
+
+def write_csv(tmp_path):
+    rng = np.random.default_rng(1)
+    frame = pd.DataFrame({'Site Load (kW)': rng.random(len(INDEX)), 'SR Price ($/kW)': rng.random(len(INDEX)),
+                          'SR Max (kW)': rng.random(len(INDEX)), 'DA Price ($/kWh)': rng.random(len(INDEX))},
+                         index=INDEX)
+    frame.to_csv(tmp_path / 'timeseries.csv')
+    return tmp_path / 'timeseries.csv', frame
+
+
+def test_the_manifest_comes_from_the_value_streams():
+    sr = SpinningReserve({'price': 1, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': True,
+                          'max': pd.Series(name='SR Max (kW)', dtype=float),
+                          'min': pd.Series(name='SR Min (kW)', dtype=float)})
+    manifest = TimeSeriesInput.column_manifest([sr], {'Site Load (kW)': 'float64'})
+    assert list(manifest) == ['Site Load (kW)', 'SR Price ($/kW)', 'SR Max (kW)', 'SR Min (kW)']
+
+
+def test_the_manifest_does_not_depend_on_the_loaded_data():
+    # the limits are not read yet (unnamed placeholders), only the constraint settings are known
+    sr = SpinningReserve({'price': 1, 'growth': 0, 'duration': 1, 'dt': 1, 'ts_constraints': True,
+                          'max': None, 'min': None})
+    lf = LoadFollowing({'CombinedMarket': False, 'duration': 1, 'energyprice_growth': 0, 'growth': 0,
+                        'eod': 0.3, 'eou': 0.3, 'regd_price': 1, 'regu_price': 1, 'energy_price': 1, 'dt': 1,
+                        'u_ts_constraints': True, 'lf_u_max': None, 'lf_u_min': None, 'd_ts_constraints': False})
+    manifest = TimeSeriesInput.column_manifest({'SR': sr, 'LF': lf})
+    assert list(manifest) == ['SR Price ($/kW)', 'SR Max (kW)', 'SR Min (kW)', 'LF Up Price ($/kW)',
+                              'LF Down Price ($/kW)', 'DA Price ($/kWh)', 'LF Up Max (kW)', 'LF Up Min (kW)']
+
+
+def test_chunked_read_matches_the_one_pass_read(tmp_path, monkeypatch):
+    filename, frame = write_csv(tmp_path)
+    whole = TimeSeriesInput.read_csv(filename, MANIFEST)
+    assert list(whole.columns) == list(MANIFEST)
+    assert whole['SR Max (kW)'].dtype == np.float32
+
+    def no_concat(*args, **kwargs):
+        raise AssertionError('the chunks must not be concatenated')
+    monkeypatch.setattr(pd, 'concat', no_concat)
+    chunked = TimeSeriesInput.read_csv(filename, MANIFEST, chunksize=128)
+    monkeypatch.undo()
+    pd.testing.assert_frame_equal(whole, chunked, check_freq=False)
+    assert TimeSeriesInput.read_csv(filename, MANIFEST, float32=True, chunksize=300).dtypes.eq(np.float32).all()
+
+
+def test_chunks_stream_into_memory_mapped_files(tmp_path):
+    filename, frame = write_csv(tmp_path)
+    data = MemoryMappedTimeSeries.from_csv(filename, MANIFEST, tmp_path / 'mmap', chunksize=128)
+    assert data.columns == list(MANIFEST)
+    assert 'Site Load (kW)' not in data
+    assert data.index.equals(INDEX)
+    price = data['SR Price ($/kW)']
+    assert isinstance(price.values, np.memmap) or isinstance(price.values.base, np.memmap)
+    np.testing.assert_allclose(price.values, frame['SR Price ($/kW)'].values)
+    assert data.loc[:, 'SR Max (kW)'].dtype == np.float32
@@ -0,0 +1,80 @@
+"""
+VoltVar: per timestep real power headroom left after the reactive power reservation.
+"""
+import math
+import numpy as np
+import pandas as pd
+import cvxpy as cvx
+from storagevet.ValueStreams.VoltVar import VoltVar
+from storagevet.ValueStreams.ValueStream import ValueStream
+
+INDEX = pd.date_range('2017-01-01', periods=96 * 60, freq='15min')
+PERCENT = pd.Series([0, 0.3] + [0.2] * 10, index=pd.MultiIndex.from_product([[2017], range(1, 13)],
+                                                                        names=['Year', 'Month']))
+MASK = pd.Series(True, index=INDEX)
+
+
+class Battery:
+    technology_type = 'Energy Storage System'
+    tag = 'Battery'
+
+    def __init__(self, ch_max_rated=80, dis_max_rated=100):
+        self.ch_max_rated = ch_max_rated
+        self.dis_max_rated = dis_max_rated
+
+
+class SolarPV:
+    technology_type = 'Intermittent Resource'
+    tag = 'PV'
+    loc = 'dc'
+    inv_max = 150
+
+    def maximum_generation(self):
+        return pd.Series(np.clip(np.sin(np.arange(len(INDEX)) / 96 * 2 * np.pi), 0, None) * 120, index=INDEX)
+
+
+def volt_var():
+    ValueStream.set_horizon(INDEX)
+    return VoltVar({'percent': PERCENT * 100, 'price': 1000, 'dt': 0.25})
+
+
+def test_fixed_ratings_emit_requirements_only_where_headroom_binds():
+    vv = volt_var()
+    vv.calculate_system_requirements([Battery(), SolarPV()])
+    requirements = {requirement.type: requirement.value for requirement in vv.system_requirements}
+    # the charge headroom never drops under the 80 kW charge rating
+    assert list(requirements) == ['der dispatch discharge']
+    discharge = requirements['der dispatch discharge']
+    assert (discharge < 100).all() and len(discharge) < len(INDEX)
+    position = 96 * 40 + 30
+    pv = SolarPV().maximum_generation().iloc[position]
+    expected = max(math.sqrt(150 ** 2 - (0.3 * 150) ** 2) - pv, 0)  # February: 30 %
+    assert np.isclose(vv.dis_max.iloc[position], expected)
+    # no reservation in January: the battery alone is never limited
+    vv = volt_var()
+    vv.calculate_system_requirements([Battery()])
+    assert (vv.system_requirements[0].value.index.month > 1).all()
+
+
+def test_sized_inverter_becomes_cvxpy_constraints():
+    vv = volt_var()
+    rating = cvx.Variable(name='dis_max_rated')
+    vv.calculate_system_requirements([Battery(ch_max_rated=rating, dis_max_rated=rating)])
+    assert vv.system_requirements == [] and vv.sized_headroom is not None
+    charge = cvx.Variable(len(INDEX))
+    constraints = vv.constraints(MASK, 0, 0, 0, charge, None) + [rating <= 100, charge >= 0]
+    problem = cvx.Problem(cvx.Maximize(cvx.sum(charge)), constraints)
+    problem.solve()
+    assert problem.status == 'optimal'
+    ratio = np.sqrt(1 - vv.timestep_vars_percent(INDEX) ** 2)
+    np.testing.assert_allclose(charge.value, 100 * ratio, rtol=1e-5)
+
+
+def test_timestep_percent_follows_the_index_it_is_asked_for():
+    vv = volt_var()
+    january = vv.timestep_vars_percent(INDEX[:96 * 31])
+    assert vv.timestep_vars_percent(INDEX[:96 * 31]) is january
+    # a window of the same length in another month is not served from the January values
+    february = vv.timestep_vars_percent(INDEX[96 * 31:96 * 62])
+    np.testing.assert_allclose(january, 0)
+    np.testing.assert_allclose(february[:96 * 28], 0.3)
@@ -0,0 +1,43 @@
+"""
+WindowScheduler: the window length is picked from the measured cost of the probe windows.
+"""
+import numpy as np
+from storagevet.ValueStreams.WindowScheduler import WindowScheduler
+
+HORIZON = 8760
+
+
+def measured(cost, probes=4, **kwargs):
+    scheduler = WindowScheduler(HORIZON, 1, probes=probes, **kwargs)
+    for length in scheduler.probe_lengths():
+        scheduler.record(length, 0.25 * cost(length), 0.75 * cost(length), peak_memory=1000 * length)
+    assert scheduler.ready()
+    return scheduler
+
+
+def test_a_fixed_overhead_and_a_superlinear_cost_give_an_interior_window():
+    cost = lambda length: 2 + 1e-5 * length ** 2
+    scheduler = measured(cost)
+    overhead, scale, exponent, memory_per_step = scheduler.fit()
+    np.testing.assert_allclose([overhead, scale, exponent], [2, 1e-5, 2], rtol=1e-2)
+    assert memory_per_step == 1000
+
+    plan = scheduler.plan()
+    lengths = np.arange(24, HORIZON + 1, 24)
+    windows = np.ceil(HORIZON / lengths)
+    true_total = windows * 2 + (windows - 1) * 1e-5 * lengths ** 2 + 1e-5 * (HORIZON - (windows - 1) * lengths) ** 2
+    assert 24 < plan['window length'] < HORIZON
+    assert plan['window length'] == lengths[np.argmin(true_total)]
+
+
+def test_linear_cost_gives_one_window_and_the_memory_ceiling_caps_it():
+    cost = lambda length: 0.5 + 1e-3 * length
+    assert measured(cost).plan()['window length'] == HORIZON
+    plan = measured(cost, memory_ceiling=1000 * 24 * 30).plan()
+    assert plan['window length'] == 24 * 30
+    assert plan['estimated memory'] <= 1000 * 24 * 30
+
+
+def test_two_probe_lengths_fit_a_linear_cost():
+    overhead, scale, exponent, _ = measured(lambda length: 1 + 0.01 * length, probes=2).fit()
+    np.testing.assert_allclose([overhead, scale, exponent], [1, 0.01, 1])